@@ -1,6 +1,7 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Organization, License
+from .models import User, Organization, License, UsageCounter
+from .quotas import reconcilier_compteurs
 
 
 @admin.register(Organization)
@@ -39,4 +40,19 @@ class LicenseAdmin(admin.ModelAdmin):
     
     def days_remaining(self, obj):
         return f"{obj.days_remaining()} jours"
-    days_remaining.short_description = "Jours restants"
\ No newline at end of file
+    days_remaining.short_description = "Jours restants"
+
+
+@admin.register(UsageCounter)
+class UsageCounterAdmin(admin.ModelAdmin):
+    list_display = ['organization', 'resource', 'count', 'updated_at']
+    list_filter = ['resource']
+    search_fields = ['organization__name']
+    readonly_fields = ['organization', 'resource', 'count', 'updated_at']
+    actions = ['reconcilier']
+    
+    @admin.action(description="Recalculer les compteurs des organisations sélectionnées")
+    def reconcilier(self, request, queryset):
+        organization_ids = set(queryset.values_list('organization_id', flat=True))
+        corrections = reconcilier_compteurs(organization_ids)
+        self.message_user(request, f"{len(corrections)} compteur(s) corrigé(s).", messages.SUCCESS)
@@ -2,6 +2,10 @@ from django.shortcuts import redirect
 from django.contrib import messages
 from functools import wraps
 
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from accounts.tenancy import get_request_tenant_context
+
 
 def require_test_access(test_name):
     """
@@ -14,30 +18,26 @@ def require_test_access(test_name):
     
     Args:
         test_name (str): Nom du test ('d2r', 'vineland', 'pep3')
+    
+    Fonctionne aussi sur les vues async.
     """
     def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            # Vue async : les vérifications (cache tenant, éventuellement la base) tournent dans un thread
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                response = await sync_to_async(check_test_access)(request, test_name)
+                if response is not None:
+                    return response
+                return await view_func(request, *args, **kwargs)
+            
+            return async_wrapper
+        
         @wraps(view_func)
         def wrapper(request, *args, **kwargs):
-            # Vérifier que l'utilisateur est authentifié
-            if not request.user.is_authenticated:
-                return redirect('accounts:login')
-            
-            # Vérifier que l'utilisateur a une organisation
-            if not hasattr(request.user, 'organization') or not request.user.organization:
-                messages.error(request, "Vous n'êtes pas associé à une organisation.")
-                return redirect('cabinet:dashboard')
-            
-            # Vérifier que l'organisation a une licence
-            if not hasattr(request.user.organization, 'license'):
-                messages.error(request, "Votre organisation n'a pas de licence active.")
-                return redirect('cabinet:dashboard')
-            
-            license = request.user.organization.license
-            
-            # Vérifier l'accès au test
-            if not license.has_test_access(test_name):
-                # Redirection silencieuse vers le dashboard sans message
-                return redirect('cabinet:dashboard')
+            response = check_test_access(request, test_name)
+            if response is not None:
+                return response
             
             # Accès autorisé, exécuter la vue
             return view_func(request, *args, **kwargs)
@@ -46,6 +46,35 @@ def require_test_access(test_name):
     return decorator
 
 
+def check_test_access(request, test_name):
+    """Redirection si l'accès au test est refusé, None sinon"""
+    # Vérifier que l'utilisateur est authentifié
+    if not request.user.is_authenticated:
+        return redirect('accounts:login')
+    
+    # Organisation et licence depuis le cache (voir accounts.tenancy)
+    context = get_request_tenant_context(request)
+    
+    # Vérifier que l'utilisateur a une organisation
+    if context is None:
+        messages.error(request, "Vous n'êtes pas associé à une organisation.")
+        return redirect('cabinet:dashboard')
+    
+    # Vérifier que l'organisation a une licence
+    if context.license is None:
+        messages.error(request, "Votre organisation n'a pas de licence active.")
+        return redirect('cabinet:dashboard')
+    
+    license = context.license
+    
+    # Vérifier l'accès au test
+    if not license.has_test_access(test_name):
+        # Redirection silencieuse vers le dashboard sans message
+        return redirect('cabinet:dashboard')
+    
+    return None
+
+
 def superadmin_required(view_func):
     """
     Décorateur pour restreindre l'accès aux super admins uniquement.
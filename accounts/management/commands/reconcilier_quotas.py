@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from accounts.quotas import reconcilier_compteurs
+
+
+class Command(BaseCommand):
+    help = "Recalcule les compteurs d'utilisation (patients, tests) des organisations"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--organization', type=int, action='append', dest='organizations',
+            help="Identifiant d'organisation (répétable ; toutes par défaut)"
+        )
+
+    def handle(self, *args, **options):
+        corrections = reconcilier_compteurs(options['organizations'])
+        for organization_id, resource, ancien, nouveau in corrections:
+            self.stdout.write(f"Organisation {organization_id} - {resource} : {ancien} → {nouveau}")
+        self.stdout.write(self.style.SUCCESS(f"{len(corrections)} compteur(s) corrigé(s)."))
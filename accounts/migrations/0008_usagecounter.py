@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_license_has_stai_license_max_tests_stai'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsageCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource', models.CharField(max_length=20, verbose_name='Ressource')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Nombre')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_counters', to='accounts.organization')),
+            ],
+            options={
+                'verbose_name': "Compteur d'utilisation",
+                'verbose_name_plural': "Compteurs d'utilisation",
+                'unique_together': {('organization', 'resource')},
+            },
+        ),
+    ]
@@ -2,9 +2,7 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from datetime import timedelta
-from tests_psy.models import TestBeck , TestSTAI
 
-from core import tests
 
 class Organization(models.Model):
     """Cabinet/Organisation du psychologue"""
@@ -145,17 +143,47 @@ class License(models.Model):
             return (self.end_date - timezone.now()).days
         return 0
     
+    def get_limite(self, resource):
+        """Limite de la licence pour 'patients' ou un test
+        
+        Returns:
+            int or None: Nombre maximum, None si illimité
+        """
+        if resource == 'patients':
+            return self.max_patients
+        
+        # Si max = 0, c'est illimité
+        test_limits = {
+            'd2r': self.max_tests_d2r,
+            'vineland': self.max_tests_vineland,
+            'beck': self.max_tests_beck,
+            'stai': self.max_tests_stai,
+            'pep3': self.max_tests_pep3,
+        }
+        return test_limits.get(resource.lower(), 0) or None
+    
+    def get_usage(self, resource):
+        """Nombre de patients ou de tests de l'organisation (compteur d'utilisation)"""
+        from accounts.quotas import get_usage
+        return get_usage(self.organization_id, resource.lower())
+    
+    def reserver(self, resource):
+        """Réserve une création dans la limite de la licence (voir accounts.quotas.reserver)
+        
+        Usage:
+            with license.reserver('beck'):
+                test.save()
+        """
+        from accounts.quotas import reserver
+        return reserver(self.organization_id, resource.lower(), self.get_limite(resource))
+    
     def can_add_patient(self):
         """Vérifie si l'organisation peut ajouter un nouveau patient"""
-        from cabinet.models import Patient
-        current_count = Patient.objects.filter(organization=self.organization).count()
-        return current_count < self.max_patients
+        return self.get_usage('patients') < self.max_patients
     
     def get_patients_remaining(self):
         """Retourne le nombre de patients restants"""
-        from cabinet.models import Patient
-        current_count = Patient.objects.filter(organization=self.organization).count()
-        return max(0, self.max_patients - current_count)
+        return max(0, self.max_patients - self.get_usage('patients'))
     
     def can_add_test(self, test_name):
         """Vérifie si l'organisation peut créer un nouveau test
@@ -166,43 +194,16 @@ class License(models.Model):
         Returns:
             bool: True si un nouveau test peut être créé
         """
+        from accounts.quotas import RESOURCE_MODELS
+        
         if not self.has_test_access(test_name):
             return False
         
-        # Si max = 0, c'est illimité
-        test_limits = {
-            'd2r': self.max_tests_d2r,
-            'vineland': self.max_tests_vineland,
-            'beck': self.max_tests_beck,
-            'stai': self.max_tests_stai,
-            'pep3': self.max_tests_pep3,
-        }
+        max_tests = self.get_limite(test_name)
+        if max_tests is None or test_name.lower() not in RESOURCE_MODELS:
+            return True  # Illimité, ou test sans compteur d'utilisation (PEP3)
         
-        max_tests = test_limits.get(test_name.lower(), 0)
-        if max_tests == 0:
-            return True  # Illimité
-        
-        # Compter les tests existants
-        from tests_psy.models import TestD2R,TestVineland
-        # TODO: Ajouter Vineland et PEP3 quand disponibles
-        
-        if test_name.lower() == 'd2r':
-            current_count = TestD2R.objects.filter(organization=self.organization).count()
-            return current_count < max_tests
-        elif test_name.lower() == 'vineland':
-            current_count = TestVineland.objects.filter(organization=self.organization).count()
-            return current_count < max_tests
-        elif test_name.lower() == 'beck':  
-            current_count = TestBeck.objects.filter(organization=self.organization).count()
-            return current_count < max_tests
-        elif test_name.lower() == 'stai':
-            current_count = TestSTAI.objects.filter(organization=self.organization).count()
-            return current_count < max_tests
-        elif test_name.lower() == 'pep3':
-            # TODO: Implémenter quand PEP3 sera disponible
-            return True
-        
-        return False
+        return self.get_usage(test_name) < max_tests
     
     def get_tests_remaining(self, test_name):
         """Retourne le nombre de tests restants pour un test donné
@@ -213,40 +214,13 @@ class License(models.Model):
         Returns:
             int or str: Nombre restant ou 'Illimité'
         """
-        test_limits = {
-            'd2r': self.max_tests_d2r,
-            'vineland': self.max_tests_vineland,
-            'beck': self.max_tests_beck,
-            'stai': self.max_tests_stai,
-            'pep3': self.max_tests_pep3,
-        }
+        from accounts.quotas import RESOURCE_MODELS
         
-        max_tests = test_limits.get(test_name.lower(), 0)
-        if max_tests == 0:
+        max_tests = self.get_limite(test_name)
+        if max_tests is None or test_name.lower() not in RESOURCE_MODELS:
             return 'Illimité'
         
-        # Compter les tests existants
-        from tests_psy.models import TestD2R, TestVineland
-        
-        test_name_lower = test_name.lower()
-        
-        if test_name_lower == 'd2r':
-            current_count = TestD2R.objects.filter(organization=self.organization).count()
-            return max(0, max_tests - current_count)
-        elif test_name_lower == 'vineland':
-            current_count = TestVineland.objects.filter(organization=self.organization).count()
-            return max(0, max_tests - current_count)
-        elif test_name_lower == 'beck':  
-            current_count = TestBeck.objects.filter(organization=self.organization).count()
-            return max(0, max_tests - current_count)
-        elif test_name_lower == 'stai':
-            current_count = TestSTAI.objects.filter(organization=self.organization).count()
-            return max(0, max_tests - current_count)
-        elif test_name_lower == 'pep3':
-            # TODO: Implémenter quand PEP3 sera disponible
-            return 'Illimité'
-        
-        return 'Illimité'
+        return max(0, max_tests - self.get_usage(test_name))
     
     def has_test_access(self, test_name):
         """Vérifie si la licence donne accès à un test spécifique
@@ -297,4 +271,24 @@ class License(models.Model):
         """
         all_tests = ['D2R', 'Vineland', 'PEP3' , 'Beck' , 'STAI']
         available = self.get_available_tests()
-        return [test for test in all_tests if test not in available]
\ No newline at end of file
+        return [test for test in all_tests if test not in available]
+
+
+class UsageCounter(models.Model):
+    """Compteur d'utilisation (patients, tests) d'une organisation pour les quotas de licence"""
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='usage_counters'
+    )
+    resource = models.CharField(max_length=20, verbose_name="Ressource")
+    count = models.PositiveIntegerField(default=0, verbose_name="Nombre")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Compteur d'utilisation"
+        verbose_name_plural = "Compteurs d'utilisation"
+        unique_together = ['organization', 'resource']
+
+    def __str__(self):
+        return f"{self.organization_id} - {self.resource} : {self.count}"
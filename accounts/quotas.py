@@ -0,0 +1,167 @@
+"""
+Compteurs d'utilisation par organisation pour les quotas de licence.
+
+Chaque organisation a un compteur par ressource (patients, tests D2R,
+Vineland, Beck, STAI) : les vérifications de quota lisent une ligne au lieu
+de compter la table. Les signaux post_save/post_delete tiennent les compteurs
+à jour, reconcilier_compteurs() les recalcule (commande reconcilier_quotas),
+et reserver() sérialise les créations concurrentes d'une même organisation.
+"""
+from contextlib import contextmanager, nullcontext
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+
+# Ressource → modèle compté (filtré par organisation)
+RESOURCE_MODELS = {
+    'patients': 'cabinet.Patient',
+    'd2r': 'tests_psy.TestD2R',
+    'vineland': 'tests_psy.TestVineland',
+    'beck': 'tests_psy.TestBeck',
+    'stai': 'tests_psy.TestSTAI',
+}
+
+
+class QuotaAtteint(Exception):
+    """Levée par reserver() lorsque la limite de la licence est atteinte."""
+
+    def __init__(self, resource, limit):
+        super().__init__(f"Limite atteinte pour {resource} ({limit})")
+        self.resource = resource
+        self.limit = limit
+
+
+def get_resource_model(resource):
+    return apps.get_model(RESOURCE_MODELS[resource])
+
+
+def count_usage(organization_id, resource):
+    """Comptage réel (COUNT) des lignes de la ressource pour l'organisation."""
+    return get_resource_model(resource).all_objects.filter(organization_id=organization_id).count()
+
+
+def _get_counter(organization_id, resource, for_update=False):
+    """Compteur de l'organisation, initialisé par un comptage réel s'il n'existe pas encore."""
+    from accounts.models import UsageCounter
+
+    queryset = UsageCounter.objects.select_for_update() if for_update else UsageCounter.objects
+    counter = queryset.filter(organization_id=organization_id, resource=resource).first()
+    if counter is None:
+        counter, created = UsageCounter.objects.get_or_create(
+            organization_id=organization_id,
+            resource=resource,
+            defaults={'count': count_usage(organization_id, resource)}
+        )
+        if for_update and not created:
+            counter = queryset.get(pk=counter.pk)
+    return counter
+
+
+def get_usage(organization_id, resource):
+    """Nombre de lignes de la ressource pour l'organisation (une lecture)."""
+    if resource not in RESOURCE_MODELS:
+        return 0
+    return _get_counter(organization_id, resource).count
+
+
+def increment_usage(organization_id, resource):
+    """Appelé après une création (le compteur est initialisé si besoin)."""
+    from accounts.models import UsageCounter
+
+    updated = UsageCounter.objects.filter(
+        organization_id=organization_id, resource=resource
+    ).update(count=F('count') + 1)
+    if not updated:
+        # Le comptage réel inclut déjà la ligne créée
+        _get_counter(organization_id, resource)
+
+
+def decrement_usage(organization_id, resource):
+    """
+    Appelé après une suppression. Un compteur absent n'est pas créé : la
+    suppression peut venir de celle de l'organisation elle-même.
+    """
+    from accounts.models import UsageCounter
+
+    UsageCounter.objects.filter(
+        organization_id=organization_id, resource=resource
+    ).update(count=Greatest(F('count') - 1, 0))
+
+
+@contextmanager
+def reserver(organization_id, resource, limit):
+    """
+    Vérifie la limite et exécute la création dans une même transaction.
+
+    Le compteur est verrouillé (SELECT ... FOR UPDATE) jusqu'à la fin du bloc :
+    une création concurrente pour la même organisation attend, puis voit le
+    compteur incrémenté par le signal post_save. Lève QuotaAtteint si la
+    limite est atteinte ; limit=None signifie illimité.
+
+    Usage:
+        with reserver(organization.id, 'beck', 10):
+            test.save()
+    """
+    with transaction.atomic():
+        if limit is not None and resource in RESOURCE_MODELS:
+            counter = _get_counter(organization_id, resource, for_update=True)
+            if counter.count >= limit:
+                raise QuotaAtteint(resource, limit)
+        yield
+
+
+def reserver_quota(user, resource):
+    """Réservation pour la licence de l'utilisateur ; les super admins ne sont pas limités."""
+    if user.is_superadmin():
+        return nullcontext()
+    return user.organization.license.reserver(resource)
+
+
+def reconcilier_compteurs(organization_ids=None):
+    """
+    Recalcule les compteurs à partir des tables (un COUNT groupé par
+    ressource) et corrige ceux qui ont dérivé.
+
+    Returns:
+        list: (organization_id, resource, ancien, nouveau) des compteurs corrigés
+    """
+    from accounts.models import Organization, UsageCounter
+
+    organizations = Organization.objects.all()
+    if organization_ids is not None:
+        organizations = organizations.filter(pk__in=organization_ids)
+    organization_ids = list(organizations.values_list('pk', flat=True))
+
+    existants = {
+        (counter.organization_id, counter.resource): counter
+        for counter in UsageCounter.objects.filter(organization_id__in=organization_ids)
+    }
+
+    corrections = []
+    a_enregistrer = []
+    for resource in RESOURCE_MODELS:
+        reels = dict(
+            get_resource_model(resource).all_objects
+            .filter(organization_id__in=organization_ids)
+            .values('organization_id')
+            .annotate(total=Count('pk'))
+            .values_list('organization_id', 'total')
+        )
+        for organization_id in organization_ids:
+            reel = reels.get(organization_id, 0)
+            counter = existants.get((organization_id, resource))
+            if counter is not None and counter.count == reel:
+                continue
+            corrections.append((organization_id, resource, counter.count if counter else None, reel))
+            a_enregistrer.append(UsageCounter(organization_id=organization_id, resource=resource, count=reel))
+
+    UsageCounter.objects.bulk_create(
+        a_enregistrer,
+        update_conflicts=True,
+        unique_fields=['organization', 'resource'],
+        update_fields=['count'],
+    )
+    return corrections
@@ -0,0 +1,39 @@
+"""
+Invalidation du contexte tenant (organisation + licence) mis en cache et
+tenue à jour des compteurs d'utilisation (quotas).
+"""
+from django.db.models.signals import post_save, post_delete
+
+from accounts.models import Organization, License
+from accounts.tenancy import invalidate_tenant_context
+from accounts.quotas import RESOURCE_MODELS, get_resource_model, increment_usage, decrement_usage
+
+
+# Modèle compté → ressource
+USAGE_MODELS = {get_resource_model(resource): resource for resource in RESOURCE_MODELS}
+
+
+def organization_changed(sender, instance, **kwargs):
+    invalidate_tenant_context(instance.pk)
+
+
+def license_changed(sender, instance, **kwargs):
+    invalidate_tenant_context(instance.organization_id)
+
+
+def usage_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        increment_usage(instance.organization_id, USAGE_MODELS[sender])
+
+
+def usage_deleted(sender, instance, **kwargs):
+    decrement_usage(instance.organization_id, USAGE_MODELS[sender])
+
+
+post_save.connect(organization_changed, sender=Organization, dispatch_uid='tenant_organization_save')
+post_delete.connect(organization_changed, sender=Organization, dispatch_uid='tenant_organization_delete')
+post_save.connect(license_changed, sender=License, dispatch_uid='tenant_license_save')
+post_delete.connect(license_changed, sender=License, dispatch_uid='tenant_license_delete')
+for model, resource in USAGE_MODELS.items():
+    post_save.connect(usage_created, sender=model, dispatch_uid=f'usage_save_{resource}')
+    post_delete.connect(usage_deleted, sender=model, dispatch_uid=f'usage_delete_{resource}')
@@ -0,0 +1,71 @@
+"""
+Contexte tenant (organisation + licence) mis en cache par organisation.
+
+Le middleware et les décorateurs d'accès lisent l'organisation et sa licence
+(modules, limites, dates) depuis le cache Django au lieu de les recharger à
+chaque requête. Les signaux de License/Organization invalident l'entrée ; une
+courte durée de vie couvre les processus qui ne partagent pas le cache
+(LocMemCache). L'expiration est évaluée à chaque appel de License.is_active(),
+elle n'est donc jamais masquée par le cache.
+"""
+from collections import namedtuple
+
+from django.core.cache import cache
+
+
+TENANT_CONTEXT_TTL = 60  # secondes
+
+TenantContext = namedtuple('TenantContext', ['organization', 'license'])
+
+
+def _cache_key(organization_id):
+    return f'accounts:tenant:{organization_id}'
+
+
+def load_tenant_context(organization_id):
+    """Organisation et licence en une requête (None si l'organisation n'existe pas)."""
+    from accounts.models import Organization
+
+    organization = Organization.objects.select_related('license').filter(pk=organization_id).first()
+    if organization is None:
+        return None
+    # select_related a mis la licence (ou son absence) en cache sur l'organisation
+    license = getattr(organization, 'license', None)
+    return TenantContext(organization, license)
+
+
+def get_tenant_context(organization_id):
+    """Contexte tenant de l'organisation, depuis le cache si possible."""
+    if organization_id is None:
+        return None
+
+    key = _cache_key(organization_id)
+    context = cache.get(key)
+    if context is None:
+        context = load_tenant_context(organization_id)
+        if context is not None:
+            cache.set(key, context, TENANT_CONTEXT_TTL)
+    return context
+
+
+def invalidate_tenant_context(organization_id):
+    cache.delete(_cache_key(organization_id))
+
+
+def attach_tenant_context(user, context):
+    """
+    Rattache l'organisation du contexte à l'utilisateur : user.organization et
+    user.organization.license ne déclenchent plus de requête dans les vues et
+    les templates.
+    """
+    if context is not None and user.organization_id == context.organization.pk:
+        user.organization = context.organization
+
+
+def get_request_tenant_context(request):
+    """Contexte posé par TenantMiddleware, ou chargé depuis le cache à défaut."""
+    context = getattr(request, 'tenant_context', None)
+    if context is None:
+        context = get_tenant_context(request.user.organization_id)
+        attach_tenant_context(request.user, context)
+    return context
@@ -1,3 +1,100 @@
+from datetime import date
+
 from django.test import TestCase
 
-# Create your tests here.
+from accounts.models import License, Organization, UsageCounter
+from accounts.quotas import QuotaAtteint, get_usage, reconcilier_compteurs, reserver
+from cabinet.models import Patient
+from tests_psy.models import TestBeck, TestSTAI
+
+
+class LimitesLicenceTests(TestCase):
+
+    def test_limite_pep3_configuree_mais_non_comptee(self):
+        organization = Organization.objects.create(name="Cabinet", slug="cabinet")
+        license = License.objects.create(
+            organization=organization, plan='lifetime', has_pep3=True, max_tests_pep3=5,
+        )
+
+        self.assertEqual(license.get_limite('pep3'), 5)
+        # Pas encore de compteur d'utilisation PEP3 : toujours illimité
+        self.assertTrue(license.can_add_test('pep3'))
+        self.assertEqual(license.get_tests_remaining('pep3'), 'Illimité')
+
+
+class CompteursQuotasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name="Cabinet", slug="cabinet")
+        cls.autre = Organization.objects.create(name="Autre", slug="autre")
+
+    def creer_patient(self, organization=None, nom="Patient"):
+        return Patient.all_objects.create(
+            organization=organization or self.organization, nom=nom, prenom="Test", date_naissance=date(2000, 1, 1)
+        )
+
+    def compteur(self, resource, organization=None):
+        return UsageCounter.objects.get(organization=organization or self.organization, resource=resource).count
+
+    def test_quota_atteint(self):
+        self.creer_patient()
+        with reserver(self.organization.id, 'patients', 2):
+            self.creer_patient()
+
+        with self.assertRaises(QuotaAtteint) as erreur:
+            with reserver(self.organization.id, 'patients', 2):
+                self.creer_patient()
+        self.assertEqual((erreur.exception.resource, erreur.exception.limit), ('patients', 2))
+        self.assertEqual(Patient.all_objects.filter(organization=self.organization).count(), 2)
+
+        # Illimité, ou autre organisation : pas de blocage
+        with reserver(self.organization.id, 'patients', None):
+            self.creer_patient()
+        with reserver(self.autre.id, 'patients', 2):
+            self.creer_patient(self.autre)
+
+    def test_compteur_initialise_par_un_comptage_reel(self):
+        for _ in range(3):
+            self.creer_patient()
+        UsageCounter.objects.all().delete()
+
+        self.assertEqual(get_usage(self.organization.id, 'patients'), 3)
+        self.assertEqual(self.compteur('patients'), 3)
+        # Compteur existant : une seule lecture, sans COUNT
+        with self.assertNumQueries(1):
+            self.assertEqual(get_usage(self.organization.id, 'patients'), 3)
+        self.assertEqual(get_usage(self.organization.id, 'pep3'), 0)
+
+    def test_signaux_et_suppression_en_cascade(self):
+        patient = self.creer_patient()
+        autre_patient = self.creer_patient(nom="Autre")
+        for _ in range(2):
+            TestBeck.all_objects.create(organization=self.organization, patient=patient)
+        TestBeck.all_objects.create(organization=self.organization, patient=autre_patient)
+        TestSTAI.all_objects.create(organization=self.organization, patient=patient)
+        self.assertEqual(
+            (self.compteur('patients'), self.compteur('beck'), self.compteur('stai')), (2, 3, 1)
+        )
+
+        # Les tests du patient sont supprimés en cascade : leurs compteurs aussi
+        patient.delete()
+
+        self.assertEqual(
+            (self.compteur('patients'), self.compteur('beck'), self.compteur('stai')), (1, 1, 0)
+        )
+
+    def test_reconciliation_d_un_compteur_derive(self):
+        self.creer_patient()
+        self.creer_patient(self.autre)
+        UsageCounter.objects.filter(organization=self.organization, resource='patients').update(count=7)
+
+        corrections = reconcilier_compteurs()
+
+        self.assertIn((self.organization.id, 'patients', 7, 1), corrections)
+        self.assertNotIn('patients', [resource for organization_id, resource, _, _ in corrections
+                                      if organization_id == self.autre.id])
+        self.assertEqual(self.compteur('patients'), 1)
+        # Compteurs absents créés à zéro
+        self.assertEqual(self.compteur('vineland', self.autre), 0)
+        self.assertEqual(reconcilier_compteurs(), [])
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:32
+
+from django.db import DatabaseError, migrations, models, transaction
+
+from cabinet.services.recherche import FTS_TABLE, texte_recherche
+
+
+def backfill_recherche(apps, schema_editor):
+    Patient = apps.get_model('cabinet', 'Patient')
+    patients = list(Patient._base_manager.only('id', 'nom', 'prenom', 'telephone'))
+    for patient in patients:
+        patient.recherche = texte_recherche(patient.nom, patient.prenom, patient.telephone)
+    Patient._base_manager.bulk_update(patients, ['recherche'], batch_size=500)
+
+
+SQLITE_FTS = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(recherche, content='cabinet_patient', content_rowid='id')",
+    f"""CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON cabinet_patient BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, recherche) VALUES (new.id, new.recherche);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON cabinet_patient BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, recherche) VALUES ('delete', old.id, old.recherche);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF recherche ON cabinet_patient BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, recherche) VALUES ('delete', old.id, old.recherche);
+        INSERT INTO {FTS_TABLE}(rowid, recherche) VALUES (new.id, new.recherche);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+POSTGRESQL_TRGM = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS cabinet_patient_recherche_trgm ON cabinet_patient USING gin (recherche gin_trgm_ops)",
+]
+
+
+def create_search_index(apps, schema_editor):
+    """Index GIN trigramme (PostgreSQL) ou table FTS5 (SQLite) ; sans eux, la recherche reste un LIKE."""
+    statements = {'postgresql': POSTGRESQL_TRGM, 'sqlite': SQLITE_FTS}.get(schema_editor.connection.vendor)
+    if not statements:
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            for statement in statements:
+                schema_editor.execute(statement)
+    except DatabaseError:
+        # pg_trgm non autorisé / SQLite compilé sans FTS5
+        pass
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS cabinet_patient_recherche_trgm")
+    elif vendor == 'sqlite':
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cabinet', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='recherche',
+            field=models.CharField(blank=True, editable=False, help_text='Nom, prénom et téléphone normalisés (voir cabinet.services.recherche)', max_length=250, verbose_name='Texte de recherche'),
+        ),
+        migrations.RunPython(backfill_recherche, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_usagecounter'),
+        ('cabinet', '0002_patient_recherche'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='packmindoffice',
+            index=models.Index(fields=['organization', '-date_achat', '-id'], name='cabinet_pac_organiz_a36fad_idx'),
+        ),
+    ]
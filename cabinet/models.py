@@ -36,6 +36,13 @@ class Patient(TenantModel):  # ← Hérite de TenantModel
     )
     date_creation = models.DateTimeField(auto_now_add=True)
     date_modification = models.DateTimeField(auto_now=True)
+    recherche = models.CharField(
+        max_length=250,
+        blank=True,
+        editable=False,
+        verbose_name="Texte de recherche",
+        help_text="Nom, prénom et téléphone normalisés (voir cabinet.services.recherche)"
+    )
     
     class Meta:
         verbose_name = "Patient"
@@ -48,6 +55,14 @@ class Patient(TenantModel):  # ← Hérite de TenantModel
     def __str__(self):
         return f"{self.prenom} {self.nom}"
     
+    def save(self, *args, **kwargs):
+        from cabinet.services.recherche import texte_recherche
+        self.recherche = texte_recherche(self.nom, self.prenom, self.telephone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'nom', 'prenom', 'telephone'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'recherche'}
+        super().save(*args, **kwargs)
+    
     @property
     def age(self):
         """Calcule l'âge du patient"""
@@ -206,6 +221,9 @@ class PackMindOffice(TenantModel):  # ← Hérite de TenantModel
         verbose_name = "Pack Mind Office"
         verbose_name_plural = "Packs Mind Office"
         ordering = ['-date_achat']
+        indexes = [
+            models.Index(fields=['organization', '-date_achat', '-id']),
+        ]
     
     def __str__(self):
         return f"{self.nom_pack} - {self.seances_restantes} séances restantes"
@@ -0,0 +1,3 @@
+"""
+Services partagés par les vues du cabinet (statistiques, etc.)
+"""
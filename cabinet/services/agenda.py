@@ -0,0 +1,84 @@
+"""
+Flux FullCalendar des consultations.
+
+Le flux est limité à la fenêtre affichée (start/end, index organisation +
+date_seance) et sérialisé depuis .values(). Un ETag calculé par une
+agrégation (nombre de consultations, dernières modifications) permet de
+répondre 304 à une fenêtre inchangée sans relire les consultations ; since=
+ne renvoie que les consultations modifiées depuis un instant donné.
+"""
+import hashlib
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+EVENT_FIELDS = (
+    'id', 'patient_id', 'patient__prenom', 'patient__nom', 'date_seance', 'duree_minutes',
+    'type_consultation', 'statut_consultation', 'notes_cliniques',
+)
+
+
+def parse_instant(value):
+    """
+    Date ou date-heure ISO 8601 envoyée par FullCalendar → datetime aware.
+    None si la valeur est vide ; ValueError si elle est invalide.
+    """
+    if not value:
+        return None
+    # Un '+' de décalage horaire non encodé arrive comme un espace
+    value = value.strip().replace(' ', '+')
+    instant = parse_datetime(value)
+    if instant is None:
+        jour = parse_date(value)
+        if jour is None:
+            raise ValueError(f"Date invalide : {value}")
+        instant = datetime.combine(jour, time.min)
+    if timezone.is_naive(instant):
+        instant = timezone.make_aware(instant)
+    return instant
+
+
+def filtrer_fenetre(consultations, start=None, end=None):
+    """Consultations commençant dans [start, end[ (bornes facultatives)."""
+    if start is not None:
+        consultations = consultations.filter(date_seance__gte=start)
+    if end is not None:
+        consultations = consultations.filter(date_seance__lt=end)
+    return consultations
+
+
+def calculer_etag(consultations, *parametres):
+    """
+    ETag de la fenêtre : change dès qu'une consultation est ajoutée, modifiée
+    ou supprimée, ou qu'un patient affiché est renommé.
+    """
+    etat = consultations.order_by().aggregate(
+        nombre=Count('id'),
+        consultation=Max('date_modification'),
+        patient=Max('patient__date_modification'),
+    )
+    cle = '|'.join(str(valeur) for valeur in (*parametres, etat['nombre'], etat['consultation'], etat['patient']))
+    return '"%s"' % hashlib.md5(cle.encode()).hexdigest()
+
+
+def serialiser_evenement(consultation):
+    """Ligne .values(*EVENT_FIELDS) → événement FullCalendar."""
+    # Calculer l'heure de fin en ajoutant la durée
+    end_time = consultation['date_seance'] + timedelta(minutes=consultation['duree_minutes'])
+
+    return {
+        'id': consultation['id'],
+        'title': f"{consultation['patient__prenom']} {consultation['patient__nom']}",
+        'start': consultation['date_seance'].isoformat(),
+        'end': end_time.isoformat(),
+        'extendedProps': {
+            'patient_id': consultation['patient_id'],
+            'type': consultation['type_consultation'],
+            'statut': consultation['statut_consultation'],
+            'duree': consultation['duree_minutes'],
+            'notes': consultation['notes_cliniques'] or ''
+        }
+    }
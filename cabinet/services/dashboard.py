@@ -0,0 +1,139 @@
+"""
+Statistiques du dashboard du cabinet.
+
+Les compteurs sont calculés en deux requêtes : une agrégation conditionnelle
+sur les consultations (Count/Sum avec filter=Q(...)) et une ligne de
+l'organisation portant les sous-requêtes patients et packs. Le résultat est
+mis en cache par organisation pour le jour courant ; les signaux de
+Consultation, Patient et PackMindOffice l'invalident.
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, F, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+DASHBOARD_STATS_TTL = 120  # secondes
+
+
+def _cache_key(organization_id):
+    return f'cabinet:dashboard:{organization_id}'
+
+
+def _sous_requete(queryset, expression):
+    """Agrégat de queryset pour l'organisation de la ligne courante (0 si vide)."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(organization=OuterRef('pk'))
+            .order_by()
+            .values('organization')
+            .annotate(valeur=expression)
+            .values('valeur'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def _repartition(consultations, prefixe, choices, cle_nom):
+    """Répartition du mois par choix (lieu, type), dans l'ordre des choices, sans les choix absents."""
+    total = consultations['consultations_mois']
+    repartition = []
+    for valeur, nom in choices:
+        count = consultations[f'{prefixe}_{valeur}']
+        if count:
+            repartition.append({
+                cle_nom: nom,
+                'count': count,
+                'pourcentage': round((count / total * 100) if total > 0 else 0, 1)
+            })
+    return repartition
+
+
+def compute_dashboard_stats(organization_id, today=None):
+    """Compteurs, chiffre d'affaires, packs et répartitions du mois."""
+    from accounts.models import Organization
+    from cabinet.models import Consultation, Patient, PackMindOffice
+
+    today = today or timezone.now().date()
+
+    # Début du mois et de la semaine
+    debut_mois = today.replace(day=1)
+    debut_semaine = today - timedelta(days=today.weekday())
+
+    mois = Q(date_seance__gte=debut_mois)
+    semaine = Q(date_seance__gte=debut_semaine)
+    paye = Q(statut_paiement='paye')
+
+    # --- CONSULTATIONS, CHIFFRE D'AFFAIRES, MOYENNES, RÉPARTITIONS : une requête ---
+    agregats = {
+        'consultations_aujourdhui': Count('id', filter=Q(date_seance__date=today)),
+        'consultations_mois': Count('id', filter=mois),
+        'consultations_semaine': Count('id', filter=semaine),
+        'ca_mois': Sum('tarif', filter=mois & paye),
+        'ca_semaine': Sum('tarif', filter=semaine & paye),
+        'tarif_moyen': Avg('tarif'),
+        'duree_moyenne': Avg('duree_minutes'),
+    }
+    for valeur, _ in Consultation.LIEU_CONSULTATION_CHOICES:
+        agregats[f'lieu_{valeur}'] = Count('id', filter=mois & Q(lieu_consultation=valeur))
+    for valeur, _ in Consultation.TYPE_CONSULTATION_CHOICES:
+        agregats[f'type_{valeur}'] = Count('id', filter=mois & Q(type_consultation=valeur))
+
+    consultations = Consultation.all_objects.filter(organization_id=organization_id).aggregate(**agregats)
+
+    # --- PATIENTS ET PACKS : une requête (sous-requêtes sur la ligne de l'organisation) ---
+    packs_actifs = PackMindOffice.all_objects.filter(
+        statut='actif',
+        nombre_seances_utilisees__lt=F('nombre_seances_total')
+    )
+    cabinet = Organization.objects.filter(pk=organization_id).values(
+        total_patients=_sous_requete(Patient.all_objects.all(), Count('id')),
+        nouveaux_patients_mois=_sous_requete(
+            Patient.all_objects.filter(date_creation__gte=debut_mois), Count('id')
+        ),
+        packs_actifs=_sous_requete(packs_actifs, Count('id')),
+        seances_restantes=_sous_requete(
+            packs_actifs, Sum(F('nombre_seances_total') - F('nombre_seances_utilisees'))
+        ),
+    ).first() or {
+        'total_patients': 0, 'nouveaux_patients_mois': 0, 'packs_actifs': 0, 'seances_restantes': 0,
+    }
+
+    return {
+        'today': today,
+        'total_patients': cabinet['total_patients'],
+        'nouveaux_patients_mois': cabinet['nouveaux_patients_mois'],
+        'consultations_aujourdhui': consultations['consultations_aujourdhui'],
+        'consultations_mois': consultations['consultations_mois'],
+        'consultations_semaine': consultations['consultations_semaine'],
+        'ca_mois': consultations['ca_mois'] or 0,
+        'ca_semaine': consultations['ca_semaine'] or 0,
+        'packs_actifs': cabinet['packs_actifs'],
+        'seances_restantes': cabinet['seances_restantes'],
+        'tarif_moyen': consultations['tarif_moyen'] or 0,
+        'duree_moyenne': consultations['duree_moyenne'] or 60,
+        'stats_lieu': _repartition(
+            consultations, 'lieu', Consultation.LIEU_CONSULTATION_CHOICES, 'lieu_name'
+        ),
+        'stats_type': _repartition(
+            consultations, 'type', Consultation.TYPE_CONSULTATION_CHOICES, 'type_name'
+        ),
+    }
+
+
+def get_dashboard_stats(organization_id):
+    """Statistiques du jour pour l'organisation, depuis le cache si possible."""
+    today = timezone.now().date()
+    key = _cache_key(organization_id)
+    stats = cache.get(key)
+    if stats is None or stats['today'] != today:
+        stats = compute_dashboard_stats(organization_id, today)
+        cache.set(key, stats, DASHBOARD_STATS_TTL)
+    return stats
+
+
+def invalidate_dashboard_stats(organization_id):
+    cache.delete(_cache_key(organization_id))
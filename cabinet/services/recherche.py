@@ -0,0 +1,105 @@
+"""
+Recherche de patients.
+
+Chaque patient porte une colonne `recherche` normalisée (minuscules, sans
+accents, téléphone réduit à ses chiffres) : ' dupont jean 0612345678'. Un
+terme de recherche correspond au début d'un mot de cette colonne.
+
+- PostgreSQL : index GIN trigramme (pg_trgm) sur la colonne, utilisé par LIKE.
+- SQLite : table FTS5 externe (cabinet_patient_fts) tenue à jour par des
+  triggers, interrogée en préfixe ('dup*').
+- Sinon (ou FTS5 indisponible) : LIKE sur la colonne normalisée.
+"""
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+
+FTS_TABLE = 'cabinet_patient_fts'
+
+_fts_disponible = None
+
+
+def normaliser(texte):
+    """Minuscules, sans accents ni ponctuation, espaces simples."""
+    texte = unicodedata.normalize('NFKD', texte or '')
+    texte = ''.join(c for c in texte if not unicodedata.combining(c)).lower()
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', texte).split())
+
+
+def texte_recherche(nom, prenom, telephone):
+    """Valeur de la colonne recherche (espace initial : chaque mot commence par ' ')."""
+    chiffres = re.sub(r'\D', '', telephone or '')
+    return ' ' + ' '.join(mot for mot in (normaliser(nom), normaliser(prenom), chiffres) if mot)
+
+
+def termes(requete):
+    """Termes normalisés de la requête ; un numéro saisi par groupes ('06 12') forme un seul terme."""
+    mots = normaliser(requete).split()
+    if len(mots) > 1 and all(mot.isdigit() for mot in mots):
+        return [''.join(mots)]
+    return mots
+
+
+def fts_disponible():
+    """
+    La table FTS5 et ses triggers existent (base SQLite migrée avec FTS5).
+    Une reconstruction de cabinet_patient par une migration SQLite supprime
+    les triggers : la recherche repasse alors en LIKE.
+    """
+    global _fts_disponible
+    if _fts_disponible is None:
+        disponible = False
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (%s, %s, %s)",
+                    [f'{FTS_TABLE}_ai', f'{FTS_TABLE}_ad', f'{FTS_TABLE}_au']
+                )
+                disponible = cursor.fetchone()[0] == 3
+        # Mémorisé seulement une fois la vérification faite (une erreur ne fige pas le LIKE)
+        _fts_disponible = disponible
+    return _fts_disponible
+
+
+def rechercher_patients(patients, requete):
+    """Filtre le queryset : chaque terme doit commencer un mot du patient."""
+    mots = termes(requete)
+    if not mots:
+        return patients
+
+    if fts_disponible():
+        # Requête FTS5 : "terme"* pour chaque terme (ET implicite)
+        match = ' '.join(f'"{mot}"*' for mot in mots)
+        return patients.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        )
+
+    condition = Q()
+    for mot in mots:
+        condition &= Q(recherche__contains=' ' + mot)
+    return patients.filter(condition)
+
+
+def classer_patients(patients, requete):
+    """
+    Classement pour l'autocomplétion : nom égal au premier terme, puis nom
+    commençant par ce terme, puis autre mot (prénom, téléphone) ; à égalité,
+    ordre alphabétique.
+    """
+    mots = termes(requete)
+    if not mots:
+        return patients.order_by('nom', 'prenom')
+
+    premier = ' ' + mots[0]
+    return patients.annotate(
+        rang=Case(
+            When(Q(recherche__startswith=premier + ' ') | Q(recherche=premier), then=Value(0)),
+            When(recherche__startswith=premier, then=Value(1)),
+            default=Value(2),
+            output_field=IntegerField(),
+        )
+    ).order_by('rang', 'nom', 'prenom')
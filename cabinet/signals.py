@@ -0,0 +1,19 @@
+"""
+Invalidation des statistiques du dashboard mises en cache par organisation.
+"""
+from django.db.models.signals import post_save, post_delete
+
+from cabinet.models import Patient, Consultation, PackMindOffice
+from cabinet.services.dashboard import invalidate_dashboard_stats
+
+
+DASHBOARD_MODELS = (Patient, Consultation, PackMindOffice)
+
+
+def dashboard_data_changed(sender, instance, **kwargs):
+    invalidate_dashboard_stats(instance.organization_id)
+
+
+for model in DASHBOARD_MODELS:
+    post_save.connect(dashboard_data_changed, sender=model, dispatch_uid=f'dashboard_save_{model.__name__}')
+    post_delete.connect(dashboard_data_changed, sender=model, dispatch_uid=f'dashboard_delete_{model.__name__}')
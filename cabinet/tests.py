@@ -1,3 +1,385 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, F, Sum
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import License, Organization, User
+from cabinet.models import Consultation, PackMindOffice, Patient
+from cabinet.services.dashboard import compute_dashboard_stats, get_dashboard_stats
+from cabinet.services.recherche import classer_patients, fts_disponible, rechercher_patients
+from core.pagination import KeysetPaginator
+
+
+class KeysetPaginationPacksTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name="Cabinet", slug="cabinet")
+        # Ex-aequo sur la date d'achat : départagés par l'id
+        dates = [date(2025, 3, 1)] * 7 + [date(2025, 2, 1), date(2025, 4, 1), date(2025, 4, 1)]
+        for i, date_achat in enumerate(dates):
+            PackMindOffice.all_objects.create(
+                organization=cls.organization, nom_pack=f"Pack {i}", nombre_seances_total=10,
+                nombre_seances_utilisees=i % 4, date_achat=date_achat, prix_pack=Decimal('500'),
+                statut='actif' if i % 3 else 'expire',
+            )
+        cls.attendu = list(
+            PackMindOffice.all_objects.order_by('-date_achat', '-id').values_list('id', flat=True)
+        )
+
+    def paginator(self):
+        return KeysetPaginator(PackMindOffice.all_objects.all(), ('-date_achat',), 3, count='exact')
+
+    def test_pages_suivantes_puis_precedentes(self):
+        paginator = self.paginator()
+        page = paginator.get_page(None)
+        pages = [page]
+        while page.has_next():
+            page = paginator.get_page(page.next_cursor)
+            pages.append(page)
+
+        ids = [pack.id for page in pages for pack in page]
+        self.assertEqual(ids, self.attendu)
+        self.assertEqual([(p.start_index(), p.end_index()) for p in pages], [(1, 3), (4, 6), (7, 9), (10, 10)])
+
+        # Retour en arrière depuis la dernière page : mêmes pages, mêmes rangs
+        retour = [page]
+        while page.has_previous():
+            page = paginator.get_page(page.previous_cursor)
+            retour.append(page)
+        self.assertEqual(
+            [[pack.id for pack in p] for p in reversed(retour)],
+            [[pack.id for pack in p] for p in pages],
+        )
+        self.assertEqual(retour[-1].start_index(), 1)
+        self.assertFalse(retour[-1].has_previous())
+
+    def test_curseur_altere_ramene_a_la_premiere_page(self):
+        page = self.paginator().get_page('curseur-invalide')
+        self.assertEqual([pack.id for pack in page], self.attendu[:3])
+
+    def test_liste_des_packs(self):
+        user = User.objects.create_user(username='psy', password='x', organization=self.organization)
+        self.client.force_login(user)
+
+        response = self.client.get(reverse('cabinet:packs_list'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_packs'], 10)
+        self.assertEqual(response.context['packs_actifs'], 6)
+        self.assertEqual(response.context['seances_totales_restantes'], sum(10 - i % 4 for i in range(10)))
+        self.assertEqual([pack.id for pack in response.context['page_obj']], self.attendu[:20])
+
+
+
+class ConsultationsApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name="Cabinet", slug="cabinet")
+        License.objects.create(organization=cls.organization, plan='lifetime')
+        cls.user = User.objects.create_user(username='psy', password='x', organization=cls.organization)
+        cls.patient = Patient.all_objects.create(
+            organization=cls.organization, nom="Dupont", prenom="Marie", date_naissance=date(1990, 1, 1)
+        )
+        autre = Organization.objects.create(name="Autre", slug="autre")
+        autre_patient = Patient.all_objects.create(
+            organization=autre, nom="Martin", prenom="Paul", date_naissance=date(1990, 1, 1)
+        )
+        cls.consultations = [
+            cls.creer_consultation(cls.patient, datetime(2025, 3, jour, 10, tzinfo=dt_timezone.utc))
+            for jour in (3, 10, 17)
+        ]
+        # Hors fenêtre, et dans une autre organisation
+        cls.creer_consultation(cls.patient, datetime(2025, 4, 7, 10, tzinfo=dt_timezone.utc))
+        cls.creer_consultation(autre_patient, datetime(2025, 3, 10, 11, tzinfo=dt_timezone.utc))
+
+    @staticmethod
+    def creer_consultation(patient, date_seance):
+        return Consultation.all_objects.create(
+            organization=patient.organization, patient=patient, date_seance=date_seance, tarif=Decimal('300'),
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get(self, headers=None, **parametres):
+        parametres.setdefault('start', '2025-03-01')
+        parametres.setdefault('end', '2025-04-01')
+        return self.client.get(reverse('cabinet:consultations_api'), parametres, headers=headers)
+
+    def test_fenetre_start_end(self):
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        events = sorted(response.json(), key=lambda event: event['id'])
+        self.assertEqual([event['id'] for event in events], [c.id for c in self.consultations])
+        self.assertEqual(events[0]['title'], "Marie Dupont")
+        self.assertEqual(events[0]['end'], '2025-03-03T11:00:00+00:00')
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_fenetre_inchangee_repond_304(self):
+        etag = self.get()['ETag']
+
+        response = self.get(headers={'If-None-Match': etag})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        # Une autre fenêtre a son propre ETag
+        self.assertEqual(self.get(headers={'If-None-Match': etag}, end='2025-03-15').status_code, 200)
+
+    def test_modification_ou_suppression_change_l_etag(self):
+        etag = self.get()['ETag']
+
+        consultation = self.consultations[1]
+        consultation.notes_cliniques = "Séance déplacée"
+        consultation.save()
+        response = self.get(headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        etag = response['ETag']
+        self.consultations[0].delete()
+        response = self.get(headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()), 2)
+
+    def test_date_invalide(self):
+        response = self.get(start='pas-une-date')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.json())
+
+    def test_reponse_delta_since(self):
+        response = self.get(since='2000-01-01')
+        server_time = response.json()['server_time']
+        self.assertEqual(len(response.json()['events']), 3)
+
+        modifiee, supprimee = self.consultations[1], self.consultations[2]
+        modifiee.duree_minutes = 90
+        modifiee.save()
+        supprimee.delete()
+
+        delta = self.get(since=server_time).json()
+
+        self.assertEqual([event['id'] for event in delta['events']], [modifiee.id])
+        self.assertEqual(delta['events'][0]['extendedProps']['duree'], 90)
+        self.assertEqual(sorted(delta['ids']), [self.consultations[0].id, modifiee.id])
+        self.assertGreater(delta['server_time'], server_time)
+
+
+class RecherchePatientsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name="Cabinet", slug="cabinet")
+        License.objects.create(organization=cls.organization, plan='lifetime')
+        cls.user = User.objects.create_user(username='psy', password='x', organization=cls.organization)
+        cls.patients = {}
+        for nom, prenom, telephone in [
+            ("Éloïse", "Zoé", "06 12 34 56 78"),
+            ("Dupont", "Jean", "0611111111"),
+            ("Dupontel", "Albert", ""),
+            ("Martin", "Dupuis", "0622222222"),
+            ("Durand", "Jeanne", "+212 6 33 33 33 33"),
+        ]:
+            cls.patients[nom] = Patient.all_objects.create(
+                organization=cls.organization, nom=nom, prenom=prenom, telephone=telephone,
+                date_naissance=date(1990, 1, 1),
+            )
+
+    def rechercher(self, requete, fts):
+        with mock.patch('cabinet.services.recherche.fts_disponible', return_value=fts):
+            patients = classer_patients(rechercher_patients(Patient.all_objects.all(), requete), requete)
+            return list(patients.values_list('nom', flat=True))
+
+    def test_fts5_disponible(self):
+        self.assertTrue(fts_disponible())
+
+    def test_recherche_fts5_et_like(self):
+        cas = [
+            # Accents ignorés, dans la requête comme dans les noms
+            ("eloise", ["Éloïse"]),
+            ("ÉLOÏSE zoe", ["Éloïse"]),
+            # Numéro saisi par groupes, ou partiel
+            ("06 12 34", ["Éloïse"]),
+            ("0612345678", ["Éloïse"]),
+            ("212 6 33", ["Durand"]),
+            ("34 56", []),
+            # Préfixes de plusieurs termes (ET)
+            ("dup jea", ["Dupont"]),
+            ("du je", ["Dupont", "Durand"]),
+            ("dupont albert", ["Dupontel"]),
+            # Début de mot uniquement
+            ("pont", []),
+        ]
+        for fts in (True, False):
+            for requete, attendu in cas:
+                with self.subTest(requete=requete, fts=fts):
+                    self.assertEqual(sorted(self.rechercher(requete, fts)), sorted(attendu))
+
+    def test_classement(self):
+        for fts in (True, False):
+            with self.subTest(fts=fts):
+                # Nom égal au terme, puis nom qui commence par le terme, puis prénom
+                self.assertEqual(self.rechercher("dupont", fts), ["Dupont", "Dupontel"])
+                self.assertEqual(self.rechercher("dup", fts), ["Dupont", "Dupontel", "Martin"])
+
+    def test_api_recherche(self):
+        self.client.force_login(self.user)
+
+        # Premier appel du processus : la détection FTS5 se fait depuis la vue async
+        with mock.patch('cabinet.services.recherche._fts_disponible', None):
+            response = self.client.get(reverse('cabinet:patients_recherche_api'), {'q': 'Dup'})
+
+        self.assertEqual(response.status_code, 200)
+        resultats = response.json()['results']
+        self.assertEqual([r['nom_complet'] for r in resultats], ["Jean Dupont", "Albert Dupontel", "Dupuis Martin"])
+        self.assertEqual(resultats[0]['telephone'], "0611111111")
+        self.assertEqual(
+            resultats[0]['url'], reverse('cabinet:patient_detail', args=[self.patients["Dupont"].id])
+        )
+        self.assertEqual(
+            self.client.get(reverse('cabinet:patients_recherche_api'), {'q': ' - '}).json(), {'results': []}
+        )
+
+
+def ancien_dashboard_stats(organization, today):
+    """Statistiques calculées requête par requête, comme l'ancienne vue du dashboard."""
+    debut_mois = today.replace(day=1)
+    debut_semaine = today - timedelta(days=today.weekday())
+    patients = Patient.all_objects.filter(organization=organization)
+    consultations = Consultation.all_objects.filter(organization=organization)
+    packs_actifs = PackMindOffice.all_objects.filter(
+        organization=organization, statut='actif'
+    ).filter(nombre_seances_utilisees__lt=F('nombre_seances_total'))
+    moyennes = consultations.aggregate(tarif_moyen=Avg('tarif'), duree_moyenne=Avg('duree_minutes'))
+
+    def repartition(champ, choices, cle_nom):
+        stats = consultations.filter(date_seance__gte=debut_mois).values(champ).annotate(count=Count('id'))
+        total = sum(s['count'] for s in stats)
+        return [
+            {
+                cle_nom: dict(choices).get(s[champ], s[champ]),
+                'count': s['count'],
+                'pourcentage': round((s['count'] / total * 100) if total > 0 else 0, 1),
+            }
+            for s in stats
+        ]
+
+    return {
+        'today': today,
+        'total_patients': patients.count(),
+        'nouveaux_patients_mois': patients.filter(date_creation__gte=debut_mois).count(),
+        'consultations_aujourdhui': consultations.filter(date_seance__date=today).count(),
+        'consultations_mois': consultations.filter(date_seance__gte=debut_mois).count(),
+        'consultations_semaine': consultations.filter(date_seance__gte=debut_semaine).count(),
+        'ca_mois': consultations.filter(
+            date_seance__gte=debut_mois, statut_paiement='paye'
+        ).aggregate(total=Sum('tarif'))['total'] or 0,
+        'ca_semaine': consultations.filter(
+            date_seance__gte=debut_semaine, statut_paiement='paye'
+        ).aggregate(total=Sum('tarif'))['total'] or 0,
+        'packs_actifs': packs_actifs.count(),
+        'seances_restantes': sum(pack.seances_restantes for pack in packs_actifs),
+        'tarif_moyen': moyennes['tarif_moyen'] or 0,
+        'duree_moyenne': moyennes['duree_moyenne'] or 60,
+        'stats_lieu': repartition('lieu_consultation', Consultation.LIEU_CONSULTATION_CHOICES, 'lieu_name'),
+        'stats_type': repartition('type_consultation', Consultation.TYPE_CONSULTATION_CHOICES, 'type_name'),
+    }
+
+
+class StatistiquesDashboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name="Cabinet", slug="cabinet")
+        cls.autre = Organization.objects.create(name="Autre", slug="autre")
+        maintenant = timezone.now()
+        for organization in (cls.organization, cls.autre):
+            patients = [
+                Patient.all_objects.create(
+                    organization=organization, nom=f"Patient {i}", prenom="Test", date_naissance=date(1990, 1, 1)
+                )
+                for i in range(3)
+            ]
+            # Un patient créé l'an dernier
+            Patient.all_objects.filter(pk=patients[0].pk).update(date_creation=maintenant - timedelta(days=400))
+
+            lieux = [valeur for valeur, _ in Consultation.LIEU_CONSULTATION_CHOICES]
+            types = [valeur for valeur, _ in Consultation.TYPE_CONSULTATION_CHOICES]
+            paiements = ['paye', 'attente', 'paye', 'annule']
+            for i, jours in enumerate([0, 0, 1, 3, 6, 12, 20, 35, 70, -2]):
+                Consultation.all_objects.create(
+                    organization=organization, patient=patients[i % 3],
+                    date_seance=maintenant - timedelta(days=jours),
+                    tarif=Decimal(300 + 50 * i), duree_minutes=45 + 15 * (i % 3),
+                    statut_paiement=paiements[i % 4], lieu_consultation=lieux[i % 2],
+                    type_consultation=types[i % 3],
+                )
+
+            for i, (utilisees, statut) in enumerate([(2, 'actif'), (10, 'actif'), (4, 'actif'), (0, 'expire')]):
+                PackMindOffice.all_objects.create(
+                    organization=organization, nom_pack=f"Pack {i}", nombre_seances_total=10,
+                    nombre_seances_utilisees=utilisees, date_achat=date(2025, 1, 1),
+                    prix_pack=Decimal('2500'), statut=statut,
+                )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_identique_a_l_ancienne_vue(self):
+        today = timezone.now().date()
+
+        with self.assertNumQueries(2):
+            stats = compute_dashboard_stats(self.organization.id, today)
+        attendu = ancien_dashboard_stats(self.organization, today)
+
+        # L'ancienne vue suivait l'ordre de la base pour les répartitions
+        for cle in ('stats_lieu', 'stats_type'):
+            self.assertCountEqual(stats.pop(cle), attendu.pop(cle))
+        self.assertEqual(stats, attendu)
+        self.assertEqual(attendu['packs_actifs'], 2)
+        self.assertEqual(attendu['nouveaux_patients_mois'], 2)
+
+    def test_organisation_sans_donnees(self):
+        organization = Organization.objects.create(name="Vide", slug="vide")
+        today = timezone.now().date()
+
+        self.assertEqual(compute_dashboard_stats(organization.id, today), ancien_dashboard_stats(organization, today))
+
+    def test_enregistrement_d_une_consultation_invalide_le_cache(self):
+        stats = get_dashboard_stats(self.organization.id)
+        consultation = Consultation.all_objects.filter(organization=self.organization, statut_paiement='attente').first()
+
+        # Sans signal (update()), le cache est servi tel quel
+        Consultation.all_objects.filter(pk=consultation.pk).update(duree_minutes=300)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_dashboard_stats(self.organization.id), stats)
+
+        consultation.refresh_from_db()
+        consultation.statut_paiement = 'paye'
+        consultation.save()
+
+        nouvelles = get_dashboard_stats(self.organization.id)
+        self.assertNotEqual(nouvelles['duree_moyenne'], stats['duree_moyenne'])
+        self.assertEqual(nouvelles['ca_mois'], stats['ca_mois'] + consultation.tarif)
 
-# Create your tests here.
+        # Seul le cache de l'organisation concernée est invalidé
+        stats_autre = get_dashboard_stats(self.autre.id)
+        Consultation.all_objects.create(
+            organization=self.organization, patient=consultation.patient, date_seance=timezone.now(),
+            tarif=Decimal('300'),
+        )
+        self.assertEqual(
+            get_dashboard_stats(self.organization.id)['consultations_aujourdhui'],
+            nouvelles['consultations_aujourdhui'] + 1,
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(get_dashboard_stats(self.autre.id), stats_autre)
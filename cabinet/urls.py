@@ -9,6 +9,7 @@ urlpatterns = [
     
     # Patients
     path('patients/', views.patients_list, name='patients_list'),
+    path('patients/recherche/', views.patients_recherche_api, name='patients_recherche_api'),
     path('patients/create/', views.patient_create, name='patient_create'),
     path('patients/<int:patient_id>/', views.patient_detail, name='patient_detail'),
     path('patients/<int:patient_id>/edit/', views.patient_edit, name='patient_edit'),
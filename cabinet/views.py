@@ -1,10 +1,9 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, Sum, Avg, Q, F
-from django.core.paginator import Paginator
+from django.db.models import Count, Sum, Q, F
+from core.pagination import KeysetPaginator
 from django.utils import timezone
-from datetime import timedelta
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 import json
@@ -16,146 +15,44 @@ from django.utils.dateparse import parse_datetime
 from django.http import FileResponse, Http404
 from .models import PatientFichier
 from .forms import PatientFichierForm
+from accounts.quotas import reserver_quota, QuotaAtteint, get_usage
+from .services.dashboard import get_dashboard_stats
+from .services.agenda import EVENT_FIELDS, parse_instant, filtrer_fenetre, calculer_etag, serialiser_evenement
+from django.utils.cache import get_conditional_response, patch_cache_control
+from .services.recherche import termes, fts_disponible, rechercher_patients, classer_patients
+from asgiref.sync import sync_to_async
+from django.urls import reverse
 import os
 
 
+# Nombre de suggestions renvoyées par l'autocomplétion des patients
+PATIENTS_RECHERCHE_LIMITE = 10
+
 
 @login_required
 def dashboard_view(request):
     """
     Vue principale du dashboard avec toutes les statistiques
     """
-    user = request.user
-    organization = user.organization
-    today = timezone.now().date()
-    
-    # Début du mois et de la semaine
-    debut_mois = today.replace(day=1)
-    debut_semaine = today - timedelta(days=today.weekday())
+    organization = request.user.organization
     
-    # --- PATIENTS ---
-    total_patients = Patient.objects.filter(organization=organization).count()
-    nouveaux_patients_mois = Patient.objects.filter(
-        organization=organization,
-        date_creation__gte=debut_mois
-    ).count()
+    # Compteurs, chiffre d'affaires, packs et répartitions (2 requêtes, cache par organisation)
+    context = dict(get_dashboard_stats(request.user.organization_id))
     
-    patients_recents = Patient.objects.filter(
+    # Listes toujours à jour
+    context['patients_recents'] = Patient.objects.filter(
         organization=organization
     ).order_by('-date_creation')[:5]
     
-    # --- CONSULTATIONS ---
-    consultations_aujourdhui = Consultation.objects.filter(
-        organization=organization,
-        date_seance__date=today
-    ).count()
-    
-    consultations_mois = Consultation.objects.filter(
-        organization=organization,
-        date_seance__gte=debut_mois
-    ).count()
-    
-    consultations_semaine = Consultation.objects.filter(
-        organization=organization,
-        date_seance__gte=debut_semaine
-    ).count()
-    
-    # Prochaines consultations
-    prochaines_consultations = Consultation.objects.filter(
+    context['prochaines_consultations'] = Consultation.objects.filter(
         organization=organization,
         date_seance__gte=timezone.now()
     ).select_related('patient').order_by('date_seance')[:10]
     
-    # --- CHIFFRE D'AFFAIRES ---
-    ca_mois = Consultation.objects.filter(
-        organization=organization,
-        date_seance__gte=debut_mois,
-        statut_paiement='paye'
-    ).aggregate(total=Sum('tarif'))['total'] or 0
-    
-    ca_semaine = Consultation.objects.filter(
-        organization=organization,
-        date_seance__gte=debut_semaine,
-        statut_paiement='paye'
-    ).aggregate(total=Sum('tarif'))['total'] or 0
-    
-    # --- PACKS ---
-    packs_actifs = PackMindOffice.objects.filter(
-        organization=organization,
-        statut='actif'
-    ).filter(nombre_seances_utilisees__lt=F('nombre_seances_total')).count()
-    
-    # Pour les séances restantes, on doit calculer manuellement
-    seances_restantes = sum([
-        pack.seances_restantes 
-        for pack in PackMindOffice.objects.filter(
-            organization=organization,
-            statut='actif'
-        ).filter(nombre_seances_utilisees__lt=F('nombre_seances_total'))
-    ])
-    
-    # --- STATISTIQUES MOYENNES ---
-    stats_moyennes = Consultation.objects.filter(
-        organization=organization
-    ).aggregate(
-        tarif_moyen=Avg('tarif'),
-        duree_moyenne=Avg('duree_minutes')
-    )
-    
-    # --- RÉPARTITION PAR LIEU ---
-    stats_lieu = Consultation.objects.filter(
-        organization=organization,
-        date_seance__gte=debut_mois
-    ).values('lieu_consultation').annotate(count=Count('id'))
-    
-    total_lieu = sum([s['count'] for s in stats_lieu])
-    stats_lieu_formatted = []
-    lieu_dict = dict(Consultation.LIEU_CONSULTATION_CHOICES)
-    
-    for stat in stats_lieu:
-        stats_lieu_formatted.append({
-            'lieu_name': lieu_dict.get(stat['lieu_consultation'], stat['lieu_consultation']),
-            'count': stat['count'],
-            'pourcentage': round((stat['count'] / total_lieu * 100) if total_lieu > 0 else 0, 1)
-        })
-    
-    # --- RÉPARTITION PAR TYPE ---
-    stats_type = Consultation.objects.filter(
-        organization=organization,
-        date_seance__gte=debut_mois
-    ).values('type_consultation').annotate(count=Count('id'))
-    
-    total_type = sum([s['count'] for s in stats_type])
-    stats_type_formatted = []
-    type_dict = dict(Consultation.TYPE_CONSULTATION_CHOICES)
-    
-    for stat in stats_type:
-        stats_type_formatted.append({
-            'type_name': type_dict.get(stat['type_consultation'], stat['type_consultation']),
-            'count': stat['count'],
-            'pourcentage': round((stat['count'] / total_type * 100) if total_type > 0 else 0, 1)
-        })
-    
-    context = {
-        'today': today,
-        'total_patients': total_patients,
-        'nouveaux_patients_mois': nouveaux_patients_mois,
+    context.update({
         'evolution_patients': 0,  # À calculer si nécessaire
-        'consultations_aujourdhui': consultations_aujourdhui,
-        'consultations_mois': consultations_mois,
-        'consultations_semaine': consultations_semaine,
-        'ca_mois': ca_mois,
-        'ca_semaine': ca_semaine,
-        'packs_actifs': packs_actifs,
-        'seances_restantes': seances_restantes,
-        'prochaines_consultations': prochaines_consultations,
-        'patients_recents': patients_recents,
-        'tarif_moyen': stats_moyennes['tarif_moyen'] or 0,
-        'duree_moyenne': stats_moyennes['duree_moyenne'] or 60,
         'taux_remplissage': 75,  # À calculer selon ta logique
-        'stats_lieu': stats_lieu_formatted,
-        'stats_type': stats_type_formatted,
-    }
+    })
     
     return render(request, 'cabinet/dashboard.html', context)
 
@@ -170,28 +67,60 @@ def patients_list(request):
     else:
         patients = Patient.objects.all()
     
-    # Recherche
+    # Recherche (colonne normalisée, voir cabinet.services.recherche)
     search_query = request.GET.get('search', '')
     if search_query:
-        patients = patients.filter(
-            Q(nom__icontains=search_query) |
-            Q(prenom__icontains=search_query) |
-            Q(telephone__icontains=search_query)
-        )
+        patients = rechercher_patients(patients, search_query)
     
-    # Pagination
-    paginator = Paginator(patients.order_by('nom', 'prenom'), 15)
-    page_obj = paginator.get_page(request.GET.get('page'))
+    # Pagination par clé (nom, prénom) : coût constant quelle que soit la page
+    if search_query or request.user.is_superadmin():
+        total = 'approx'
+    else:
+        # Compteur d'utilisation de l'organisation : une ligne lue au lieu d'un COUNT
+        total = get_usage(request.user.organization_id, 'patients')
+    paginator = KeysetPaginator(patients, ('nom', 'prenom'), 15, count=total)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     context = {
         'page_obj': page_obj,
         'search_query': search_query,
-        'total_patients': patients.count(),
+        'total_patients': paginator.count_display,
     }
     
     return render(request, 'cabinet/patients_list.html', context)
 
 
+@login_required
+async def patients_recherche_api(request):
+    """
+    Autocomplétion des patients (JSON) : ?q=dup jea → patients dont un mot
+    commence par chaque terme, les noms correspondants en premier.
+    """
+    user = await request.auser()
+    requete = request.GET.get('q', '')
+    if not termes(requete):
+        return JsonResponse({'results': []})
+    
+    if user.is_superadmin():
+        patients = Patient.all_objects.all()
+    else:
+        patients = Patient.objects.all()
+    
+    # Détection FTS5 (requête SQL au premier appel) hors de la boucle async
+    await sync_to_async(fts_disponible)()
+    patients = classer_patients(rechercher_patients(patients, requete), requete)
+    results = [
+        {
+            'id': patient['id'],
+            'nom_complet': f"{patient['prenom']} {patient['nom']}",
+            'telephone': patient['telephone'] or '',
+            'url': reverse('cabinet:patient_detail', args=[patient['id']]),
+        }
+        async for patient in patients.values('id', 'nom', 'prenom', 'telephone')[:PATIENTS_RECHERCHE_LIMITE]
+    ]
+    return JsonResponse({'results': results})
+
+
 @login_required
 def patient_create(request):
     """Créer un patient"""
@@ -215,7 +144,15 @@ def patient_create(request):
             # Auto-assigner l'organisation
             if not request.user.is_superadmin():
                 patient.organization = request.user.organization
-            patient.save()
+            try:
+                with reserver_quota(request.user, 'patients'):
+                    patient.save()
+            except QuotaAtteint as e:
+                messages.error(
+                    request,
+                    f"Limite de patients atteinte ! Votre licence autorise {e.limit} patients maximum."
+                )
+                return redirect('cabinet:patients_list')
             messages.success(request, f"Patient {patient.nom_complet} créé avec succès!")
             return redirect('cabinet:patient_detail', patient_id=patient.id)
         else:
@@ -383,9 +320,9 @@ def consultations_list(request):
     if statut_filter:
         consultations = consultations.filter(statut_paiement=statut_filter)
     
-    # Pagination
-    paginator = Paginator(consultations.order_by('-date_seance'), 20)
-    page_obj = paginator.get_page(request.GET.get('page'))
+    # Pagination par clé (date de séance) : coût constant quelle que soit la page
+    paginator = KeysetPaginator(consultations, ('-date_seance',), 20)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     context = {
         'page_obj': page_obj,
@@ -595,8 +532,7 @@ def consultation_delete(request, consultation_id):
 def packs_list(request):
     organization = request.user.organization
     
-    # Récupérer tous les packs
-    packs = PackMindOffice.objects.filter(organization=organization).order_by('-date_achat')
+    packs = PackMindOffice.objects.filter(organization=organization)
     
     # Filtres
     search_query = request.GET.get('search', '')
@@ -608,20 +544,26 @@ def packs_list(request):
     if statut_filter:
         packs = packs.filter(statut=statut_filter)
     
-    # Statistiques
-    total_packs = packs.count()
-    packs_actifs = packs.filter(statut='actif').count()
-    seances_totales_restantes = sum([p.seances_restantes for p in packs])
-    chiffre_affaires_packs = packs.aggregate(total=Sum('prix_pack'))['total'] or 0
+    # Statistiques (une seule requête d'agrégation)
+    stats = packs.aggregate(
+        total=Count('id'),
+        actifs=Count('id', filter=Q(statut='actif')),
+        seances_restantes=Sum(F('nombre_seances_total') - F('nombre_seances_utilisees')),
+        chiffre_affaires=Sum('prix_pack'),
+    )
+    
+    # Pagination par clé (date d'achat) : coût constant quelle que soit la page
+    paginator = KeysetPaginator(packs, ('-date_achat',), 20, count=stats['total'])
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     context = {
-        'packs': packs,
+        'page_obj': page_obj,
         'search_query': search_query,
         'statut_filter': statut_filter,
-        'total_packs': total_packs,
-        'packs_actifs': packs_actifs,
-        'seances_totales_restantes': seances_totales_restantes,
-        'chiffre_affaires_packs': chiffre_affaires_packs,
+        'total_packs': stats['total'],
+        'packs_actifs': stats['actifs'],
+        'seances_totales_restantes': stats['seances_restantes'] or 0,
+        'chiffre_affaires_packs': stats['chiffre_affaires'] or 0,
     }
     
     return render(request, 'cabinet/packs_list.html', context)
@@ -759,35 +701,50 @@ def agenda(request):
 # API pour récupérer les consultations (format FullCalendar)
 # API pour récupérer les consultations (format FullCalendar)
 @login_required
-def consultations_api(request):
-    """API JSON pour FullCalendar"""
-    organization = request.user.organization
+async def consultations_api(request):
+    """
+    API JSON pour FullCalendar (vue async : le filtrage par organisation suit le contexte tenant)
     
-    if request.user.is_superadmin():
-        consultations = Consultation.all_objects.select_related('patient').all()
-    else:
-        consultations = Consultation.objects.select_related('patient').all()
+    Paramètres GET :
+        start, end : fenêtre affichée (ISO 8601), envoyée par FullCalendar
+        since : ne renvoyer que les consultations modifiées depuis cet instant ;
+            la réponse devient {'events', 'ids', 'server_time'}, où ids liste les
+            consultations encore présentes (pour retirer les supprimées) et
+            server_time sert de since à l'appel suivant
     
-    events = []
-    for consultation in consultations:
-        # Calculer l'heure de fin en ajoutant la durée
-        end_time = consultation.date_seance + timedelta(minutes=consultation.duree_minutes)
+    Répond 304 lorsque l'ETag de la fenêtre correspond à If-None-Match.
+    """
+    user = await request.auser()
+    
+    try:
+        start = parse_instant(request.GET.get('start'))
+        end = parse_instant(request.GET.get('end'))
+        since = parse_instant(request.GET.get('since'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    if user.is_superadmin():
+        consultations = Consultation.all_objects.all()
+    else:
+        consultations = Consultation.objects.all()
+    consultations = filtrer_fenetre(consultations, start, end)
+    
+    etag = await sync_to_async(calculer_etag)(consultations, user.organization_id, start, end, since)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        server_time = timezone.now()
+        modifiees = consultations.filter(date_modification__gt=since) if since else consultations
+        events = [serialiser_evenement(consultation) async for consultation in modifiees.values(*EVENT_FIELDS)]
         
-        events.append({
-            'id': consultation.id,
-            'title': f"{consultation.patient.prenom} {consultation.patient.nom}",
-            'start': consultation.date_seance.isoformat(),
-            'end': end_time.isoformat(),
-            'extendedProps': {
-                'patient_id': consultation.patient.id,
-                'type': consultation.type_consultation,
-                'statut': consultation.statut_consultation,  # ← Corrigé (c'était 'statut')
-                'duree': consultation.duree_minutes,
-                'notes': consultation.notes_cliniques or ''  # ← Corrigé (c'était 'notes')
-            }
-        })
-    
-    return JsonResponse(events, safe=False)
+        if since is None:
+            response = JsonResponse(events, safe=False)
+        else:
+            ids = [consultation_id async for consultation_id in consultations.values_list('id', flat=True)]
+            response = JsonResponse({'events': events, 'ids': ids, 'server_time': server_time.isoformat()})
+    
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 # Créer consultation (AJAX)
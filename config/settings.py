@@ -89,6 +89,9 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # Écritures concurrentes (pool de rendu des rapports) : attente du verrou
+            # au lieu d'un « database is locked » immédiat
+            'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
         }
     }
 
@@ -119,6 +122,16 @@ if not DEBUG:
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Rapports des tests (hors MEDIA_ROOT : servis par les vues après contrôle d'accès)
+RAPPORTS_PDF_ROOT = BASE_DIR / 'rapports'
+# True : rendu par la commande rendre_rapports ; False : rendu dans la requête (mis en cache)
+RAPPORTS_PDF_ASYNC = os.environ.get('RAPPORTS_PDF_ASYNC', 'False') == 'True'
+# Processus de rendu d'un export groupé (tests_psy.services.export)
+RAPPORTS_EXPORT_WORKERS = int(os.environ.get('RAPPORTS_EXPORT_WORKERS', '2'))
+# Attente maximale (secondes) des rapports rendus par un autre processus pendant
+# un export : à garder sous le timeout des workers gunicorn (30 s par défaut)
+RAPPORTS_EXPORT_ATTENTE = int(os.environ.get('RAPPORTS_EXPORT_ATTENTE', '20'))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # CORS
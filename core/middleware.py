@@ -1,68 +1,147 @@
 from django.http import HttpResponseForbidden
 from django.shortcuts import redirect
-from threading import local
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from contextvars import ContextVar
+from functools import wraps
+import logging
 
-# Contexte local pour stocker le tenant actuel
-_thread_locals = local()
+from accounts.tenancy import get_tenant_context, attach_tenant_context
+
+logger = logging.getLogger(__name__)
+
+# Tenant courant : une valeur par contexte (requête, tâche asyncio, thread),
+# jamais partagée entre deux requêtes servies par le même thread ou la même boucle
+_current_tenant = ContextVar('current_tenant', default=None)
 
 
 def get_current_tenant():
     """Récupère l'organisation du contexte actuel"""
-    return getattr(_thread_locals, 'tenant', None)
+    return _current_tenant.get()
 
 
 def set_current_tenant(tenant):
-    """Définit l'organisation dans le contexte actuel"""
-    _thread_locals.tenant = tenant
+    """Définit l'organisation dans le contexte actuel (préférer tenant_context)"""
+    return _current_tenant.set(tenant)
+
+
+class tenant_context:
+    """
+    Définit l'organisation courante le temps d'un bloc ou d'un appel,
+    pour les scripts, commandes et tâches de fond (hors requête).
+
+    Usage:
+        with tenant_context(organization):
+            Patient.objects.all()
+
+        @tenant_context(organization)
+        def ma_tache():
+            ...
+    """
+
+    def __init__(self, tenant):
+        self.tenant = tenant
+        self._tokens = []
+
+    def __enter__(self):
+        self._tokens.append(_current_tenant.set(self.tenant))
+        return self.tenant
+
+    def __exit__(self, *exc_info):
+        _current_tenant.reset(self._tokens.pop())
+
+    def __call__(self, func):
+        if iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tenant_context(self.tenant):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with tenant_context(self.tenant):
+                return func(*args, **kwargs)
+        return wrapper
 
 
 class TenantMiddleware:
     """
     Middleware qui attache l'organisation de l'utilisateur à chaque requête.
     Cela permet de filtrer automatiquement les données par organisation.
+
+    Compatible WSGI et ASGI : sous ASGI, la résolution (utilisateur, cache
+    tenant) se fait dans un thread et le tenant est posé dans le contexte de
+    la requête, visible des vues async comme des vues synchrones.
     """
-    
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        response = self.resolve_tenant(request)
+        if response is not None:
+            return response
+
+        # Le contexte est restauré après la requête
+        with tenant_context(request.tenant):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        response = await sync_to_async(self.resolve_tenant)(request)
+        if response is not None:
+            return response
+
+        with tenant_context(request.tenant):
+            return await self.get_response(request)
+
+    def resolve_tenant(self, request):
+        """
+        Pose request.tenant et request.tenant_context.
+        Retourne une réponse si l'accès doit être refusé.
+        """
+        request.tenant = None
+
         # Ajouter l'organisation au contexte de la requête
         if request.user.is_authenticated:
+            # Organisation et licence depuis le cache (aucune requête sur le chemin courant)
+            request.tenant_context = get_tenant_context(request.user.organization_id)
+            attach_tenant_context(request.user, request.tenant_context)
+
+            # Les vues async (request.auser()) réutilisent l'utilisateur déjà chargé
+            user = request.user
+
+            async def auser():
+                return user
+            request.auser = auser
+
             # Si superadmin, pas de filtrage (voit tout)
-            if request.user.is_superadmin():
-                request.tenant = None
-                set_current_tenant(None)
-            else:
+            if not request.user.is_superadmin():
                 # Pour les psychologues, filtrer par leur organisation
-                request.tenant = request.user.organization
-                set_current_tenant(request.tenant)
-                
+                request.tenant = request.tenant_context.organization if request.tenant_context else None
+
                 # Vérifier si l'utilisateur a une organisation
                 if not request.tenant:
                     # Rediriger vers une page d'erreur si pas d'organisation
                     if not request.path.startswith('/admin/') and not request.path.startswith('/accounts/'):
                         return HttpResponseForbidden("Vous n'êtes pas associé à une organisation.")
-                
+
                 # Vérifier si la licence est active
+                # (pas de blocage si l'organisation n'a pas encore de licence)
                 if request.tenant:
-                    try:
-                        license = request.tenant.license
-                        if not license.is_active():
-                            if not request.path.startswith('/admin/') and not request.path.startswith('/accounts/'):
-                                return HttpResponseForbidden("Votre licence a expiré.")
-                    except Exception as e:
-                        # Log l'erreur mais ne bloque pas l'accès si la licence n'existe pas
-                        # (l'organisation pourrait ne pas encore avoir de licence)
-                        import logging
-                        logger = logging.getLogger(__name__)
-                        logger.warning(f"Erreur lors de la vérification de licence pour {request.tenant}: {e}")
+                    license = request.tenant_context.license
+                    if license is None:
+                        logger.warning(f"Aucune licence pour {request.tenant}")
+                    elif not license.is_active():
+                        if not request.path.startswith('/admin/') and not request.path.startswith('/accounts/'):
+                            return HttpResponseForbidden("Votre licence a expiré.")
         else:
-            request.tenant = None
-            set_current_tenant(None)
-
-        response = self.get_response(request)
-        
-        # Nettoyer le contexte après la requête
-        set_current_tenant(None)
-        
-        return response
\ No newline at end of file
+            request.tenant_context = None
+
+        return None
@@ -0,0 +1,210 @@
+"""
+Pagination par clé (keyset / seek).
+
+Au lieu de OFFSET (la base lit puis jette toutes les lignes des pages
+précédentes), chaque page repart de la dernière ligne affichée :
+WHERE (date_seance, id) < (…) ORDER BY date_seance DESC, id DESC LIMIT n+1.
+La page 500 coûte donc une requête indexée, comme la page 1.
+
+Le curseur est opaque (signé) : valeurs de tri de la ligne de départ, sens
+de lecture et rang de la première ligne de la page (pour « 41 à 60 »). Un
+curseur invalide ou altéré ramène à la première page.
+
+Le total est facultatif : exact (COUNT), approché (COUNT plafonné, borné
+quelle que soit la taille de la table), ou fourni par l'appelant (compteur
+d'utilisation de l'organisation, par exemple).
+
+Usage:
+    paginator = KeysetPaginator(consultations, ('-date_seance',), 20)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+"""
+from collections.abc import Sequence
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+CURSOR_SALT = 'core.pagination'
+
+# Au-delà, le mode approché affiche « 1000+ »
+APPROX_COUNT_CAP = 1000
+
+
+def _encode_value(value):
+    """Valeur de tri → JSON (relue par field.to_python)."""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class KeysetPage(Sequence):
+    """Page de résultats ; interface proche de django.core.paginator.Page."""
+
+    def __init__(self, object_list, paginator, start_index, has_previous, has_next):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._start_index = start_index
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __repr__(self):
+        return f'<KeysetPage {self.start_index()}-{self.end_index()}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_previous or self._has_next
+
+    def start_index(self):
+        return self._start_index if self.object_list else 0
+
+    def end_index(self):
+        return self._start_index + len(self.object_list) - 1 if self.object_list else 0
+
+    @cached_property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1], 'n', self.end_index() + 1)
+
+    @cached_property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return self.paginator.encode_cursor(
+            self.object_list[0], 'p', max(1, self._start_index - self.paginator.per_page)
+        )
+
+
+class KeysetPaginator:
+    """
+    Pagine un queryset selon `ordering` (champs du modèle, '-' pour décroissant),
+    complété par la clé primaire pour un ordre total.
+
+    count : 'exact' (COUNT), 'approx' (COUNT plafonné à APPROX_COUNT_CAP),
+    None (pas de total) ou un entier déjà connu.
+    """
+
+    def __init__(self, queryset, ordering, per_page, count='approx'):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.count_mode = count
+
+        opts = queryset.model._meta
+        keys = []
+        for name in ordering:
+            desc = name.startswith('-')
+            keys.append((opts.get_field(name.lstrip('-')), desc))
+        if not any(field.primary_key for field, desc in keys):
+            # Départage des ex-aequo (même date, même nom) dans le sens du dernier champ
+            keys.append((opts.pk, keys[-1][1] if keys else False))
+        self.keys = keys
+
+    # ---------- Tri et condition de reprise ----------
+
+    def _ordering(self, reverse=False):
+        return [('-' if desc != reverse else '') + field.name for field, desc in self.keys]
+
+    def _seek(self, values, reverse=False):
+        """
+        Lignes situées après `values` dans l'ordre de lecture :
+        (a < va) OR (a = va AND b < vb) OR … (> pour les champs croissants).
+        Les champs de tri doivent être non nuls.
+        """
+        condition = Q()
+        egalites = {}
+        for (field, desc), value in zip(self.keys, values):
+            lookup = 'lt' if desc != reverse else 'gt'
+            condition |= Q(**egalites, **{f'{field.name}__{lookup}': value})
+            egalites[field.name] = value
+        return condition
+
+    # ---------- Curseurs ----------
+
+    def encode_cursor(self, obj, direction, start_index):
+        values = [_encode_value(getattr(obj, field.attname)) for field, desc in self.keys]
+        return signing.dumps([values, direction, start_index], salt=CURSOR_SALT, compress=True)
+
+    def decode_cursor(self, cursor):
+        """(valeurs, sens, rang) ou None si le curseur est absent ou invalide."""
+        if not cursor:
+            return None
+        try:
+            values, direction, start_index = signing.loads(cursor, salt=CURSOR_SALT)
+            if direction not in ('n', 'p') or len(values) != len(self.keys):
+                return None
+            values = [
+                None if value is None else field.to_python(value)
+                for (field, desc), value in zip(self.keys, values)
+            ]
+            return values, direction, max(1, int(start_index))
+        except (signing.BadSignature, ValidationError, ValueError, TypeError):
+            return None
+
+    # ---------- Pages ----------
+
+    def get_page(self, cursor=None):
+        """Page désignée par le curseur, ou première page."""
+        limit = self.per_page + 1
+        decoded = self.decode_cursor(cursor)
+
+        if decoded is None:
+            rows = list(self.queryset.order_by(*self._ordering())[:limit])
+            return KeysetPage(rows[:self.per_page], self, 1, False, len(rows) > self.per_page)
+
+        values, direction, start_index = decoded
+        if direction == 'n':
+            rows = list(self.queryset.filter(self._seek(values)).order_by(*self._ordering())[:limit])
+            return KeysetPage(rows[:self.per_page], self, start_index, True, len(rows) > self.per_page)
+
+        # Page précédente : lecture à rebours depuis la première ligne de la page courante
+        rows = list(
+            self.queryset.filter(self._seek(values, reverse=True)).order_by(*self._ordering(reverse=True))[:limit]
+        )
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        return KeysetPage(rows, self, start_index if has_previous else 1, has_previous, True)
+
+    # ---------- Total ----------
+
+    @cached_property
+    def count(self):
+        if self.count_mode is None:
+            return None
+        if isinstance(self.count_mode, int):
+            return self.count_mode
+        if self.count_mode == 'exact':
+            return self.queryset.order_by().count()
+        # COUNT sur une sous-requête LIMIT : coût borné
+        return self.queryset.order_by()[:APPROX_COUNT_CAP + 1].count()
+
+    @property
+    def count_exact(self):
+        """False si le total affiché est un plancher (« 1000+ »)."""
+        count = self.count
+        return not (self.count_mode == 'approx' and count is not None and count > APPROX_COUNT_CAP)
+
+    @property
+    def count_display(self):
+        count = self.count
+        if count is None:
+            return ''
+        if not self.count_exact:
+            return f'{APPROX_COUNT_CAP}+'
+        return str(count)
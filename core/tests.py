@@ -1,3 +1,75 @@
-from django.test import TestCase
+import asyncio
+from datetime import date
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+
+from accounts.models import License, Organization, User
+from cabinet.models import Patient
+from core.middleware import TenantMiddleware, get_current_tenant, tenant_context
+
+
+class TenantContextTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organisations = []
+        cls.users = []
+        for nom in ('Cabinet A', 'Cabinet B'):
+            organization = Organization.objects.create(name=nom, slug=nom.lower().replace(' ', '-'))
+            License.objects.create(organization=organization, plan='lifetime')
+            Patient.all_objects.create(organization=organization, nom=nom, prenom="Patient", date_naissance=date(2000, 1, 1))
+            cls.organisations.append(organization)
+            cls.users.append(User.objects.create_user(username=nom, password='x', organization=organization))
+
+    async def test_requetes_async_concurrentes(self):
+        entrees = []
+        tout_le_monde_est_entre = asyncio.Event()
+
+        async def vue(request):
+            avant = get_current_tenant()
+            entrees.append(avant)
+            if len(entrees) == len(self.users):
+                tout_le_monde_est_entre.set()
+            # Les deux requêtes sont en cours en même temps
+            await tout_le_monde_est_entre.wait()
+            patients = await sync_to_async(list)(Patient.objects.values_list('nom', flat=True))
+            return HttpResponse(f'{avant.pk}|{get_current_tenant().pk}|{",".join(patients)}')
+
+        middleware = TenantMiddleware(vue)
+        requetes = []
+        for user in self.users:
+            request = RequestFactory().get('/cabinet/')
+            request.user = user
+            requetes.append(middleware(request))
+
+        reponses = await asyncio.wait_for(asyncio.gather(*requetes), timeout=10)
+
+        for organization, reponse in zip(self.organisations, reponses):
+            self.assertEqual(reponse.content.decode(), f'{organization.pk}|{organization.pk}|{organization.name}')
+        self.assertIsNone(get_current_tenant())
+
+    def test_tenant_retabli_en_sortie_de_bloc(self):
+        organisation_a, organisation_b = self.organisations
+
+        with tenant_context(organisation_a):
+            self.assertEqual(list(Patient.objects.values_list('nom', flat=True)), ['Cabinet A'])
+            with tenant_context(organisation_b):
+                self.assertEqual(get_current_tenant(), organisation_b)
+            self.assertEqual(get_current_tenant(), organisation_a)
+        self.assertIsNone(get_current_tenant())
+        self.assertEqual(Patient.objects.count(), 2)
+
+        # Le tenant est aussi rétabli si le bloc lève une exception
+        with self.assertRaises(ValueError):
+            with tenant_context(organisation_a):
+                raise ValueError
+        self.assertIsNone(get_current_tenant())
+
+        @tenant_context(organisation_b)
+        def tache():
+            return list(Patient.objects.values_list('nom', flat=True))
+
+        self.assertEqual(tache(), ['Cabinet B'])
+        self.assertIsNone(get_current_tenant())
@@ -1,4 +1,4 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from .models import (
     # Commun
     Domain, SousDomain,
@@ -18,7 +18,10 @@ from .models import (
     TestBeck, ReponseItemBeck, ItemBeck, PhraseBeck,
 
     # STAI
-    TestSTAI, ReponseItemSTAI, ItemSTAI
+    TestSTAI, ReponseItemSTAI, ItemSTAI,
+
+    # Rapports
+    RapportPDF
 )
 
 
@@ -63,6 +66,13 @@ class TestD2RAdmin(admin.ModelAdmin):
             'fields': ('note_cct', 'note_exactitude', 'capacite_concentration')
         })
     )
+    actions = ['recorriger']
+    
+    @admin.action(description="Recorriger avec la grille actuelle")
+    def recorriger(self, request, queryset):
+        from tests_psy.services.d2r import rescore_d2r_tests
+        total = rescore_d2r_tests(queryset)
+        self.message_user(request, f"{total} test(s) D2R recorrigé(s).", messages.SUCCESS)
 
 
 # ========== ADMIN D2R (CONFIGURATION) ==========
@@ -466,4 +476,20 @@ class ItemSTAIAdmin(admin.ModelAdmin):
  
     def texte_court(self, obj):
         return obj.texte[:60] + '...' if len(obj.texte) > 60 else obj.texte
-    texte_court.short_description = 'Texte'
\ No newline at end of file
+    texte_court.short_description = 'Texte'
+
+
+# ========== ADMIN RAPPORTS ==========
+
+@admin.register(RapportPDF)
+class RapportPDFAdmin(admin.ModelAdmin):
+    list_display = ['instrument', 'test_id', 'parametres', 'statut', 'tentatives', 'date_creation', 'date_fin', 'organization']
+    list_filter = ['instrument', 'statut', 'organization']
+    search_fields = ['test_id', 'empreinte']
+    readonly_fields = ['empreinte', 'fichier', 'tentatives', 'date_creation', 'date_debut', 'date_fin']
+    actions = ['remettre_en_attente']
+
+    @admin.action(description="Remettre en attente (nouveau rendu)")
+    def remettre_en_attente(self, request, queryset):
+        count = queryset.exclude(statut='en_cours').update(statut='attente', erreur='', tentatives=0)
+        self.message_user(request, f"{count} rapport(s) remis en attente.", messages.SUCCESS)
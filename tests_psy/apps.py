@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TestsPsyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tests_psy'
+
+    def ready(self):
+        from tests_psy import signals  # Connexion des signaux (invalidation des normes)
@@ -1,5 +1,6 @@
 from .d2r import TestD2RForm, TestD2RResponseForm
 from .beck import TestBeckForm, ReponseItemBeckForm
 from .stai import TestSTAIForm
+from .rapports import ExportRapportsForm
 
-__all__ = ['TestD2RForm', 'TestD2RResponseForm', 'TestBeckForm', 'ReponseItemBeckForm', 'TestSTAIForm']
\ No newline at end of file
+__all__ = ['TestD2RForm', 'TestD2RResponseForm', 'TestBeckForm', 'ReponseItemBeckForm', 'TestSTAIForm', 'ExportRapportsForm']
\ No newline at end of file
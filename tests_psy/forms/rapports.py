@@ -0,0 +1,66 @@
+from django import forms
+from cabinet.models import Patient
+
+
+CHAMP_CLASS = 'mt-1 block w-full rounded-md border-gray-300 shadow-sm focus:border-primary focus:ring focus:ring-primary focus:ring-opacity-50'
+
+INSTRUMENTS_EXPORT = [
+    ('d2r', 'D2R'),
+    ('vineland', 'Vineland'),
+    ('beck', 'Beck'),
+    ('stai', 'STAI'),
+]
+
+
+class ExportRapportsForm(forms.Form):
+    """Sélection des rapports à exporter : un patient ou toute l'organisation, sur une période"""
+
+    patient = forms.ModelChoiceField(
+        queryset=Patient.objects.none(),
+        required=False,
+        label="Patient",
+        empty_label="Tous les patients",
+        widget=forms.Select(attrs={'class': CHAMP_CLASS})
+    )
+    debut = forms.DateField(
+        required=False,
+        label="Du",
+        widget=forms.DateInput(attrs={'class': CHAMP_CLASS, 'type': 'date'})
+    )
+    fin = forms.DateField(
+        required=False,
+        label="Au",
+        widget=forms.DateInput(attrs={'class': CHAMP_CLASS, 'type': 'date'})
+    )
+    instruments = forms.MultipleChoiceField(
+        choices=INSTRUMENTS_EXPORT,
+        label="Tests",
+        widget=forms.CheckboxSelectMultiple(attrs={'class': 'rounded border-gray-300 text-primary focus:ring-primary'})
+    )
+
+    def __init__(self, *args, **kwargs):
+        organization = kwargs.pop('organization', None)
+        instruments = kwargs.pop('instruments', None)
+        super().__init__(*args, **kwargs)
+
+        if organization:
+            self.fields['patient'].queryset = Patient.all_objects.filter(
+                organization=organization
+            ).order_by('nom', 'prenom')
+
+        # Seulement les tests couverts par la licence
+        if instruments is not None:
+            self.fields['instruments'].choices = [
+                (valeur, libelle) for valeur, libelle in INSTRUMENTS_EXPORT if valeur in instruments
+            ]
+            self.fields['instruments'].initial = list(instruments)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        debut = cleaned_data.get('debut')
+        fin = cleaned_data.get('fin')
+
+        if debut and fin and debut > fin:
+            raise forms.ValidationError("La date de début doit précéder la date de fin.")
+
+        return cleaned_data
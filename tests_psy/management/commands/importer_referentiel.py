@@ -0,0 +1,63 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tests_psy.services.referentiel import REFERENTIELS, TAILLE_LOT, ErreurImport, importer
+
+
+class Command(BaseCommand):
+    help = "Importe les données de référence d'un instrument (Vineland, D2R, Beck, STAI) depuis un fichier JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('instrument', choices=list(REFERENTIELS))
+        parser.add_argument(
+            'fichier', nargs='?',
+            help="Fichier JSON (Beck, STAI : données livrées dans tests_psy/data par défaut)"
+        )
+        parser.add_argument(
+            '--miroir', action='store_true',
+            help="Supprime aussi les lignes absentes du fichier (toujours le cas pour le D2R)"
+        )
+        parser.add_argument(
+            '--simulation', action='store_true',
+            help="Valide et compare sans rien écrire"
+        )
+        parser.add_argument(
+            '--lot', type=int, default=TAILLE_LOT,
+            help=f"Lignes par requête d'écriture ({TAILLE_LOT} par défaut)"
+        )
+
+    def handle(self, *args, **options):
+        referentiel = REFERENTIELS[options['instrument']]
+        fichier = options['fichier'] or referentiel.fichier
+        if fichier is None:
+            raise CommandError(f"Fichier JSON requis pour {referentiel.nom}")
+        if not os.path.exists(fichier):
+            raise CommandError(f"Fichier introuvable : {fichier}")
+
+        try:
+            bilans, avertissements = importer(
+                referentiel, fichier, miroir=options['miroir'],
+                simulation=options['simulation'], taille_lot=max(1, options['lot'])
+            )
+        except ErreurImport as e:
+            for erreur in e.erreurs:
+                self.stderr.write(erreur)
+            raise CommandError(str(e))
+
+        for avertissement in avertissements:
+            self.stdout.write(self.style.WARNING(avertissement))
+
+        for bilan in bilans:
+            self.stdout.write(
+                f"{bilan.table} : {bilan.crees} créé(s), {bilan.modifies} modifié(s), "
+                f"{bilan.supprimes} supprimé(s), {bilan.inchanges} inchangé(s) - "
+                f"lecture {bilan.lecture * 1000:.0f} ms, comparaison {bilan.comparaison * 1000:.0f} ms, "
+                f"écriture {bilan.ecriture * 1000:.0f} ms"
+            )
+
+        total = sum(bilan.crees + bilan.modifies + bilan.supprimes for bilan in bilans)
+        if options['simulation']:
+            self.stdout.write(self.style.WARNING(f"Simulation : {total} ligne(s) à écrire, rien n'a été modifié."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{referentiel.nom} : {total} ligne(s) écrite(s)."))
@@ -0,0 +1,63 @@
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from core.middleware import tenant_context
+from tests_psy.services.export import PARAMETRES_EXPORT
+from tests_psy.services.rapports import INSTRUMENTS
+
+
+class Command(BaseCommand):
+    help = "Mesure le temps de rendu des rapports (sans cache de fichiers ; écritures en base annulées)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--instrument', action='append', dest='instruments', choices=list(INSTRUMENTS),
+            help="Instrument à mesurer (répétable ; tous par défaut)"
+        )
+        parser.add_argument(
+            '--tests', type=int, default=5,
+            help="Nombre de tests par instrument (les plus récents, 5 par défaut)"
+        )
+        parser.add_argument(
+            '--repetitions', type=int, default=10,
+            help="Rendus par test (10 par défaut)"
+        )
+
+    def handle(self, *args, **options):
+        repetitions = max(1, options['repetitions'])
+
+        for instrument in options['instruments'] or INSTRUMENTS:
+            config = INSTRUMENTS[instrument]
+            renderer = import_string(config.renderer)
+            parametres = PARAMETRES_EXPORT.get(instrument, {})
+            tests = list(
+                apps.get_model(config.model).all_objects.select_related(
+                    'organization', 'patient', 'psychologue'
+                ).order_by('-date_passation')[:options['tests']]
+            )
+            if not tests:
+                self.stdout.write(f"{instrument} : aucun test")
+                continue
+
+            durees = []
+            # Le rendu Vineland enregistre des snapshots de scores : annulés en fin de mesure
+            with transaction.atomic():
+                for test in tests:
+                    with tenant_context(test.organization):
+                        # Premier rendu hors mesure : styles et caches de référence chargés
+                        renderer(test, **parametres)
+                        debut = time.perf_counter()
+                        for _ in range(repetitions):
+                            renderer(test, **parametres)
+                        durees.append((time.perf_counter() - debut) / repetitions)
+                transaction.set_rollback(True)
+
+            moyenne = sum(durees) / len(durees) * 1000
+            self.stdout.write(
+                f"{instrument} : {moyenne:.1f} ms par rendu "
+                f"(min {min(durees) * 1000:.1f}, max {max(durees) * 1000:.1f}, {len(tests)} test(s))"
+            )
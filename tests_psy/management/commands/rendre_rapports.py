@@ -0,0 +1,48 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from tests_psy.services.rapports import (
+    reprendre_travaux_bloques, reserver_travaux, executer_rapport, pool_de_rendu
+)
+
+
+class Command(BaseCommand):
+    help = "Rend les rapports en attente (PDF Beck, STAI, Vineland ; rapport D2R) sur un pool de processus"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help="Nombre de processus de rendu (nombre de cœurs par défaut)"
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Vide la file puis s'arrête (sinon surveille la file en continu)"
+        )
+        parser.add_argument(
+            '--intervalle', type=float, default=2.0,
+            help="Secondes entre deux lectures de la file vide (2 par défaut)"
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+
+        # Les processus du pool ouvrent leurs propres connexions
+        connections.close_all()
+        with pool_de_rendu(workers) as pool:
+            while True:
+                repris = reprendre_travaux_bloques()
+                if repris:
+                    self.stdout.write(self.style.WARNING(f"{repris} travail(aux) bloqué(s) remis en attente."))
+
+                travaux = reserver_travaux(workers * 4)
+                for rapport_id, statut in zip(travaux, pool.map(executer_rapport, travaux)):
+                    style = self.style.SUCCESS if statut == 'pret' else self.style.ERROR
+                    self.stdout.write(style(f"Rapport {rapport_id} : {statut}"))
+
+                if not travaux:
+                    if options['once']:
+                        break
+                    time.sleep(options['intervalle'])
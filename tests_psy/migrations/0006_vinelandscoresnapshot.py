@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_license_has_stai_license_max_tests_stai'),
+        ('tests_psy', '0005_itemstai_teststai_reponseitemstai'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VinelandScoreSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('niveau_confiance', models.IntegerField(verbose_name='Niveau de confiance')),
+                ('niveau_significativite', models.CharField(max_length=5, verbose_name='Niveau de significativité')),
+                ('date_naissance', models.DateField()),
+                ('date_reference', models.DateField()),
+                ('scores', models.JSONField(verbose_name='Notes brutes')),
+                ('echelle_v_scores', models.JSONField(verbose_name='Notes échelle-V')),
+                ('complete_scores', models.JSONField(verbose_name='Scores complets')),
+                ('comparaisons', models.JSONField(verbose_name='Comparaisons par paires')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='accounts.organization', verbose_name='Organisation')),
+                ('test_vineland', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='score_snapshots', to='tests_psy.testvineland', verbose_name='Test Vineland')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de scores Vineland',
+                'verbose_name_plural': 'Snapshots de scores Vineland',
+                'unique_together': {('test_vineland', 'niveau_confiance', 'niveau_significativite')},
+            },
+        ),
+    ]
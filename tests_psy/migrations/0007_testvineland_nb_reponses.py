@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:11
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_nb_reponses(apps, schema_editor):
+    TestVineland = apps.get_model('tests_psy', 'TestVineland')
+    ReponseVineland = apps.get_model('tests_psy', 'ReponseVineland')
+    nb_reponses = ReponseVineland.objects.filter(
+        test_vineland=models.OuterRef('pk')
+    ).values('test_vineland').annotate(total=models.Count('id')).values('total')
+    TestVineland.objects.update(
+        nb_reponses=Coalesce(models.Subquery(nb_reponses), models.Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests_psy', '0006_vinelandscoresnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testvineland',
+            name='nb_reponses',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Compteur mis à jour à chaque enregistrement de réponses', verbose_name='Nombre de réponses'),
+        ),
+        migrations.RunPython(backfill_nb_reponses, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests_psy', '0007_testvineland_nb_reponses'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testd2r',
+            name='detail_lignes',
+            field=models.JSONField(blank=True, default=list, help_text="CCT, erreurs de commission et d'omission pour chaque ligne", verbose_name='Détail par ligne'),
+        ),
+        migrations.AddField(
+            model_name='testd2r',
+            name='symboles_selectionnes',
+            field=models.JSONField(blank=True, default=list, verbose_name='Symboles sélectionnés'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests_psy', '0008_testd2r_detail_lignes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testd2r',
+            name='evenements',
+            field=models.BinaryField(blank=True, help_text='Débuts/fins de ligne et clics horodatés (format compact, voir services.d2r)', null=True, verbose_name='Événements de passation'),
+        ),
+    ]
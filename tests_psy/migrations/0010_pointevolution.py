@@ -0,0 +1,67 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_points_evolution(apps, schema_editor):
+    PointEvolution = apps.get_model('tests_psy', 'PointEvolution')
+    TestBeck = apps.get_model('tests_psy', 'TestBeck')
+    TestSTAI = apps.get_model('tests_psy', 'TestSTAI')
+
+    points = [
+        PointEvolution(
+            organization_id=test.organization_id,
+            patient_id=test.patient_id,
+            instrument='beck',
+            test_id=test.id,
+            date_passation=test.date_passation,
+            scores={'score_total': test.score_total},
+        )
+        for test in TestBeck.objects.filter(reponses__isnull=False).distinct()
+    ]
+    # Un test STAI n'est corrigé qu'une fois les 40 items répondus
+    points += [
+        PointEvolution(
+            organization_id=test.organization_id,
+            patient_id=test.patient_id,
+            instrument='stai',
+            test_id=test.id,
+            date_passation=test.date_passation,
+            scores={'etat': test.score_etat, 'trait': test.score_trait},
+        )
+        for test in TestSTAI.objects.filter(score_etat__gt=0)
+    ]
+    PointEvolution.objects.bulk_create(points, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_license_has_stai_license_max_tests_stai'),
+        ('cabinet', '0001_initial'),
+        ('tests_psy', '0009_testd2r_evenements'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointEvolution',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('instrument', models.CharField(choices=[('beck', 'Beck'), ('stai', 'STAI')], max_length=10, verbose_name='Instrument')),
+                ('test_id', models.PositiveIntegerField(verbose_name='Test')),
+                ('date_passation', models.DateTimeField(verbose_name='Date de passation')),
+                ('scores', models.JSONField(default=dict, help_text="Ex : {'score_total': 12} pour Beck, {'etat': 40, 'trait': 38} pour STAI", verbose_name='Scores')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='accounts.organization', verbose_name='Organisation')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='points_evolution', to='cabinet.patient', verbose_name='Patient')),
+            ],
+            options={
+                'verbose_name': "Point d'évolution",
+                'verbose_name_plural': "Points d'évolution",
+                'ordering': ['date_passation'],
+                'indexes': [models.Index(fields=['patient', 'instrument', 'date_passation'], name='tests_psy_p_patient_c7596a_idx')],
+                'unique_together': {('instrument', 'test_id')},
+            },
+        ),
+        migrations.RunPython(backfill_points_evolution, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_usagecounter'),
+        ('cabinet', '0002_patient_recherche'),
+        ('tests_psy', '0010_pointevolution'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='testbeck',
+            index=models.Index(fields=['organization', '-date_passation', '-id'], name='tests_psy_t_organiz_38bac7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testd2r',
+            index=models.Index(fields=['organization', '-date_passation', '-id'], name='tests_psy_t_organiz_29ed73_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teststai',
+            index=models.Index(fields=['organization', '-date_passation', '-id'], name='tests_psy_t_organiz_50886b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testvineland',
+            index=models.Index(fields=['organization', '-date_passation', '-id'], name='tests_psy_t_organiz_643827_idx'),
+        ),
+    ]
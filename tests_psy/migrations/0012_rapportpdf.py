@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_usagecounter'),
+        ('tests_psy', '0011_index_liste_tests'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RapportPDF',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('instrument', models.CharField(choices=[('d2r', 'D2R'), ('vineland', 'Vineland'), ('beck', 'Beck'), ('stai', 'STAI')], max_length=10, verbose_name='Instrument')),
+                ('test_id', models.PositiveIntegerField(verbose_name='Test')),
+                ('parametres', models.CharField(blank=True, help_text='Paramètres de cotation normalisés, ex : niveau_confiance=90&niveau_significativite=.05', max_length=100, verbose_name='Paramètres')),
+                ('empreinte', models.CharField(max_length=64, verbose_name='Empreinte du contenu')),
+                ('statut', models.CharField(choices=[('attente', 'En attente'), ('en_cours', 'En cours'), ('pret', 'Prêt'), ('erreur', 'Erreur')], default='attente', max_length=10, verbose_name='Statut')),
+                ('fichier', models.CharField(blank=True, max_length=255, verbose_name='Fichier')),
+                ('erreur', models.TextField(blank=True, verbose_name='Erreur')),
+                ('tentatives', models.PositiveSmallIntegerField(default=0, verbose_name='Tentatives')),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_debut', models.DateTimeField(blank=True, null=True)),
+                ('date_fin', models.DateTimeField(blank=True, null=True)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='accounts.organization', verbose_name='Organisation')),
+            ],
+            options={
+                'verbose_name': 'Rapport PDF',
+                'verbose_name_plural': 'Rapports PDF',
+                'ordering': ['-date_creation'],
+                'indexes': [models.Index(fields=['statut', 'date_creation'], name='tests_psy_r_statut_15b26b_idx')],
+                'unique_together': {('instrument', 'test_id', 'parametres', 'empreinte')},
+            },
+        ),
+    ]
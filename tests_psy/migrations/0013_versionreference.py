@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests_psy', '0012_rapportpdf'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionReference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=50, unique=True, verbose_name='Données')),
+                ('version', models.PositiveIntegerField(default=0, verbose_name='Version')),
+            ],
+            options={
+                'verbose_name': 'Version des données de référence',
+                'verbose_name_plural': 'Versions des données de référence',
+            },
+        ),
+    ]
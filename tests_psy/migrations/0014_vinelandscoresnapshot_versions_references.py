@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests_psy', '0013_versionreference'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vinelandscoresnapshot',
+            name='versions_references',
+            field=models.CharField(blank=True, max_length=30),
+        ),
+    ]
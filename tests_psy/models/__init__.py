@@ -1,5 +1,5 @@
 from .base import TestPsychometrique
-from .common import Domain, SousDomain
+from .common import Domain, SousDomain, VersionReference
 from .d2r import (
     TestD2R, 
     SymboleReference, 
@@ -12,6 +12,7 @@ from .d2r import (
 from .vineland import (
     TestVineland,
     ReponseVineland,
+    VinelandScoreSnapshot,
     PlageItemVineland,
     QuestionVineland,
     EchelleVMapping,
@@ -41,10 +42,14 @@ from .stai import (
 
 )
 
+from .evolution import PointEvolution
+from .rapport import RapportPDF
+
 __all__ = [
     # Commun
     'Domain',
     'SousDomain',
+    'VersionReference',
 
     # D2R
     'TestPsychometrique',
@@ -57,6 +62,7 @@ __all__ = [
     # Vineland
     'TestVineland',
     'ReponseVineland',
+    'VinelandScoreSnapshot',
     'PlageItemVineland',
     'QuestionVineland',
     'EchelleVMapping',
@@ -80,4 +86,10 @@ __all__ = [
     'ItemSTAI',
     'TestSTAI',
     'ReponseItemSTAI',
+
+    # Évolution des scores
+    'PointEvolution',
+
+    # Rapports
+    'RapportPDF',
 ]
\ No newline at end of file
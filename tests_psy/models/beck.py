@@ -79,6 +79,9 @@ class TestBeck(TestPsychometrique):
         verbose_name = "Test Beck"
         verbose_name_plural = "Tests Beck"
         ordering = ['-date_passation']
+        indexes = [
+            models.Index(fields=['organization', '-date_passation', '-id']),
+        ]
     
     def __str__(self):
         return f"Beck - {self.patient.nom_complet} - {self.date_passation.strftime('%d/%m/%Y')}"
@@ -62,4 +62,20 @@ class SousDomain(models.Model):
         unique_together = ['domain', 'name']
     
     def __str__(self):
-        return f"{self.domain.name} - {self.name}"
\ No newline at end of file
+        return f"{self.domain.name} - {self.name}"
+
+class VersionReference(models.Model):
+    """
+    Version d'un jeu de données de référence (normes, grilles, items).
+    Incrémentée à chaque modification : les caches mémoire de tous les
+    processus la relisent pour savoir s'ils doivent recharger leurs données.
+    """
+    nom = models.CharField(max_length=50, unique=True, verbose_name="Données")
+    version = models.PositiveIntegerField(default=0, verbose_name="Version")
+
+    class Meta:
+        verbose_name = "Version des données de référence"
+        verbose_name_plural = "Versions des données de référence"
+
+    def __str__(self):
+        return f"{self.nom} v{self.version}"
@@ -62,10 +62,32 @@ class TestD2R(TestPsychometrique):
     )
     temps_total = models.IntegerField(default=0, verbose_name="Temps total (secondes)")
     
+    # Passation brute (permet de recorriger si la grille est modifiée)
+    symboles_selectionnes = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name="Symboles sélectionnés"
+    )
+    detail_lignes = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name="Détail par ligne",
+        help_text="CCT, erreurs de commission et d'omission pour chaque ligne"
+    )
+    evenements = models.BinaryField(
+        null=True,
+        blank=True,
+        verbose_name="Événements de passation",
+        help_text="Débuts/fins de ligne et clics horodatés (format compact, voir services.d2r)"
+    )
+    
     class Meta:
         verbose_name = "Test D2R"
         verbose_name_plural = "Tests D2R"
         ordering = ['-date_passation']
+        indexes = [
+            models.Index(fields=['organization', '-date_passation', '-id']),
+        ]
     
     def __str__(self):
         return f"D2R - {self.patient.nom_complet} - {self.code}"
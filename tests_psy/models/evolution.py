@@ -0,0 +1,40 @@
+from django.db import models
+from core.models import TenantModel
+
+
+class PointEvolution(TenantModel):
+    """
+    Point de la série d'évolution des scores d'un patient (un par test soumis).
+    Table dénormalisée lue par les graphiques d'évolution en une requête indexée.
+    """
+    INSTRUMENT_CHOICES = [
+        ('beck', 'Beck'),
+        ('stai', 'STAI'),
+    ]
+
+    patient = models.ForeignKey(
+        'cabinet.Patient',
+        on_delete=models.CASCADE,
+        related_name='points_evolution',
+        verbose_name="Patient"
+    )
+    instrument = models.CharField(max_length=10, choices=INSTRUMENT_CHOICES, verbose_name="Instrument")
+    test_id = models.PositiveIntegerField(verbose_name="Test")
+    date_passation = models.DateTimeField(verbose_name="Date de passation")
+    scores = models.JSONField(
+        default=dict,
+        verbose_name="Scores",
+        help_text="Ex : {'score_total': 12} pour Beck, {'etat': 40, 'trait': 38} pour STAI"
+    )
+
+    class Meta:
+        verbose_name = "Point d'évolution"
+        verbose_name_plural = "Points d'évolution"
+        unique_together = ['instrument', 'test_id']
+        indexes = [
+            models.Index(fields=['patient', 'instrument', 'date_passation']),
+        ]
+        ordering = ['date_passation']
+
+    def __str__(self):
+        return f"{self.get_instrument_display()} - Test {self.test_id} - {self.scores}"
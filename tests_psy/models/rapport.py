@@ -0,0 +1,53 @@
+from django.db import models
+from core.models import TenantModel
+
+
+class RapportPDF(TenantModel):
+    """
+    Rapport d'un test rendu par la file des rapports (commande rendre_rapports).
+
+    Une ligne par (test, paramètres de cotation, empreinte du contenu) : c'est
+    à la fois le travail de la file et l'entrée du cache des fichiers rendus.
+    Une modification du test change l'empreinte, l'ancien rapport n'est plus servi.
+    """
+    INSTRUMENT_CHOICES = [
+        ('d2r', 'D2R'),
+        ('vineland', 'Vineland'),
+        ('beck', 'Beck'),
+        ('stai', 'STAI'),
+    ]
+    STATUT_CHOICES = [
+        ('attente', 'En attente'),
+        ('en_cours', 'En cours'),
+        ('pret', 'Prêt'),
+        ('erreur', 'Erreur'),
+    ]
+
+    instrument = models.CharField(max_length=10, choices=INSTRUMENT_CHOICES, verbose_name="Instrument")
+    test_id = models.PositiveIntegerField(verbose_name="Test")
+    parametres = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name="Paramètres",
+        help_text="Paramètres de cotation normalisés, ex : niveau_confiance=90&niveau_significativite=.05"
+    )
+    empreinte = models.CharField(max_length=64, verbose_name="Empreinte du contenu")
+    statut = models.CharField(max_length=10, choices=STATUT_CHOICES, default='attente', verbose_name="Statut")
+    fichier = models.CharField(max_length=255, blank=True, verbose_name="Fichier")
+    erreur = models.TextField(blank=True, verbose_name="Erreur")
+    tentatives = models.PositiveSmallIntegerField(default=0, verbose_name="Tentatives")
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_debut = models.DateTimeField(null=True, blank=True)
+    date_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Rapport PDF"
+        verbose_name_plural = "Rapports PDF"
+        unique_together = ['instrument', 'test_id', 'parametres', 'empreinte']
+        indexes = [
+            models.Index(fields=['statut', 'date_creation']),
+        ]
+        ordering = ['-date_creation']
+
+    def __str__(self):
+        return f"{self.get_instrument_display()} - Test {self.test_id} ({self.get_statut_display()})"
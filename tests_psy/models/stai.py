@@ -132,6 +132,12 @@ class TestSTAI(TestPsychometrique):
 
         ordering = ['-date_passation']
 
+        indexes = [
+
+            models.Index(fields=['organization', '-date_passation', '-id']),
+
+        ]
+
  
 
     def __str__(self):
@@ -29,6 +29,12 @@ class TestVineland(TenantModel):
         blank=True,
         verbose_name="Notes du psychologue"
     )
+    nb_reponses = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Nombre de réponses",
+        help_text="Compteur mis à jour à chaque enregistrement de réponses"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -36,16 +42,30 @@ class TestVineland(TenantModel):
         verbose_name = "Test Vineland"
         verbose_name_plural = "Tests Vineland"
         ordering = ['-date_passation']
+        indexes = [
+            models.Index(fields=['organization', '-date_passation', '-id']),
+        ]
     
     def __str__(self):
         return f"Vineland - {self.patient.nom_complet} - {self.date_passation.strftime('%d/%m/%Y')}"
     
+    @property
+    def total_questions(self):
+        from tests_psy.services.vineland import get_question_index
+        return len(get_question_index())
+    
     @property
     def is_complete(self):
-        """Vérifie si toutes les questions ont une réponse"""
-        total_questions = QuestionVineland.objects.count()
-        total_reponses = self.reponses_vineland.count()
-        return total_reponses >= total_questions
+        """Vérifie si toutes les questions ont une réponse (sans requête)"""
+        return self.nb_reponses >= self.total_questions
+    
+    @property
+    def progression(self):
+        """Pourcentage de questions répondues"""
+        total_questions = self.total_questions
+        if not total_questions:
+            return 0
+        return min(100, round(self.nb_reponses * 100 / total_questions))
 
 
 class ReponseVineland(TenantModel):
@@ -92,6 +112,41 @@ class ReponseVineland(TenantModel):
             raise ValidationError("La réponse 'Non applicable' n'est pas autorisée pour cette question.")
 
 
+class VinelandScoreSnapshot(TenantModel):
+    """
+    Scores calculés d'un test Vineland pour des paramètres donnés - MULTI-TENANT.
+    Supprimé dès qu'une réponse du test (ou une table de normes) change.
+    """
+    test_vineland = models.ForeignKey(
+        TestVineland,
+        on_delete=models.CASCADE,
+        related_name='score_snapshots',
+        verbose_name="Test Vineland"
+    )
+    niveau_confiance = models.IntegerField(verbose_name="Niveau de confiance")
+    niveau_significativite = models.CharField(max_length=5, verbose_name="Niveau de significativité")
+    
+    # Âge utilisé pour le calcul (le snapshot est périmé s'il change)
+    date_naissance = models.DateField()
+    date_reference = models.DateField()
+    # Versions des normes et comparaisons utilisées (services.vineland.versions_scores)
+    versions_references = models.CharField(max_length=30, blank=True)
+    
+    scores = models.JSONField(verbose_name="Notes brutes")
+    echelle_v_scores = models.JSONField(verbose_name="Notes échelle-V")
+    complete_scores = models.JSONField(verbose_name="Scores complets")
+    comparaisons = models.JSONField(verbose_name="Comparaisons par paires")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Snapshot de scores Vineland"
+        verbose_name_plural = "Snapshots de scores Vineland"
+        unique_together = ['test_vineland', 'niveau_confiance', 'niveau_significativite']
+
+    def __str__(self):
+        return f"Scores test {self.test_vineland_id} ({self.niveau_confiance}%, {self.niveau_significativite})"
+
+
 # ========== MODÈLES DE CONFIGURATION (PARTAGÉS - SANS ORGANISATION) ==========
 
 class PlageItemVineland(models.Model):
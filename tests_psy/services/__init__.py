@@ -0,0 +1,4 @@
+"""
+Services de calcul partagés par les vues des tests psychologiques.
+Chaque module regroupe la logique métier d'un test (normes, scoring, etc.)
+"""
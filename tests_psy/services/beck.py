@@ -0,0 +1,127 @@
+"""
+Correction du Beck Depression Inventory.
+
+La table items → phrases → scores est chargée une fois par processus : les
+phrases envoyées sont validées et les scores calculés en mémoire, puis les
+réponses et leurs phrases cochées sont enregistrées par insertions groupées.
+"""
+from collections import namedtuple
+
+from tests_psy.services.cache import ProcessCache
+from tests_psy.services.evolution import enregistrer_point
+
+
+# Item 9 (idées suicidaires) : alerte à partir d'un score de 2
+ITEM_ALERTE_SUICIDE = 9
+SEUIL_ALERTE_SUICIDE = 2
+
+ItemCorrection = namedtuple('ItemCorrection', ['id', 'numero', 'phrases'])
+CorrectionBeck = namedtuple('CorrectionBeck', ['reponses', 'score_total', 'alerte_suicide'])
+
+
+def load_items_beck():
+    """Items Beck triés par numéro, avec {phrase_id: score_valeur} pour chacun."""
+    from tests_psy.models import ItemBeck, PhraseBeck
+
+    phrases = {}
+    for phrase_id, item_id, score_valeur in PhraseBeck.objects.values_list('id', 'item_id', 'score_valeur'):
+        phrases.setdefault(item_id, {})[phrase_id] = score_valeur
+
+    return tuple(
+        ItemCorrection(item_id, numero, phrases.get(item_id, {}))
+        for item_id, numero in ItemBeck.objects.order_by('numero').values_list('id', 'numero')
+    )
+
+
+_items_beck = ProcessCache('beck_items', load_items_beck)
+
+
+def get_items_beck():
+    """Retourne la table de correction Beck du processus."""
+    return _items_beck.get()
+
+
+def invalidate_items_beck():
+    _items_beck.invalidate()
+
+
+def corriger_beck(selections):
+    """
+    Corrige une passation à partir d'un dict {numero: [ids de phrases cochées]}.
+
+    Seules les phrases appartenant à l'item sont retenues ; le score d'un item
+    est le maximum des scores de ses phrases cochées. Retourne les
+    (item_id, phrase_ids, score_item) des items répondus, le score total et
+    l'alerte suicide.
+    """
+    reponses = []
+    score_total = 0
+    alerte_suicide = False
+    for item in get_items_beck():
+        phrase_ids = []
+        for phrase_id in selections.get(item.numero, ()):
+            try:
+                phrase_id = int(phrase_id)
+            except (TypeError, ValueError):
+                continue
+            if phrase_id in item.phrases and phrase_id not in phrase_ids:
+                phrase_ids.append(phrase_id)
+        if not phrase_ids:
+            continue
+
+        score_item = max(item.phrases[phrase_id] for phrase_id in phrase_ids)
+        reponses.append((item.id, phrase_ids, score_item))
+        score_total += score_item
+        if item.numero == ITEM_ALERTE_SUICIDE:
+            alerte_suicide = score_item >= SEUIL_ALERTE_SUICIDE
+    return CorrectionBeck(reponses, score_total, alerte_suicide)
+
+
+def save_beck_reponses(test, selections):
+    """
+    Remplace les réponses du test par celles de la passation : une insertion
+    groupée pour les réponses, une pour les phrases cochées, une mise à jour
+    pour le score. À appeler dans une transaction.
+    """
+    from tests_psy.models import ReponseItemBeck
+
+    correction = corriger_beck(selections)
+
+    # Supprimer les anciennes réponses (si re-soumission)
+    test.reponses.all().delete()
+    reponses = ReponseItemBeck.objects.bulk_create([
+        ReponseItemBeck(
+            test=test,
+            item_id=item_id,
+            score_item=score_item,
+            organization_id=test.organization_id
+        )
+        for item_id, phrase_ids, score_item in correction.reponses
+    ])
+
+    PhrasesCochees = ReponseItemBeck.phrases_cochees.through
+    PhrasesCochees.objects.bulk_create([
+        PhrasesCochees(reponseitembeck_id=reponse.id, phrasebeck_id=phrase_id)
+        for reponse, (item_id, phrase_ids, score_item) in zip(reponses, correction.reponses)
+        for phrase_id in phrase_ids
+    ])
+
+    test.score_total = correction.score_total
+    test.niveau_depression = test.get_niveau_depression()
+    test.alerte_suicide = correction.alerte_suicide
+    test.save(update_fields=['score_total', 'niveau_depression', 'alerte_suicide'])
+    enregistrer_point(test, 'beck')
+    return correction
+
+
+def get_reponses_existantes(test):
+    """{numero d'item: [ids des phrases cochées]} du test, en une seule requête."""
+    from tests_psy.models import ReponseItemBeck
+
+    reponses_existantes = {}
+    phrases_cochees = ReponseItemBeck.phrases_cochees.through.objects.filter(
+        reponseitembeck__test=test
+    ).order_by('id').values_list('reponseitembeck__item__numero', 'phrasebeck_id')
+    for numero, phrase_id in phrases_cochees:
+        reponses_existantes.setdefault(numero, []).append(phrase_id)
+    return reponses_existantes
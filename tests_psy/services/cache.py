@@ -0,0 +1,85 @@
+"""
+Cache mémoire par processus pour les données de référence (normes, grilles...).
+
+Les données sont chargées une seule fois par processus. Chaque jeu de données
+a un numéro de version en base (VersionReference), incrémenté par invalidate()
+dans la transaction qui modifie les données : tous les processus (workers,
+commandes, scripts d'import) le relisent, quel que soit le backend de cache.
+
+Les versions sont relues en une requête, au plus une fois par seconde et par
+processus ; le processus qui invalide voit sa nouvelle version immédiatement.
+"""
+import threading
+import time
+
+from django.db.models import F
+
+
+# Secondes entre deux lectures des versions en base
+VERIFICATION_VERSIONS = 1.0
+
+_versions_lock = threading.Lock()
+# (versions {nom: version}, date de lecture) remplacé d'un bloc
+_versions = ({}, None)
+
+
+def lire_versions(force=False):
+    """Versions courantes des données de référence ({nom: version})."""
+    global _versions
+    versions, lecture = _versions
+    if force or lecture is None or time.monotonic() - lecture > VERIFICATION_VERSIONS:
+        from tests_psy.models import VersionReference
+
+        with _versions_lock:
+            versions = dict(VersionReference.objects.values_list('nom', 'version'))
+            _versions = (versions, time.monotonic())
+    return versions
+
+
+def incrementer_version(nom):
+    """Nouvelle version de ce jeu de données (avec la transaction en cours)."""
+    global _versions
+    from tests_psy.models import VersionReference
+
+    VersionReference.objects.get_or_create(nom=nom)
+    VersionReference.objects.filter(nom=nom).update(version=F('version') + 1)
+    version = VersionReference.objects.filter(nom=nom).values_list('version', flat=True).first()
+    with _versions_lock:
+        versions, lecture = _versions
+        _versions = ({**versions, nom: version}, lecture)
+
+
+class ProcessCache:
+    """Valeur chargée paresseusement une fois par processus et invalidable."""
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self._lock = threading.Lock()
+        # (valeur, version) remplacé d'un bloc
+        self._state = None
+
+    def _charger(self):
+        version = lire_versions().get(self.name, 0)
+        state = self._state
+        if state is None or state[1] != version:
+            with self._lock:
+                state = self._state
+                if state is None or state[1] != version:
+                    # Version lue avant les données : au pire rechargées une fois de trop
+                    state = (self.loader(), version)
+                    self._state = state
+        return state
+
+    def get(self):
+        """Retourne la valeur courante, en la (re)chargeant si nécessaire."""
+        return self._charger()[0]
+
+    def version(self):
+        """Version des données actuellement chargées dans ce processus."""
+        return self._charger()[1]
+
+    def invalidate(self):
+        """Invalide la valeur dans ce processus et dans tous les autres."""
+        self._state = None
+        incrementer_version(self.name)
@@ -0,0 +1,449 @@
+"""
+Moteur de correction D2R.
+
+La grille de symboles de référence (partagée entre toutes les organisations)
+est chargée une seule fois par processus : chaque ligne notée est réduite à
+l'ordre de ses identifiants, au rang de chaque symbole et à l'ensemble de ses
+cibles. La correction d'une passation se fait ensuite par opérations
+d'ensembles, sans requête SQL.
+
+Les trois tables de normes sont chargées de la même façon et interrogées
+par bisect, pour un test ou pour toute une liste de tests.
+
+Les événements de passation (débuts/fins de ligne, clics) sont stockés sous
+forme binaire compacte et analysés ligne par ligne (vitesse, erreurs, fatigue).
+"""
+import json
+from collections import defaultdict, namedtuple
+from statistics import mean, pstdev
+
+from tests_psy.services.cache import ProcessCache
+from tests_psy.services.intervals import IntervalIndex
+
+
+# Page de la passation et lignes prises en compte dans la correction
+PAGE_PASSATION = 1
+LIGNES_NOTEES = range(2, 14)
+
+# Types d'événements enregistrés pendant la passation
+DEBUT_LIGNE, SELECTION, DESELECTION, FIN_LIGNE = range(4)
+FORMAT_EVENEMENTS = 1
+MAX_EVENEMENTS = 20000
+
+LigneGrille = namedtuple('LigneGrille', ['ligne', 'ids', 'rangs', 'cibles', 'cibles_cumulees'])
+ResultatD2R = namedtuple('ResultatD2R', ['correctes', 'incorrectes', 'omises', 'lignes'])
+Evenement = namedtuple('Evenement', ['t', 'type', 'ligne', 'rang'])
+NormeD2R = namedtuple('NormeD2R', ['note_standard', 'percentile'])
+
+
+def is_cible(lettre, traits_haut, traits_bas):
+    """Un symbole est une cible s'il s'agit d'un « d » avec deux traits au total."""
+    return lettre == 'd' and traits_haut + traits_bas == 2
+
+
+class GrilleD2R:
+    """Grille de référence D2R indexée par ligne."""
+
+    def __init__(self, symboles):
+        """symboles : SymboleReference de la page de passation, triés par ligne et position."""
+        self.symboles_par_ligne = defaultdict(list)
+        for symbole in symboles:
+            self.symboles_par_ligne[symbole.ligne].append(symbole)
+        self.symboles_par_ligne = dict(self.symboles_par_ligne)
+
+        self.lignes = []
+        for ligne in LIGNES_NOTEES:
+            symboles_ligne = self.symboles_par_ligne.get(ligne)
+            if not symboles_ligne:
+                continue
+            ids = tuple(symbole.id for symbole in symboles_ligne)
+            cibles = frozenset(
+                symbole.id for symbole in symboles_ligne
+                if is_cible(symbole.lettre, symbole.traits_haut, symbole.traits_bas)
+            )
+            # Nombre de cibles jusqu'à chaque rang inclus (omissions en O(1))
+            cibles_cumulees = []
+            total = 0
+            for symbole_id in ids:
+                total += symbole_id in cibles
+                cibles_cumulees.append(total)
+            self.lignes.append(LigneGrille(
+                ligne=ligne,
+                ids=ids,
+                rangs={symbole_id: rang for rang, symbole_id in enumerate(ids)},
+                cibles=cibles,
+                cibles_cumulees=tuple(cibles_cumulees),
+            ))
+
+    @classmethod
+    def load(cls):
+        from tests_psy.models import SymboleReference
+
+        return cls(
+            SymboleReference.objects.filter(page=PAGE_PASSATION).order_by('ligne', 'position')
+        )
+
+    def score(self, selection):
+        """
+        Corrige une passation à partir des identifiants de symboles sélectionnés.
+
+        Sur chaque ligne, seuls les symboles jusqu'au dernier sélectionné sont
+        traités : les cibles sélectionnées sont correctes, les autres sélections
+        sont des erreurs de commission et les cibles non sélectionnées des omissions.
+        """
+        selection = frozenset(selection)
+        correctes = incorrectes = omises = 0
+        lignes = []
+        for ligne in self.lignes:
+            selection_ligne = selection.intersection(ligne.rangs)
+            if selection_ligne:
+                dernier_rang = max(ligne.rangs[symbole_id] for symbole_id in selection_ligne)
+                cct = len(selection_ligne & ligne.cibles)
+                ec = len(selection_ligne) - cct
+                eo = ligne.cibles_cumulees[dernier_rang] - cct
+                traites = dernier_rang + 1
+            else:
+                cct = ec = eo = traites = 0
+            correctes += cct
+            incorrectes += ec
+            omises += eo
+            lignes.append({'ligne': ligne.ligne, 'traites': traites, 'cct': cct, 'ec': ec, 'eo': eo})
+        return ResultatD2R(correctes, incorrectes, omises, lignes)
+
+
+_grille_d2r = ProcessCache('d2r_grille', GrilleD2R.load)
+
+
+def get_grille_d2r():
+    """Retourne la grille D2R du processus (chargée au premier appel)."""
+    return _grille_d2r.get()
+
+
+def invalidate_grille_d2r():
+    """Force le rechargement de la grille D2R (symboles modifiés ou importés)."""
+    _grille_d2r.invalidate()
+
+
+def apply_d2r_score(test, resultat):
+    """Reporte un ResultatD2R sur le test (sans sauvegarder)."""
+    test.reponses_correctes = resultat.correctes
+    test.reponses_incorrectes = resultat.incorrectes
+    test.reponses_omises = resultat.omises
+    test.detail_lignes = resultat.lignes
+    test.note_cct = resultat.correctes
+    test.note_exactitude = (
+        ((resultat.incorrectes + resultat.omises) / resultat.correctes) * 100
+        if resultat.correctes > 0 else 0
+    )
+    test.capacite_concentration = resultat.correctes - resultat.incorrectes - resultat.omises
+
+
+SCORE_FIELDS = [
+    'reponses_correctes', 'reponses_incorrectes', 'reponses_omises', 'detail_lignes',
+    'note_cct', 'note_exactitude', 'capacite_concentration',
+]
+
+
+def rescore_d2r_tests(tests=None, batch_size=500):
+    """
+    Recorrige les passations enregistrées avec la grille courante
+    (après correction de la grille). Retourne le nombre de tests mis à jour.
+    """
+    from tests_psy.models import TestD2R
+
+    if tests is None:
+        tests = TestD2R.all_objects.all()
+    tests = tests.exclude(symboles_selectionnes=[]).only('id', 'symboles_selectionnes')
+
+    grille = get_grille_d2r()
+    a_sauvegarder = []
+    total = 0
+    for test in tests.iterator(chunk_size=batch_size):
+        apply_d2r_score(test, grille.score(test.symboles_selectionnes))
+        a_sauvegarder.append(test)
+        if len(a_sauvegarder) >= batch_size:
+            TestD2R.all_objects.bulk_update(a_sauvegarder, SCORE_FIELDS)
+            total += len(a_sauvegarder)
+            a_sauvegarder = []
+    if a_sauvegarder:
+        TestD2R.all_objects.bulk_update(a_sauvegarder, SCORE_FIELDS)
+        total += len(a_sauvegarder)
+    return total
+
+
+# ========== NORMES ==========
+
+class TableNormesD2R:
+    """
+    Table de normes D2R (exactitude, rythme ou concentration) en mémoire.
+
+    Les lignes sont conservées dans l'ordre du modèle ; pour chaque âge
+    demandé, un IntervalIndex sur les valeurs est construit une seule fois,
+    la première ligne correspondante l'emportant comme avec .first().
+    """
+
+    def __init__(self, lignes):
+        """lignes : itérable de (age_min, age_max, valeur_min, valeur_max, NormeD2R)."""
+        self.lignes = list(lignes)
+        self._par_age = {}
+
+    def index_age(self, age):
+        index = self._par_age.get(age)
+        if index is None:
+            index = IntervalIndex(
+                (valeur_min, valeur_max, norme)
+                for age_min, age_max, valeur_min, valeur_max, norme in self.lignes
+                if age_min <= age <= age_max
+            )
+            self._par_age[age] = index
+        return index
+
+    def find(self, age, valeur):
+        """NormeD2R applicable (ou None)."""
+        return self.index_age(age).find(valeur)
+
+
+class NormesD2R:
+    """Les trois tables de normes D2R, chargées une fois par processus."""
+
+    def __init__(self, exactitude, rythme, concentration):
+        self.exactitude = exactitude
+        self.rythme = rythme
+        self.concentration = concentration
+
+    @classmethod
+    def load(cls):
+        from tests_psy.models import NormeExactitude, NormeRythmeTraitement, NormeCapaciteConcentration
+
+        def table(model):
+            return TableNormesD2R(
+                (age_min, age_max, valeur_min, valeur_max, NormeD2R(note_standard, percentile))
+                for age_min, age_max, valeur_min, valeur_max, note_standard, percentile in model.objects.values_list(
+                    'age_min', 'age_max', 'valeur_min', 'valeur_max', 'note_standard', 'percentile'
+                )
+            )
+
+        return cls(
+            table(NormeExactitude),
+            table(NormeRythmeTraitement),
+            table(NormeCapaciteConcentration),
+        )
+
+
+_normes_d2r = ProcessCache('d2r_normes', NormesD2R.load)
+
+
+def get_normes_d2r():
+    """Retourne les normes D2R du processus (chargées au premier appel)."""
+    return _normes_d2r.get()
+
+
+def invalidate_normes_d2r():
+    """Force le rechargement des normes D2R (après modification ou import)."""
+    _normes_d2r.invalidate()
+
+
+def calculate_d2r_results(test, normes=None):
+    """
+    Scores dérivés et normes d'un test D2R (résultats, PDF et liste).
+    Les notes standards et percentiles absents valent None.
+    """
+    normes = normes or get_normes_d2r()
+
+    cct = test.reponses_correctes
+    ec = test.reponses_incorrectes
+    eo = test.reponses_omises or 0
+    cc = cct - ec - eo
+    e_percentage = ((eo + ec) / cct) * 100 if cct > 0 else 0
+    e_pourcentage_sans_virgule = int(e_percentage)
+
+    total_reponses = cct + ec
+    precision = (cct / total_reponses * 100) if total_reponses > 0 else 0
+    temps_moyen_ligne = test.temps_total / 14 if test.temps_total > 0 else 0
+
+    norme_exactitude = normes.exactitude.find(test.age, e_pourcentage_sans_virgule)
+    norme_rythme = normes.rythme.find(test.age, cct)
+    norme_concentration = normes.concentration.find(test.age, cc)
+
+    return {
+        'total_reponses': total_reponses,
+        'precision': round(precision, 2),
+        'temps_moyen_ligne': round(temps_moyen_ligne, 1),
+        'cct': cct,
+        'ec': ec,
+        'eo': eo,
+        'cc': cc,
+        'e_percentage': round(e_percentage, 2),
+        'note_standard_e': norme_exactitude.note_standard if norme_exactitude else None,
+        'percentile_e': norme_exactitude.percentile if norme_exactitude else None,
+        'note_standard_cct': norme_rythme.note_standard if norme_rythme else None,
+        'percentile_cct': norme_rythme.percentile if norme_rythme else None,
+        'note_standard_cc': norme_concentration.note_standard if norme_concentration else None,
+        'percentile_cc': norme_concentration.percentile if norme_concentration else None,
+    }
+
+
+def annotate_d2r_results(tests):
+    """
+    Mode liste : calcule les résultats normés de tous les tests en une passe
+    (normes chargées une fois) et les attache à chaque test (test.resultats).
+    """
+    normes = get_normes_d2r()
+    tests = list(tests)
+    for test in tests:
+        test.resultats = calculate_d2r_results(test, normes)
+    return tests
+
+
+# ========== CHRONOMÉTRIE PAR LIGNE ==========
+
+def parse_evenements(raw):
+    """
+    Lit les événements envoyés par la page de passation : liste JSON de
+    [type, ligne, rang, t] où t est en millisecondes depuis le début du test.
+    Les entrées invalides sont ignorées.
+    """
+    try:
+        data = json.loads(raw or '[]')
+    except ValueError:
+        return []
+    if not isinstance(data, list):
+        return []
+
+    evenements = []
+    for item in data[:MAX_EVENEMENTS]:
+        if not isinstance(item, list) or len(item) != 4:
+            continue
+        try:
+            type_, ligne, rang, t = (int(value) for value in item)
+        except (TypeError, ValueError):
+            continue
+        if type_ in (DEBUT_LIGNE, SELECTION, DESELECTION, FIN_LIGNE) and ligne >= 0 and rang >= 0 and t >= 0:
+            evenements.append(Evenement(t, type_, ligne, rang))
+    evenements.sort(key=lambda evenement: evenement.t)
+    return evenements
+
+
+def _write_varint(buffer, value):
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def encode_evenements(evenements):
+    """
+    Encode les événements (triés par t) en binaire compact : un octet de
+    format puis, par événement, trois varints (écart de temps en ms,
+    ligne * 4 + type, rang). Un clic occupe en général 3 à 4 octets.
+    """
+    buffer = bytearray([FORMAT_EVENEMENTS])
+    precedent = 0
+    for evenement in evenements:
+        _write_varint(buffer, evenement.t - precedent)
+        _write_varint(buffer, (evenement.ligne << 2) | evenement.type)
+        _write_varint(buffer, evenement.rang)
+        precedent = evenement.t
+    return bytes(buffer)
+
+
+def decode_evenements(data):
+    """Décode le format produit par encode_evenements()."""
+    if not data:
+        return []
+    data = bytes(data)
+    if data[0] != FORMAT_EVENEMENTS:
+        return []
+
+    evenements = []
+    offset = 1
+    t = 0
+    while offset < len(data):
+        delta, offset = _read_varint(data, offset)
+        ligne_type, offset = _read_varint(data, offset)
+        rang, offset = _read_varint(data, offset)
+        t += delta
+        evenements.append(Evenement(t, ligne_type & 3, ligne_type >> 2, rang))
+    return evenements
+
+
+def _pente(valeurs):
+    """Pente de la droite des moindres carrés de valeurs en fonction de leur rang."""
+    n = len(valeurs)
+    if n < 2:
+        return 0
+    moyenne_x = (n - 1) / 2
+    moyenne_y = mean(valeurs)
+    numerateur = sum((x - moyenne_x) * (y - moyenne_y) for x, y in enumerate(valeurs))
+    denominateur = sum((x - moyenne_x) ** 2 for x in range(n))
+    return numerateur / denominateur
+
+
+def analyse_passation(evenements, detail_lignes):
+    """
+    Analyse chronométrique d'une passation.
+
+    La durée active de chaque ligne est la somme des intervalles début/fin
+    (les pauses sont exclues). Combinée au détail par ligne de la correction,
+    elle donne la vitesse (symboles traités par seconde) et le taux d'erreur
+    de chaque ligne (ajoutés au détail de la ligne), ainsi que des indices de fatigue et de fluctuation :
+    - fluctuation : écart entre la ligne la plus et la moins traitée ;
+    - coefficient_variation : dispersion relative des vitesses (%) ;
+    - pente_vitesse : évolution moyenne de la vitesse d'une ligne à l'autre ;
+    - indice_fatigue : variation (%) de la vitesse entre le premier et le dernier tiers.
+    Retourne None si aucun événement n'a été enregistré.
+    """
+    if not evenements:
+        return None
+
+    durees = defaultdict(int)
+    clics = defaultdict(int)
+    debuts = {}
+    for evenement in evenements:
+        if evenement.type == DEBUT_LIGNE:
+            debuts[evenement.ligne] = evenement.t
+        elif evenement.type == FIN_LIGNE:
+            debut = debuts.pop(evenement.ligne, None)
+            if debut is not None:
+                durees[evenement.ligne] += evenement.t - debut
+        else:
+            clics[evenement.ligne] += 1
+
+    lignes = []
+    for detail in detail_lignes:
+        duree = durees.get(detail['ligne'], 0) / 1000
+        traites = detail['traites']
+        lignes.append(dict(
+            detail,
+            duree=round(duree, 1),
+            clics=clics.get(detail['ligne'], 0),
+            vitesse=round(traites / duree, 2) if duree else None,
+            taux_erreur=round((detail['ec'] + detail['eo']) / traites * 100, 1) if traites else None,
+        ))
+
+    vitesses = [ligne['vitesse'] for ligne in lignes if ligne['vitesse'] is not None]
+    traites = [detail['traites'] for detail in detail_lignes if detail['traites']]
+    tiers = len(vitesses) // 3
+    debut, fin = (mean(vitesses[:tiers]), mean(vitesses[-tiers:])) if tiers else (None, None)
+
+    return {
+        'lignes': lignes,
+        'duree_moyenne': round(mean(durees.values()) / 1000, 1) if durees else 0,
+        'fluctuation': max(traites) - min(traites) if traites else 0,
+        'coefficient_variation': (
+            round(pstdev(vitesses) / mean(vitesses) * 100, 1) if vitesses and mean(vitesses) else None
+        ),
+        'pente_vitesse': round(_pente(vitesses), 3) if vitesses else None,
+        'indice_fatigue': round((fin - debut) / debut * 100, 1) if debut else None,
+    }
@@ -0,0 +1,69 @@
+"""
+Séries d'évolution des scores (Beck, STAI) par patient.
+
+Chaque soumission enregistre un point dans PointEvolution ; les pages de
+résultats et l'API JSON lisent la série du patient en une requête indexée.
+"""
+
+# Scores conservés pour chaque instrument : {clé de la série: champ du test}
+SCORES_INSTRUMENTS = {
+    'beck': {'score_total': 'score_total'},
+    'stai': {'etat': 'score_etat', 'trait': 'score_trait'},
+}
+
+
+def enregistrer_point(test, instrument):
+    """Crée ou met à jour le point d'évolution du test (une requête d'upsert)."""
+    from tests_psy.models import PointEvolution
+
+    PointEvolution.all_objects.bulk_create(
+        [PointEvolution(
+            organization_id=test.organization_id,
+            patient_id=test.patient_id,
+            instrument=instrument,
+            test_id=test.id,
+            date_passation=test.date_passation,
+            scores={
+                cle: getattr(test, champ)
+                for cle, champ in SCORES_INSTRUMENTS[instrument].items()
+            },
+        )],
+        update_conflicts=True,
+        unique_fields=['instrument', 'test_id'],
+        update_fields=['scores', 'date_passation'],
+    )
+
+
+def supprimer_point(test, instrument):
+    from tests_psy.models import PointEvolution
+
+    PointEvolution.all_objects.filter(instrument=instrument, test_id=test.id).delete()
+
+
+def get_serie(patient, instrument):
+    """
+    Série d'évolution du patient pour l'instrument :
+    {'dates': [...], 'scores': {clé: [...]}} dans l'ordre chronologique.
+    """
+    from tests_psy.models import PointEvolution
+
+    points = PointEvolution.all_objects.filter(
+        patient=patient,
+        instrument=instrument
+    ).order_by('date_passation').values_list('date_passation', 'scores')
+
+    serie = {
+        'dates': [],
+        'scores': {cle: [] for cle in SCORES_INSTRUMENTS[instrument]},
+    }
+    for date_passation, scores in points:
+        serie['dates'].append(date_passation.strftime('%d/%m/%Y'))
+        for cle, valeurs in serie['scores'].items():
+            valeurs.append(scores.get(cle))
+    return serie
+
+
+def count_points(patient, instrument):
+    from tests_psy.models import PointEvolution
+
+    return PointEvolution.all_objects.filter(patient=patient, instrument=instrument).count()
@@ -0,0 +1,207 @@
+"""
+Export groupé des rapports (dossier d'un patient, ou organisation sur une
+période) en une archive ZIP diffusée au fil de l'eau.
+
+Les rapports passent par la file de services/rapports.py, test par test :
+ceux déjà rendus sont lus depuis le cache, les autres sont réservés puis
+rendus en parallèle sur un pool de processus. Chaque fichier est ajouté à
+l'archive dès qu'il est prêt, par morceaux : la mémoire reste constante quel
+que soit le nombre de rapports.
+
+Les rapports qui n'ont pas pu être rendus sont listés dans erreurs.txt.
+"""
+import os
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import F
+
+from tests_psy.services.rapports import (
+    INSTRUMENTS, demander_rapport, reserver_travail,
+    executer_rapport, chemin_fichier, pool_de_rendu,
+)
+
+
+# Paramètres de cotation des rapports exportés (ceux du téléchargement par défaut)
+PARAMETRES_EXPORT = {
+    'vineland': {'niveau_confiance': 90, 'niveau_significativite': '.05'},
+}
+
+# Lecture des fichiers par morceaux de 64 Ko
+TAILLE_MORCEAU = 64 * 1024
+
+# Attente d'un rapport rendu par un autre processus (worker, autre requête)
+ATTENTE_RENDU_EXTERNE = 0.5
+
+
+def selectionner_tests(organization, instruments, patient=None, debut=None, fin=None):
+    """
+    Tests à exporter : [(instrument, test)], par patient puis date de passation.
+    debut et fin (dates) sont inclusifs.
+    """
+    selection = []
+    for instrument in instruments:
+        tests = apps.get_model(INSTRUMENTS[instrument].model).all_objects.filter(
+            organization=organization
+        ).select_related('organization', 'patient', 'psychologue')
+        if patient is not None:
+            tests = tests.filter(patient=patient)
+        if debut is not None:
+            tests = tests.filter(date_passation__date__gte=debut)
+        if fin is not None:
+            tests = tests.filter(date_passation__date__lte=fin)
+        selection.extend((instrument, test) for test in tests)
+
+    selection.sort(key=lambda item: (item[1].patient.nom, item[1].patient.prenom, item[1].date_passation))
+    return selection
+
+
+def _recuperer(travaux, bloquant=False):
+    """Rapports rendus par le pool (au moins un si bloquant), retirés de travaux."""
+    termines, _ = wait(travaux, timeout=None if bloquant else 0, return_when=FIRST_COMPLETED)
+    for travail in termines:
+        instrument, test, rapport = travaux.pop(travail)
+        rapport.statut = travail.result()
+        yield instrument, test, rapport
+
+
+def preparer_rapports(selection, workers=None, attente_max=None):
+    """
+    Produit (instrument, test, rapport) à mesure que les rapports sont prêts.
+
+    Les tests sont demandés à la file un par un : un rapport en cache part
+    aussitôt, les autres sont rendus sur le pool (au plus 2 × workers en
+    vol). Les rapports rendus par un autre processus sont attendus à la fin,
+    au plus attente_max secondes (RAPPORTS_EXPORT_ATTENTE). Si l'export est
+    interrompu (client déconnecté), les rendus réservés et non terminés sont
+    remis en attente.
+    """
+    from tests_psy.models import RapportPDF
+
+    if workers is None:
+        workers = settings.RAPPORTS_EXPORT_WORKERS
+    if attente_max is None:
+        attente_max = settings.RAPPORTS_EXPORT_ATTENTE
+    en_vol = max(1, workers) * 2
+
+    pool = None
+    travaux = {}
+    externes = []
+    try:
+        for instrument, test in selection:
+            rapport = demander_rapport(instrument, test, PARAMETRES_EXPORT.get(instrument))
+            if rapport.statut == 'pret':
+                yield instrument, test, rapport
+            elif rapport.statut == 'attente' and reserver_travail(rapport.id):
+                if pool is None:
+                    pool = pool_de_rendu(max(1, workers))
+                travaux[pool.submit(executer_rapport, rapport.id)] = (instrument, test, rapport)
+            else:
+                # Rendu en cours ailleurs, ou en erreur définitive
+                externes.append((instrument, test, rapport))
+            yield from _recuperer(travaux, bloquant=len(travaux) >= en_vol)
+
+        while travaux:
+            yield from _recuperer(travaux, bloquant=True)
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        if travaux:
+            RapportPDF.all_objects.filter(
+                pk__in=[rapport.id for instrument, test, rapport in travaux.values()],
+                statut='en_cours',
+            ).update(statut='attente', tentatives=F('tentatives') - 1)
+
+    limite = time.monotonic() + attente_max
+    while externes:
+        en_cours = [rapport.id for instrument, test, rapport in externes if rapport.statut in ('attente', 'en_cours')]
+        if en_cours and time.monotonic() < limite:
+            time.sleep(ATTENTE_RENDU_EXTERNE)
+            statuts = dict(RapportPDF.all_objects.filter(pk__in=en_cours).values_list('pk', 'statut'))
+        else:
+            statuts = {}
+        restants = []
+        for instrument, test, rapport in externes:
+            rapport.statut = statuts.get(rapport.id, rapport.statut)
+            if rapport.statut in ('attente', 'en_cours') and time.monotonic() < limite:
+                restants.append((instrument, test, rapport))
+            else:
+                yield instrument, test, rapport
+        externes = restants
+
+
+class _Flux:
+    """
+    Destination non positionnable de zipfile : les octets écrits sont
+    conservés jusqu'au prochain vider(). zipfile utilise alors des
+    descripteurs de données au lieu de revenir sur les en-têtes.
+    """
+
+    def __init__(self):
+        self.morceaux = []
+
+    def write(self, data):
+        self.morceaux.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def vider(self):
+        data = b''.join(self.morceaux)
+        self.morceaux = []
+        return data
+
+
+def _nom_entree(test, nom_fichier, noms):
+    """Chemin dans l'archive (<Nom Prénom>/<fichier>), rendu unique."""
+    dossier = f'{test.patient.nom}_{test.patient.prenom}'.replace('/', '-')
+    racine, extension = os.path.splitext(nom_fichier.replace('/', '-'))
+    nom = f'{dossier}/{racine}{extension}'
+    rang = 2
+    while nom in noms:
+        nom = f'{dossier}/{racine}_{rang}{extension}'
+        rang += 1
+    noms.add(nom)
+    return nom
+
+
+def flux_zip(rapports):
+    """
+    Archive ZIP des rapports, produite morceau par morceau (pour
+    StreamingHttpResponse). rapports : itérable de (instrument, test, rapport).
+    """
+    flux = _Flux()
+    noms = set()
+    erreurs = []
+
+    with zipfile.ZipFile(flux, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for instrument, test, rapport in rapports:
+            libelle = f'{instrument.upper()} - {test.patient.nom} {test.patient.prenom} ({test.date_passation:%d/%m/%Y})'
+            if rapport.statut != 'pret':
+                erreurs.append(f'{libelle} : {rapport.erreur or rapport.get_statut_display()}')
+                continue
+
+            try:
+                source = open(chemin_fichier(rapport), 'rb')
+            except FileNotFoundError:
+                # Version purgée entre-temps (test modifié pendant l'export)
+                erreurs.append(f'{libelle} : rapport modifié pendant l\'export')
+                continue
+
+            nom = _nom_entree(test, INSTRUMENTS[instrument].nom_fichier(test), noms)
+            with source, archive.open(nom, 'w') as cible:
+                while morceau := source.read(TAILLE_MORCEAU):
+                    cible.write(morceau)
+                    if data := flux.vider():
+                        yield data
+            if data := flux.vider():
+                yield data
+
+        if erreurs:
+            archive.writestr('erreurs.txt', '\n'.join(erreurs) + '\n')
+
+    yield flux.vider()
@@ -0,0 +1,51 @@
+"""
+Index d'intervalles pour les tables de normes (recherche par bisect).
+"""
+from bisect import bisect_right
+
+
+class IntervalIndex:
+    """
+    Index d'intervalles fermés [debut, fin] triés par début.
+
+    find() répond en O(log n) lorsque les intervalles sont disjoints (cas des
+    tables de normes) ; en cas de chevauchement, l'intervalle fourni en premier
+    l'emporte, comme le .first() des anciennes requêtes.
+    """
+    __slots__ = ('_starts', '_ends', '_max_ends', '_ranks', '_values')
+
+    def __init__(self, intervals):
+        """intervals : itérable de (debut, fin, valeur), par ordre de priorité."""
+        items = sorted(
+            (
+                (debut, fin, rank, value)
+                for rank, (debut, fin, value) in enumerate(intervals)
+                if debut is not None and fin is not None
+            ),
+            key=lambda item: (item[0], item[2])
+        )
+        self._starts = [item[0] for item in items]
+        self._ends = [item[1] for item in items]
+        self._ranks = [item[2] for item in items]
+        self._values = [item[3] for item in items]
+
+        # Plus grande fin rencontrée jusqu'à chaque position : permet d'arrêter
+        # le parcours vers la gauche dès qu'aucun intervalle ne peut contenir le point
+        self._max_ends = []
+        max_end = None
+        for fin in self._ends:
+            max_end = fin if max_end is None or fin > max_end else max_end
+            self._max_ends.append(max_end)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def find(self, point, default=None):
+        """Valeur de l'intervalle prioritaire contenant point (ou default)."""
+        i = bisect_right(self._starts, point) - 1
+        best = None
+        while i >= 0 and self._max_ends[i] >= point:
+            if self._ends[i] >= point and (best is None or self._ranks[i] < self._ranks[best]):
+                best = i
+            i -= 1
+        return default if best is None else self._values[best]
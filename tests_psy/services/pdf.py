@@ -0,0 +1,268 @@
+"""
+Moteur des rapports PDF (ReportLab).
+
+Les styles de paragraphes et de tableaux sont construits une seule fois par
+processus puis réutilisés. Les flowables (Paragraph, Table) sont créés à
+chaque rendu : la mise en page écrit dans le flowable, il ne peut pas être
+partagé entre deux rendus.
+
+Chaque instrument déclare son rapport comme des données : un Rapport (marges,
+suite de Sections), chaque Section ayant un titre fixe et une fonction qui
+produit ses flowables à partir du test et du contexte de rendu.
+
+Usage:
+    RAPPORT_BECK = Rapport(marge=2*cm, sections=(
+        Section(None, entete("INVENTAIRE ...", 20)),
+        Section("Informations Patient", tableau_patient, espace_apres=1),
+    ))
+    pdf = construire_pdf(RAPPORT_BECK, test)
+"""
+import io
+from collections import namedtuple
+from functools import lru_cache
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+
+
+INDIGO = '#4F46E5'
+
+# titre : texte fixe (None sans titre) ; contenu(test, contexte) -> [flowables]
+# espace_titre / espace_apres en cm
+Section = namedtuple(
+    'Section',
+    ['titre', 'contenu', 'style_titre', 'espace_titre', 'espace_apres', 'saut_de_page'],
+    defaults=('section', 0, 0, False),
+)
+
+# marge en points ; taille : format de page
+Rapport = namedtuple('Rapport', ['marge', 'sections', 'taille'], defaults=(A4,))
+
+
+# ========== STYLES (UNE FOIS PAR PROCESSUS) ==========
+
+@lru_cache(maxsize=None)
+def get_styles():
+    """Styles de paragraphes nommés, communs à tous les rapports."""
+    sample = getSampleStyleSheet()
+
+    return {
+        # Styles de base ReportLab (rapport Vineland)
+        'title': sample['Heading1'],
+        'subtitle': sample['Heading2'],
+        'heading3': sample['Heading3'],
+        'normal': sample['Normal'],
+        'question': ParagraphStyle(
+            name='QuestionStyle', fontName='Helvetica', fontSize=9, leading=11, wordWrap='CJK', alignment=0
+        ),
+        'compact': ParagraphStyle(
+            name='CompactCell', fontName='Helvetica', fontSize=8, leading=10, wordWrap='CJK', alignment=0
+        ),
+
+        # Rapports Beck et STAI
+        'sous_titre': ParagraphStyle(
+            'Subtitle', parent=sample['Normal'], fontSize=10, textColor=colors.grey,
+            spaceAfter=20, alignment=TA_CENTER
+        ),
+        'section': ParagraphStyle(
+            'Section', parent=sample['Heading2'], fontSize=14, textColor=colors.HexColor(INDIGO),
+            spaceAfter=10, spaceBefore=15, fontName='Helvetica-Bold'
+        ),
+        'score': ParagraphStyle(
+            'Score', parent=sample['Normal'], fontSize=14, textColor=colors.HexColor('#666666'),
+            alignment=TA_CENTER, spaceAfter=3
+        ),
+        'grand_score': ParagraphStyle(
+            'BigScore', parent=sample['Normal'], fontSize=48, textColor=colors.HexColor(INDIGO),
+            alignment=TA_CENTER, fontName='Helvetica-Bold', spaceAfter=1
+        ),
+        'pied': ParagraphStyle(
+            'Footer', parent=sample['Normal'], fontSize=8, textColor=colors.grey, alignment=TA_CENTER
+        ),
+    }
+
+
+@lru_cache(maxsize=None)
+def style_titre(taille):
+    """Titre centré de la page d'en-tête (taille en points)."""
+    return ParagraphStyle(
+        'CustomTitle', parent=get_styles()['title'], fontSize=taille,
+        textColor=colors.HexColor(INDIGO), spaceAfter=10, alignment=TA_CENTER, fontName='Helvetica-Bold'
+    )
+
+
+@lru_cache(maxsize=None)
+def style_niveau(couleur):
+    """Libellé de niveau (interprétation) dans la couleur du niveau."""
+    return ParagraphStyle(
+        'Niveau', parent=get_styles()['normal'], fontSize=18, textColor=colors.HexColor(couleur),
+        alignment=TA_CENTER, fontName='Helvetica-Bold', spaceAfter=5
+    )
+
+
+@lru_cache(maxsize=None)
+def style_plage(couleur):
+    """Plage de scores sous le libellé de niveau."""
+    return ParagraphStyle(
+        'Range', parent=get_styles()['normal'], fontSize=11, textColor=colors.HexColor(couleur),
+        alignment=TA_CENTER,
+    )
+
+
+# ========== STYLES DE TABLEAUX ==========
+
+@lru_cache(maxsize=None)
+def style_tableau(nom):
+    """Styles de tableaux partagés (un TableStyle n'est pas modifié par les tableaux)."""
+    if nom == 'patient':
+        return TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F3F4F6')),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+            ('TOPPADDING', (0, 0), (-1, -1), 10),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ])
+    if nom == 'scores':
+        return TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 9),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('ALIGN', (1, 1), (-1, -1), 'CENTER'),
+            ('FONTSIZE', (0, 1), (-1, -1), 8),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ])
+    if nom == 'comparaisons':
+        return TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 8),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('ALIGN', (1, 1), (3, -1), 'CENTER'),
+            ('ALIGN', (5, 1), (7, -1), 'CENTER'),
+            ('FONTSIZE', (0, 1), (-1, -1), 7),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('BACKGROUND', (2, 1), (2, -1), colors.lightgrey),
+        ])
+    if nom == 'centre':
+        return TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ])
+    raise KeyError(nom)
+
+
+@lru_cache(maxsize=None)
+def style_encadre(fond, bordure, marge, texte=None):
+    """Encadré coloré centré (score, niveau) : fond, bordure et texte en hexadécimal."""
+    commandes = [
+        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor(fond)),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('TOPPADDING', (0, 0), (-1, -1), marge),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), marge),
+        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor(bordure)),
+    ]
+    if texte is not None:
+        commandes.insert(1, ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor(texte)))
+    return TableStyle(commandes)
+
+
+# ========== FLOWABLES ==========
+
+def paragraphe(texte, style='normal'):
+    """Paragraphe avec un style nommé de get_styles()."""
+    return Paragraph(texte, get_styles()[style])
+
+
+def tableau(donnees, largeurs, style):
+    """Table avec un style partagé (nom de style_tableau ou TableStyle)."""
+    table = Table(donnees, colWidths=largeurs)
+    table.setStyle(style_tableau(style) if isinstance(style, str) else style)
+    return table
+
+
+def entete(titre, taille):
+    """En-tête Beck / STAI : titre, date de passation, espace."""
+    def contenu(test, contexte):
+        return [
+            Paragraph(titre, style_titre(taille)),
+            Paragraph(f"Date du test : {test.date_passation.strftime('%d/%m/%Y à %H:%M')}", get_styles()['sous_titre']),
+            Spacer(1, 0.5*cm),
+        ]
+    return contenu
+
+
+def pied(libelle, espace=0):
+    """Mention de bas de rapport : date du test et nom de l'instrument (précédée de `espace` cm)."""
+    def contenu(test, contexte):
+        elements = [Spacer(1, espace*cm)] if espace else []
+        elements.append(Paragraph(
+            f"Document généré le {test.date_passation.strftime('%d/%m/%Y')} • {libelle}",
+            get_styles()['pied']
+        ))
+        return elements
+    return contenu
+
+
+def tableau_patient(test, contexte):
+    """Identité du patient et psychologue (rapports Beck et STAI)."""
+    patient = test.patient
+    return [tableau([
+        ['Nom', patient.nom_complet],
+        ['Date de naissance', f"{patient.date_naissance.strftime('%d/%m/%Y')} ({patient.age} ans)"],
+        ['Psychologue', test.psychologue.get_full_name()]
+    ], [5*cm, 10*cm], 'patient')]
+
+
+# ========== CONSTRUCTION ==========
+
+def construire_elements(rapport, test, contexte=None):
+    """Flowables du rapport, section par section."""
+    contexte = contexte or {}
+    elements = []
+    for section in rapport.sections:
+        if section.titre:
+            elements.append(paragraphe(section.titre, section.style_titre))
+            if section.espace_titre:
+                elements.append(Spacer(1, section.espace_titre*cm))
+        elements.extend(section.contenu(test, contexte))
+        if section.espace_apres:
+            elements.append(Spacer(1, section.espace_apres*cm))
+        if section.saut_de_page:
+            elements.append(PageBreak())
+    return elements
+
+
+def construire_pdf(rapport, test, contexte=None):
+    """Rend le rapport et retourne les octets du PDF."""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=rapport.taille,
+        rightMargin=rapport.marge,
+        leftMargin=rapport.marge,
+        topMargin=rapport.marge,
+        bottomMargin=rapport.marge
+    )
+    doc.build(construire_elements(rapport, test, contexte))
+    pdf = buffer.getvalue()
+    buffer.close()
+    return pdf
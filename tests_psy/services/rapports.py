@@ -0,0 +1,297 @@
+"""
+File de rendu et cache des rapports (PDF Beck, STAI, Vineland ; rapport
+imprimable D2R).
+
+Un rapport est identifié par (instrument, test, paramètres de cotation,
+empreinte du contenu). La vue cherche un rapport prêt et le sert tel quel
+(FileResponse) ; sinon elle crée un travail RapportPDF en attente, rendu par
+la commande rendre_rapports (pool de processus locaux, file en base, sans
+broker). Avec RAPPORTS_PDF_ASYNC = False, la vue rend le travail elle-même.
+
+L'empreinte couvre le test, ses réponses et l'identité du patient : un test
+modifié produit une nouvelle clé, et l'ancien fichier est supprimé au rendu
+suivant. Les signaux suppriment aussi les rapports d'un test supprimé et ceux
+d'un instrument dont les normes ou les items changent.
+"""
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from urllib.parse import parse_qsl, urlencode
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+Instrument = namedtuple('Instrument', [
+    'model', 'renderer', 'extension', 'content_type', 'relations', 'nom_fichier',
+])
+
+# relations : (related_name, champs m2m à inclure) des réponses du test
+INSTRUMENTS = {
+    'd2r': Instrument(
+        'tests_psy.TestD2R', 'tests_psy.views.d2r.generer_d2r_rapport',
+        'html', 'text/html; charset=utf-8', (),
+        lambda test: f"D2R_{test.patient.nom}_{test.patient.prenom}_{test.date_passation.strftime('%Y%m%d')}.html",
+    ),
+    'vineland': Instrument(
+        'tests_psy.TestVineland', 'tests_psy.views.vineland.generer_vineland_pdf',
+        'pdf', 'application/pdf', (('reponses_vineland', ()),),
+        lambda test: f"vineland_rapport_{test.patient.nom}_{timezone.localdate().strftime('%Y%m%d')}.pdf",
+    ),
+    'beck': Instrument(
+        'tests_psy.TestBeck', 'tests_psy.views.beck.generer_beck_pdf',
+        'pdf', 'application/pdf', (('reponses', ('phrases_cochees',)),),
+        lambda test: f"Beck_BDI_{test.patient.nom}_{test.patient.prenom}_{test.date_passation.strftime('%Y%m%d')}.pdf",
+    ),
+    'stai': Instrument(
+        'tests_psy.TestSTAI', 'tests_psy.views.stai.generer_stai_pdf',
+        'pdf', 'application/pdf', (('reponses', ()),),
+        lambda test: f"STAI_{test.patient.nom}_{test.patient.prenom}_{test.date_passation.strftime('%Y%m%d')}.pdf",
+    ),
+}
+
+# Un travail « en cours » plus ancien est considéré comme abandonné (worker arrêté)
+DELAI_TRAVAIL_BLOQUE = timedelta(minutes=10)
+
+# Au-delà, un travail en erreur n'est plus relancé automatiquement
+TENTATIVES_MAX = 3
+
+
+def get_racine():
+    return settings.RAPPORTS_PDF_ROOT
+
+
+def normaliser_parametres(parametres):
+    """{'niveau_confiance': 90, ...} → chaîne triée stable ('' sans paramètre)."""
+    return urlencode(sorted((parametres or {}).items()))
+
+
+def lire_parametres(parametres):
+    """Inverse de normaliser_parametres (les entiers sont restaurés)."""
+    return {
+        cle: int(valeur) if valeur.lstrip('-').isdigit() else valeur
+        for cle, valeur in parse_qsl(parametres)
+    }
+
+
+class _EncodeurEmpreinte(DjangoJSONEncoder):
+    """Les champs binaires (evenements D2R : memoryview sous PostgreSQL) sont hachés par leur contenu."""
+
+    def default(self, o):
+        if isinstance(o, (bytes, bytearray, memoryview)):
+            return bytes(o).hex()
+        return super().default(o)
+
+
+def calculer_empreinte(instrument, test):
+    """Empreinte SHA-256 du contenu du rapport : test, réponses, patient, psychologue."""
+    from cabinet.models import Patient
+    from accounts.models import User
+
+    config = INSTRUMENTS[instrument]
+    model = type(test)
+    contenu = [
+        list(model.all_objects.filter(pk=test.pk).values()),
+        list(Patient.all_objects.filter(pk=test.patient_id).values('nom', 'prenom', 'date_naissance')),
+        list(User.objects.filter(pk=test.psychologue_id).values('first_name', 'last_name')),
+    ]
+    for relation, champs_m2m in config.relations:
+        reponses = getattr(test, relation).order_by('pk')
+        contenu.append(list(reponses.values_list()))
+        for champ in champs_m2m:
+            contenu.append(list(reponses.order_by('pk', champ).values_list('pk', champ)))
+
+    donnees = json.dumps(contenu, cls=_EncodeurEmpreinte)
+    return hashlib.sha256(donnees.encode()).hexdigest()
+
+
+def chemin_fichier(rapport):
+    return os.path.join(get_racine(), rapport.fichier)
+
+
+def _nom_fichier_stockage(instrument, test_id, parametres, empreinte):
+    """Chemin relatif du fichier rendu : <instrument>/<test>/<paramètres>-<empreinte>.<ext>"""
+    cle_parametres = hashlib.md5(parametres.encode()).hexdigest()[:8]
+    extension = INSTRUMENTS[instrument].extension
+    return os.path.join(instrument, str(test_id), f'{cle_parametres}-{empreinte}.{extension}')
+
+
+def demander_rapport(instrument, test, parametres=None):
+    """
+    Rapport prêt ou travail en attente pour ce test et ces paramètres.
+    Un fichier disparu (disque éphémère), une erreur récupérable ou un rendu
+    abandonné remettent le travail en attente.
+    """
+    from tests_psy.models import RapportPDF
+
+    parametres = normaliser_parametres(parametres)
+    empreinte = calculer_empreinte(instrument, test)
+
+    rapport, created = RapportPDF.all_objects.get_or_create(
+        instrument=instrument,
+        test_id=test.pk,
+        parametres=parametres,
+        empreinte=empreinte,
+        defaults={
+            'organization_id': test.organization_id,
+            'fichier': _nom_fichier_stockage(instrument, test.pk, parametres, empreinte),
+        }
+    )
+    if created:
+        return rapport
+
+    a_relancer = (
+        (rapport.statut == 'pret' and not os.path.exists(chemin_fichier(rapport)))
+        or (rapport.statut == 'erreur' and rapport.tentatives < TENTATIVES_MAX)
+        or (rapport.statut == 'en_cours' and rapport.date_debut < timezone.now() - DELAI_TRAVAIL_BLOQUE)
+    )
+    if a_relancer:
+        RapportPDF.all_objects.filter(pk=rapport.pk, statut=rapport.statut).update(statut='attente', erreur='')
+        rapport.statut = 'attente'
+    return rapport
+
+
+def reserver_travaux(limite=None):
+    """
+    Passe des travaux en attente à « en cours » et retourne leurs identifiants.
+    La réservation est un UPDATE conditionnel : plusieurs workers peuvent
+    interroger la file sans prendre deux fois le même travail.
+    """
+    from tests_psy.models import RapportPDF
+
+    en_attente = RapportPDF.all_objects.filter(statut='attente').order_by('date_creation').values_list('pk', flat=True)
+    if limite is not None:
+        en_attente = en_attente[:limite]
+
+    reserves = []
+    for rapport_id in list(en_attente):
+        if reserver_travail(rapport_id):
+            reserves.append(rapport_id)
+    return reserves
+
+
+def reserver_travail(rapport_id):
+    from tests_psy.models import RapportPDF
+
+    return RapportPDF.all_objects.filter(pk=rapport_id, statut='attente').update(
+        statut='en_cours',
+        date_debut=timezone.now(),
+        tentatives=F('tentatives') + 1,
+    ) == 1
+
+
+def reprendre_travaux_bloques():
+    """Remet en attente les travaux « en cours » abandonnés par un worker arrêté."""
+    from tests_psy.models import RapportPDF
+
+    return RapportPDF.all_objects.filter(
+        statut='en_cours',
+        date_debut__lt=timezone.now() - DELAI_TRAVAIL_BLOQUE,
+    ).update(statut='attente')
+
+
+def executer_rapport(rapport_id):
+    """
+    Rend un travail réservé (statut « en cours ») et écrit le fichier.
+    Appelé dans un processus du pool de rendre_rapports, ou dans la requête
+    lorsque le rendu est synchrone. Retourne le statut final.
+    """
+    from core.middleware import tenant_context
+    from tests_psy.models import RapportPDF
+
+    rapport = RapportPDF.all_objects.filter(pk=rapport_id).first()
+    if rapport is None:
+        return 'invalide'
+    config = INSTRUMENTS[rapport.instrument]
+
+    try:
+        test = apps.get_model(config.model).all_objects.select_related(
+            'organization', 'patient', 'psychologue'
+        ).get(pk=rapport.test_id)
+        renderer = import_string(config.renderer)
+        with tenant_context(test.organization):
+            contenu = renderer(test, **lire_parametres(rapport.parametres))
+
+        # Écriture atomique : un fichier servi est toujours complet
+        chemin = chemin_fichier(rapport)
+        os.makedirs(os.path.dirname(chemin), exist_ok=True)
+        temporaire = f'{chemin}.{os.getpid()}.tmp'
+        with open(temporaire, 'wb') as fichier:
+            fichier.write(contenu)
+        os.replace(temporaire, chemin)
+    except Exception as e:
+        logger.exception(f"Échec du rendu du rapport {rapport_id}")
+        RapportPDF.all_objects.filter(pk=rapport_id).update(
+            statut='erreur', erreur=str(e)[:2000], date_fin=timezone.now()
+        )
+        return 'erreur'
+
+    if not RapportPDF.all_objects.filter(pk=rapport_id).update(statut='pret', erreur='', date_fin=timezone.now()):
+        # Rapport invalidé pendant le rendu : le fichier est déjà périmé
+        _supprimer_fichier(chemin)
+        return 'invalide'
+    purger_versions_precedentes(rapport)
+    return 'pret'
+
+
+def pool_de_rendu(workers):
+    """
+    Pool de processus pour executer_rapport. Démarrage « spawn » : chaque
+    processus initialise Django et ouvre ses propres connexions.
+    """
+    return ProcessPoolExecutor(
+        max_workers=max(1, workers),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=django.setup,
+    )
+
+
+def _supprimer_fichier(chemin):
+    try:
+        os.remove(chemin)
+    except FileNotFoundError:
+        pass
+
+
+def _supprimer(rapports):
+    """Supprime les lignes et leurs fichiers."""
+    rapports = list(rapports)
+    for rapport in rapports:
+        _supprimer_fichier(chemin_fichier(rapport))
+    if rapports:
+        apps.get_model('tests_psy.RapportPDF').all_objects.filter(pk__in=[r.pk for r in rapports]).delete()
+    return len(rapports)
+
+
+def purger_versions_precedentes(rapport):
+    """Supprime les rapports du même test et des mêmes paramètres rendus sur un contenu antérieur."""
+    from tests_psy.models import RapportPDF
+
+    return _supprimer(
+        RapportPDF.all_objects.filter(
+            instrument=rapport.instrument, test_id=rapport.test_id, parametres=rapport.parametres,
+        ).exclude(pk=rapport.pk).exclude(statut='en_cours')
+    )
+
+
+def invalider_rapports(instrument, test_id=None):
+    """Supprime les rapports d'un test, ou de tout l'instrument (normes ou items modifiés)."""
+    from tests_psy.models import RapportPDF
+
+    rapports = RapportPDF.all_objects.filter(instrument=instrument)
+    if test_id is not None:
+        rapports = rapports.filter(test_id=test_id)
+    # Un rendu en cours sur une ligne supprimée jette son fichier (voir executer_rapport)
+    return _supprimer(rapports)
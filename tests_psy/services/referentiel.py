@@ -0,0 +1,532 @@
+"""
+Import en masse des données de référence (Vineland, D2R, Beck, STAI).
+
+Le fichier JSON ({"table": [ligne, ...], ...}) est lu par blocs : les lignes
+sont produites une à une sans charger le document. Chaque ligne est validée
+(types, valeurs nulles, choix, longueurs), puis chaque table est comparée à
+son contenu actuel par clé naturelle et seules les différences sont écrites
+(bulk_create / bulk_update / suppression par lots), le tout dans une seule
+transaction : en cas d'erreur, rien n'est modifié, et les tables ne sont
+jamais vidées pendant l'import.
+
+Un champ absent d'une ligne prend sa valeur par défaut à la création et reste
+inchangé sur une ligne existante. Les lignes absentes du fichier ne sont
+supprimées que pour les tables « miroir » (D2R, importées en remplacement
+complet) ou sur demande.
+
+Les caches (normes, grilles, items, matrices, snapshots, rapports) sont
+invalidés une fois à la fin, via tests_psy.signals.import_en_masse.
+"""
+import json
+import os
+import time
+from collections import namedtuple
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from tests_psy.models import (
+    Domain, SousDomain,
+    QuestionVineland, PlageItemVineland, EchelleVMapping,
+    NoteDomaineVMapping, IntervaleConfianceSousDomaine,
+    IntervaleConfianceDomaine, NiveauAdaptatif,
+    AgeEquivalentSousDomaine, ComparaisonDomaineVineland,
+    ComparaisonSousDomaineVineland, FrequenceDifferenceDomaineVineland,
+    FrequenceDifferenceSousDomaineVineland,
+    SymboleReference, NormeExactitude, NormeRythmeTraitement, NormeCapaciteConcentration,
+    ItemBeck, PhraseBeck, ItemSTAI,
+)
+
+
+DOSSIER_DONNEES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+TAILLE_BLOC = 64 * 1024
+TAILLE_LOT = 1000
+
+# Au-delà, les erreurs de validation suivantes ne sont plus détaillées
+ERREURS_MAX = 20
+
+
+class ErreurImport(Exception):
+    """Fichier illisible ou données invalides : l'import est annulé."""
+
+    def __init__(self, message, erreurs=()):
+        super().__init__(message)
+        self.erreurs = list(erreurs)
+
+
+class _Requis:
+    def __repr__(self):
+        return 'REQUIS'
+
+
+class _Absent:
+    def __repr__(self):
+        return 'ABSENT'
+
+
+REQUIS = _Requis()
+ABSENT = _Absent()
+
+# attname : champ du modèle ; model, champ : ligne référencée par ce champ (nom, numéro)
+Reference = namedtuple('Reference', ['attname', 'model', 'champ'])
+
+# cle : attnames de la clé naturelle ; champs : {nom JSON : valeur par défaut ou REQUIS}
+# references : {nom JSON : Reference} ; source : clé JSON (nom de la table par défaut)
+Table = namedtuple(
+    'Table',
+    ['nom', 'model', 'cle', 'champs', 'references', 'source', 'miroir'],
+    defaults=({}, None, False),
+)
+
+# decomposer(cle JSON, élément, état de l'import) -> [(nom de table, ligne)]
+# pour les éléments imbriqués ou complétés
+# fichier : fichier livré avec l'application (None : à fournir à l'import)
+Referentiel = namedtuple('Referentiel', ['nom', 'tables', 'decomposer', 'fichier'], defaults=(None, None))
+
+Bilan = namedtuple(
+    'Bilan',
+    ['table', 'crees', 'modifies', 'supprimes', 'inchanges', 'lecture', 'comparaison', 'ecriture'],
+)
+
+
+# ========== DÉCLARATION DES RÉFÉRENTIELS ==========
+
+DOMAINE = Reference('domain_id', Domain, 'name')
+SOUS_DOMAINE = Reference('sous_domaine_id', SousDomain, 'name')
+
+INTERVALLES_NOTES_DOMAINES = {
+    f'{domaine}_{borne}': None
+    for domaine in ('communication', 'vie_quotidienne', 'socialisation', 'motricite', 'note_composite')
+    for borne in ('min', 'max')
+}
+
+FREQUENCES = {'frequence_16': REQUIS, 'frequence_10': REQUIS, 'frequence_5': REQUIS}
+
+VINELAND = Referentiel('vineland', (
+    Table('domains', Domain, ('name',), {'name': REQUIS, 'description': '', 'ordre': 0}),
+    Table('sous_domains', SousDomain, ('domain_id', 'name'), {'name': REQUIS, 'description': '', 'ordre': 0},
+          {'domain_name': DOMAINE._replace(attname='domain_id')}),
+    Table('questions', QuestionVineland, ('sous_domaine_id', 'numero_item'),
+          {'numero_item': REQUIS, 'texte': REQUIS, 'note': '', 'permet_na': False},
+          {'sous_domaine_name': SOUS_DOMAINE}),
+    Table('plages_items', PlageItemVineland, ('sous_domaine_id', 'item_debut', 'item_fin'),
+          {'item_debut': REQUIS, 'item_fin': REQUIS, 'age_debut': REQUIS, 'age_fin': None},
+          {'sous_domaine_name': SOUS_DOMAINE}),
+    Table('echelle_v_mappings', EchelleVMapping,
+          ('sous_domaine_id', 'age_debut_annee', 'age_debut_mois', 'age_fin_annee', 'age_fin_mois',
+           'note_brute_min', 'note_brute_max'),
+          {'age_debut_annee': REQUIS, 'age_debut_mois': REQUIS, 'age_fin_annee': REQUIS, 'age_fin_mois': REQUIS,
+           'note_brute_min': REQUIS, 'note_brute_max': REQUIS,
+           'age_debut_jour': 0, 'age_fin_jour': 0, 'note_echelle_v': REQUIS},
+          {'sous_domaine_name': SOUS_DOMAINE}),
+    Table('note_domaine_mappings', NoteDomaineVMapping, ('tranche_age', 'note_standard'),
+          {'tranche_age': REQUIS, 'note_standard': REQUIS, **INTERVALLES_NOTES_DOMAINES, 'rang_percentile': REQUIS}),
+    Table('intervalles_confiance_sous_domaine', IntervaleConfianceSousDomaine,
+          ('age', 'niveau_confiance', 'sous_domaine_id'),
+          {'age': REQUIS, 'niveau_confiance': REQUIS, 'intervalle': REQUIS},
+          {'sous_domaine_name': SOUS_DOMAINE}),
+    Table('intervalles_confiance_domaine', IntervaleConfianceDomaine,
+          ('age', 'niveau_confiance', 'domain_id'),
+          {'age': REQUIS, 'niveau_confiance': REQUIS, 'intervalle': REQUIS, 'note_composite': None},
+          {'domain_name': DOMAINE}),
+    Table('niveaux_adaptatifs', NiveauAdaptatif, ('niveau',),
+          {'niveau': REQUIS, 'echelle_v_min': REQUIS, 'echelle_v_max': REQUIS,
+           'note_standard_min': REQUIS, 'note_standard_max': REQUIS}),
+    Table('ages_equivalents', AgeEquivalentSousDomaine, ('sous_domaine_id', 'note_brute_min', 'note_brute_max'),
+          {'note_brute_min': REQUIS, 'note_brute_max': None, 'age_special': None, 'age_annees': None, 'age_mois': None},
+          {'sous_domaine_name': SOUS_DOMAINE}),
+    Table('comparaisons_domaines', ComparaisonDomaineVineland,
+          ('age', 'niveau_significativite', 'domaine1_id', 'domaine2_id'),
+          {'age': REQUIS, 'niveau_significativite': REQUIS, 'difference_requise': REQUIS},
+          {'domaine1_name': DOMAINE._replace(attname='domaine1_id'),
+           'domaine2_name': DOMAINE._replace(attname='domaine2_id')}),
+    Table('comparaisons_sous_domaines', ComparaisonSousDomaineVineland,
+          ('age', 'niveau_significativite', 'sous_domaine1_id', 'sous_domaine2_id'),
+          {'age': REQUIS, 'niveau_significativite': REQUIS, 'difference_requise': REQUIS},
+          {'sous_domaine1_name': SOUS_DOMAINE._replace(attname='sous_domaine1_id'),
+           'sous_domaine2_name': SOUS_DOMAINE._replace(attname='sous_domaine2_id')}),
+    Table('frequences_domaines', FrequenceDifferenceDomaineVineland, ('age', 'domaine1_id', 'domaine2_id'),
+          {'age': REQUIS, **FREQUENCES},
+          {'domaine1_name': DOMAINE._replace(attname='domaine1_id'),
+           'domaine2_name': DOMAINE._replace(attname='domaine2_id')}),
+    Table('frequences_sous_domaines', FrequenceDifferenceSousDomaineVineland,
+          ('age', 'sous_domaine1_id', 'sous_domaine2_id'),
+          {'age': REQUIS, **FREQUENCES},
+          {'sous_domaine1_name': SOUS_DOMAINE._replace(attname='sous_domaine1_id'),
+           'sous_domaine2_name': SOUS_DOMAINE._replace(attname='sous_domaine2_id')}),
+))
+
+# Normes D2R : pas de clé naturelle, la ligne entière sert de clé
+NORME_D2R = ('note_standard', 'percentile', 'age_min', 'age_max', 'valeur_min', 'valeur_max')
+
+
+def decomposer_d2r(cle, element, etat):
+    """Symbole sans position : rang dans sa ligne, dans l'ordre du fichier (comme SymboleReference.save)."""
+    if cle == 'symboles' and isinstance(element, dict) and element.get('position') is None:
+        rang = (element.get('page'), element.get('ligne'))
+        etat[rang] = element['position'] = etat.get(rang, 0) + 1
+    return [(cle, element)]
+
+
+D2R = Referentiel('d2r', (
+    Table('symboles', SymboleReference, ('page', 'ligne', 'position'),
+          {'page': REQUIS, 'ligne': REQUIS, 'position': REQUIS, 'lettre': REQUIS,
+           'traits_haut': REQUIS, 'traits_bas': REQUIS, 'background': 'N'},
+          miroir=True),
+    Table('normes_exactitude', NormeExactitude, NORME_D2R, dict.fromkeys(NORME_D2R, REQUIS), miroir=True),
+    Table('normes_rythme', NormeRythmeTraitement, NORME_D2R, dict.fromkeys(NORME_D2R, REQUIS), miroir=True),
+    Table('normes_concentration', NormeCapaciteConcentration, NORME_D2R, dict.fromkeys(NORME_D2R, REQUIS), miroir=True),
+), decomposer_d2r)
+
+
+def decomposer_beck(cle, element, etat):
+    """Item Beck avec ses phrases ([score, texte], dans l'ordre) -> lignes items et phrases."""
+    if not isinstance(element, dict):
+        raise ValidationError("objet JSON attendu")
+    phrases = element.pop('phrases', None) or []
+    lignes = [('items_beck', element)]
+    for ordre, phrase in enumerate(phrases, start=1):
+        if not isinstance(phrase, (list, tuple)) or len(phrase) != 2:
+            raise ValidationError(f"phrase {ordre} : [score, texte] attendu")
+        lignes.append(('phrases_beck', {
+            'item_numero': element.get('numero'), 'ordre': ordre,
+            'score_valeur': phrase[0], 'texte': phrase[1],
+        }))
+    return lignes
+
+
+BECK = Referentiel('beck', (
+    Table('items_beck', ItemBeck, ('numero',), {'numero': REQUIS, 'categorie': REQUIS}, source='items'),
+    Table('phrases_beck', PhraseBeck, ('item_id', 'ordre'),
+          {'ordre': REQUIS, 'score_valeur': REQUIS, 'texte': REQUIS},
+          {'item_numero': Reference('item_id', ItemBeck, 'numero')}, source='items'),
+), decomposer_beck, os.path.join(DOSSIER_DONNEES, 'beck.json'))
+
+STAI = Referentiel('stai', (
+    Table('items', ItemSTAI, ('numero',),
+          {'numero': REQUIS, 'texte': REQUIS, 'section': REQUIS, 'est_inverse': False}),
+), fichier=os.path.join(DOSSIER_DONNEES, 'stai.json'))
+
+REFERENTIELS = {referentiel.nom: referentiel for referentiel in (VINELAND, D2R, BECK, STAI)}
+
+
+# ========== LECTURE INCRÉMENTALE DU JSON ==========
+
+class _Lecteur:
+    """Tampon de lecture par blocs pour json.JSONDecoder.raw_decode."""
+
+    ESPACES = ' \t\r\n'
+
+    def __init__(self, fichier, taille_bloc):
+        self.fichier = fichier
+        self.taille_bloc = taille_bloc
+        self.decodeur = json.JSONDecoder()
+        self.tampon = ''
+        self.pos = 0
+        self.fin = False
+
+    def _remplir(self):
+        bloc = self.fichier.read(self.taille_bloc)
+        if not bloc:
+            self.fin = True
+            return False
+        self.tampon = self.tampon[self.pos:] + bloc
+        self.pos = 0
+        return True
+
+    def caractere(self):
+        """Prochain caractère significatif, sans le consommer."""
+        while True:
+            while self.pos < len(self.tampon) and self.tampon[self.pos] in self.ESPACES:
+                self.pos += 1
+            if self.pos < len(self.tampon):
+                return self.tampon[self.pos]
+            if not self._remplir():
+                raise ErreurImport("JSON invalide : fin de fichier inattendue")
+
+    def consommer(self, *attendus):
+        caractere = self.caractere()
+        if caractere not in attendus:
+            raise ErreurImport(f"JSON invalide : « {' ou '.join(attendus)} » attendu, « {caractere} » trouvé")
+        self.pos += 1
+        return caractere
+
+    def valeur(self):
+        """Décode la valeur suivante, en relisant un bloc tant qu'elle est incomplète."""
+        self.caractere()
+        while True:
+            try:
+                valeur, fin = self.decodeur.raw_decode(self.tampon, self.pos)
+            except json.JSONDecodeError as e:
+                if self._remplir():
+                    continue
+                raise ErreurImport(f"JSON invalide : {e.msg}")
+            # Un nombre en fin de tampon peut se prolonger dans le bloc suivant
+            if fin == len(self.tampon) and not self.fin and self._remplir():
+                continue
+            self.pos = fin
+            return valeur
+
+
+# Marque la fin d'un tableau de premier niveau
+FIN = object()
+
+
+def lire_json(chemin, taille_bloc=TAILLE_BLOC):
+    """
+    Parcourt {"cle": [élément, ...], ...} par blocs et produit (cle, élément),
+    puis (cle, FIN) à la fin de chaque tableau. Les valeurs de premier niveau
+    qui ne sont pas des tableaux (métadonnées d'export) sont ignorées.
+    """
+    with open(chemin, encoding='utf-8') as fichier:
+        lecteur = _Lecteur(fichier, taille_bloc)
+        lecteur.consommer('{')
+        if lecteur.caractere() == '}':
+            return
+        while True:
+            cle = lecteur.valeur()
+            lecteur.consommer(':')
+            if lecteur.caractere() == '[':
+                lecteur.consommer('[')
+                if lecteur.caractere() == ']':
+                    lecteur.consommer(']')
+                else:
+                    while True:
+                        yield cle, lecteur.valeur()
+                        if lecteur.consommer(',', ']') == ']':
+                            break
+                yield cle, FIN
+            else:
+                lecteur.valeur()
+            if lecteur.consommer(',', '}') == '}':
+                break
+
+
+# ========== VALIDATION ==========
+
+def _valider_champ(field, valeur):
+    valeur = field.to_python(valeur)
+    if valeur is None:
+        if not field.null:
+            raise ValidationError("valeur requise")
+        return None
+    if field.choices and valeur not in {choix for choix, libelle in field.flatchoices}:
+        raise ValidationError(f"valeur « {valeur} » hors des choix autorisés")
+    field.run_validators(valeur)
+    return valeur
+
+
+def preparer_ligne(table, ligne):
+    """
+    Ligne JSON -> {attname : valeur} validée. Les références restent sous
+    forme de nom (ou numéro), résolues à l'écriture de la table.
+    """
+    if not isinstance(ligne, dict):
+        raise ValidationError("objet JSON attendu")
+
+    inconnus = set(ligne) - set(table.champs) - set(table.references) - {'id'}
+    if inconnus:
+        raise ValidationError(f"champ(s) inconnu(s) : {', '.join(sorted(inconnus))}")
+
+    opts = table.model._meta
+    valeurs = {}
+    for nom, defaut in table.champs.items():
+        if nom in ligne:
+            try:
+                valeurs[nom] = _valider_champ(opts.get_field(nom), ligne[nom])
+            except ValidationError as e:
+                raise ValidationError(f"{nom} : {' '.join(e.messages)}")
+        elif defaut is REQUIS:
+            raise ValidationError(f"{nom} : champ requis")
+        else:
+            valeurs[nom] = defaut if nom in table.cle else ABSENT
+
+    for nom, reference in table.references.items():
+        if ligne.get(nom) is None:
+            raise ValidationError(f"{nom} : champ requis")
+        valeurs[reference.attname] = ligne[nom]
+    return valeurs
+
+
+# ========== COMPARAISON ET ÉCRITURE ==========
+
+def _resoudre(table, lignes, index):
+    """Remplace les noms référencés par les identifiants (index : {(model, champ) : {valeur : pk}})."""
+    erreurs = []
+    for reference in table.references.values():
+        cle_index = (reference.model, reference.champ)
+        if cle_index not in index:
+            index[cle_index] = dict(reference.model.objects.values_list(reference.champ, 'pk'))
+        correspondances = index[cle_index]
+        for numero, ligne in lignes:
+            nom = ligne[reference.attname]
+            if nom not in correspondances:
+                erreurs.append(
+                    f"{table.nom}[{numero}] : {reference.model._meta.verbose_name} « {nom} » introuvable"
+                )
+            else:
+                ligne[reference.attname] = correspondances[nom]
+    return erreurs
+
+
+def appliquer_table(table, lignes, index, miroir=False, taille_lot=TAILLE_LOT):
+    """
+    Compare les lignes validées à la table et écrit les différences.
+    Retourne (créées, modifiées, supprimées, inchangées, durée comparaison, durée écriture).
+    """
+    debut = time.perf_counter()
+    model = table.model
+    champs = [nom for nom in (*table.champs, *(r.attname for r in table.references.values()))
+              if nom not in table.cle]
+    n = len(table.cle)
+
+    existants = {}
+    for pk, *valeurs in model.objects.values_list('pk', *table.cle, *champs).iterator(chunk_size=taille_lot):
+        existants.setdefault(tuple(valeurs[:n]), (pk, valeurs[n:]))
+
+    # Dernière occurrence d'une clé en double dans le fichier
+    attendus = {tuple(ligne[c] for c in table.cle): ligne for numero, ligne in lignes}
+
+    a_creer, a_modifier = [], []
+    inchanges = 0
+    for cle, ligne in attendus.items():
+        existant = existants.get(cle)
+        if existant is None:
+            a_creer.append(model(**{
+                nom: table.champs.get(nom) if valeur is ABSENT else valeur for nom, valeur in ligne.items()
+            }))
+            continue
+        pk, anciennes = existant
+        nouvelles = [
+            ancienne if ligne[nom] is ABSENT else ligne[nom] for nom, ancienne in zip(champs, anciennes)
+        ]
+        if nouvelles == list(anciennes):
+            inchanges += 1
+        else:
+            a_modifier.append(model(pk=pk, **dict(zip(champs, nouvelles)), **dict(zip(table.cle, cle))))
+
+    a_supprimer = []
+    if miroir or table.miroir:
+        a_supprimer = [pk for cle, (pk, valeurs) in existants.items() if cle not in attendus]
+
+    comparaison = time.perf_counter() - debut
+    debut = time.perf_counter()
+
+    for i in range(0, len(a_supprimer), taille_lot):
+        model.objects.filter(pk__in=a_supprimer[i:i + taille_lot]).delete()
+    if a_modifier:
+        champs_modifies = list(champs)
+        if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+            maintenant = timezone.now()
+            for obj in a_modifier:
+                obj.updated_at = maintenant
+            champs_modifies.append('updated_at')
+        model.objects.bulk_update(a_modifier, champs_modifies, batch_size=taille_lot)
+    if a_creer:
+        model.objects.bulk_create(a_creer, batch_size=taille_lot)
+
+    # Les tables suivantes relisent les correspondances nom -> pk de ce modèle
+    for cle_index in [cle_index for cle_index in index if cle_index[0] is model]:
+        del index[cle_index]
+
+    return len(a_creer), len(a_modifier), len(a_supprimer), inchanges, comparaison, time.perf_counter() - debut
+
+
+def importer(referentiel, chemin, miroir=False, simulation=False, taille_lot=TAILLE_LOT):
+    """
+    Importe le fichier dans une transaction. Retourne (bilans par table,
+    avertissements) ; lève ErreurImport (rien n'est écrit) si le fichier
+    est illisible ou invalide. simulation : tout est calculé puis annulé.
+    """
+    from tests_psy.signals import import_en_masse
+
+    tables = {table.nom: table for table in referentiel.tables}
+    ordre = {nom: rang for rang, nom in enumerate(tables)}
+    par_source = {}
+    for table in referentiel.tables:
+        par_source.setdefault(table.source or table.nom, []).append(table)
+
+    # Tables dont dépend chacune (références vers un modèle importé par ce référentiel)
+    dependances = {
+        table.nom: {
+            autre.nom for autre in referentiel.tables
+            for reference in table.references.values() if reference.model is autre.model
+        }
+        for table in referentiel.tables
+    }
+
+    lignes = {nom: [] for nom in tables}
+    lecture = dict.fromkeys(tables, 0.0)
+    lues, appliquees, en_attente = set(), set(), []
+    erreurs, avertissements, bilans = [], [], []
+    index = {}
+
+    def appliquer_pretes(fin_du_fichier=False):
+        progres = True
+        while progres:
+            progres = False
+            for nom in sorted(en_attente, key=ordre.get):
+                pretes = all(
+                    dep in appliquees or (fin_du_fichier and dep not in lues) for dep in dependances[nom]
+                )
+                if not pretes:
+                    continue
+                en_attente.remove(nom)
+                table = tables[nom]
+                erreurs.extend(_resoudre(table, lignes[nom], index))
+                if not erreurs:
+                    *comptes, comparaison, ecriture = appliquer_table(table, lignes[nom], index, miroir, taille_lot)
+                    bilans.append(Bilan(nom, *comptes, lecture[nom], comparaison, ecriture))
+                    if any(comptes[:3]):
+                        modeles.add(table.model)
+                lignes[nom] = []
+                appliquees.add(nom)
+                progres = True
+
+    with import_en_masse() as modeles, transaction.atomic():
+        debut = time.perf_counter()
+        numeros, etat = {}, {}
+        for cle, element in lire_json(chemin):
+            if cle not in par_source:
+                if cle not in numeros:
+                    avertissements.append(f"Clé « {cle} » ignorée (pas une table de {referentiel.nom})")
+                    numeros[cle] = 0
+                continue
+
+            if element is FIN:
+                lecture_cle = time.perf_counter() - debut
+                for table in par_source[cle]:
+                    lecture[table.nom] += lecture_cle / len(par_source[cle])
+                    lues.add(table.nom)
+                    en_attente.append(table.nom)
+                if not erreurs:
+                    appliquer_pretes()
+                debut = time.perf_counter()
+                continue
+
+            numeros[cle] = numero = numeros.get(cle, 0) + 1
+            try:
+                if referentiel.decomposer:
+                    decomposees = referentiel.decomposer(cle, element, etat)
+                else:
+                    decomposees = [(cle, element)]
+                for nom, ligne in decomposees:
+                    lignes[nom].append((numero, preparer_ligne(tables[nom], ligne)))
+            except ValidationError as e:
+                erreurs.append(f"{cle}[{numero}] : {' '.join(e.messages)}")
+        if not erreurs:
+            appliquer_pretes(fin_du_fichier=True)
+
+        if erreurs:
+            modeles.clear()
+            raise ErreurImport(
+                f"{len(erreurs)} erreur(s) : import annulé",
+                erreurs[:ERREURS_MAX] + ([f"… et {len(erreurs) - ERREURS_MAX} autre(s)"] if len(erreurs) > ERREURS_MAX else [])
+            )
+        if simulation:
+            modeles.clear()
+            transaction.set_rollback(True)
+
+    return bilans, avertissements
@@ -0,0 +1,98 @@
+"""
+Correction du STAI.
+
+La table des 40 items (numéro, section, inversion) est chargée une fois par
+processus ; les scores des items et les totaux ÉTAT/TRAIT sont calculés en
+mémoire puis enregistrés en une seule insertion groupée.
+"""
+from collections import namedtuple
+
+from tests_psy.services.cache import ProcessCache
+from tests_psy.services.evolution import enregistrer_point
+
+
+ItemCorrection = namedtuple('ItemCorrection', ['id', 'numero', 'section', 'est_inverse'])
+CorrectionSTAI = namedtuple('CorrectionSTAI', ['reponses', 'items_manquants', 'score_etat', 'score_trait'])
+
+
+def load_items_stai():
+    """Items STAI triés par numéro."""
+    from tests_psy.models import ItemSTAI
+
+    return tuple(
+        ItemCorrection(*values)
+        for values in ItemSTAI.objects.order_by('numero').values_list('id', 'numero', 'section', 'est_inverse')
+    )
+
+
+_items_stai = ProcessCache('stai_items', load_items_stai)
+
+
+def get_items_stai():
+    """Retourne la table de correction STAI du processus."""
+    return _items_stai.get()
+
+
+def invalidate_items_stai():
+    _items_stai.invalidate()
+
+
+def score_item(valeur_choisie, est_inverse):
+    """Score d'un item : 1→4, 2→3, 3→2, 4→1 pour les items inversés."""
+    return 5 - valeur_choisie if est_inverse else valeur_choisie
+
+
+def corriger_stai(valeurs):
+    """
+    Corrige une passation à partir d'un dict {numero: valeur_choisie}.
+    Retourne les (item_id, valeur_choisie, score_calcule) des items répondus,
+    les numéros manquants et les totaux ÉTAT/TRAIT.
+    """
+    reponses = []
+    items_manquants = []
+    totaux = {'ETAT': 0, 'TRAIT': 0}
+    for item in get_items_stai():
+        valeur_choisie = valeurs.get(item.numero)
+        if valeur_choisie is None:
+            items_manquants.append(item.numero)
+            continue
+        score = score_item(valeur_choisie, item.est_inverse)
+        reponses.append((item.id, valeur_choisie, score))
+        totaux[item.section] = totaux.get(item.section, 0) + score
+    return CorrectionSTAI(reponses, items_manquants, totaux['ETAT'], totaux['TRAIT'])
+
+
+def save_stai_reponses(test, valeurs):
+    """
+    Remplace les réponses du test par celles de la passation (une insertion
+    groupée) et, si tous les items sont répondus, enregistre les scores
+    (une mise à jour). À appeler dans une transaction.
+    Retourne la liste des items manquants.
+    """
+    from tests_psy.models import ReponseItemSTAI
+
+    correction = corriger_stai(valeurs)
+
+    # Supprimer les anciennes réponses (si re-soumission)
+    test.reponses.all().delete()
+    ReponseItemSTAI.objects.bulk_create([
+        ReponseItemSTAI(
+            test=test,
+            item_id=item_id,
+            valeur_choisie=valeur_choisie,
+            score_calcule=score_calcule,
+            organization_id=test.organization_id
+        )
+        for item_id, valeur_choisie, score_calcule in correction.reponses
+    ])
+
+    if correction.items_manquants:
+        return correction.items_manquants
+
+    test.score_etat = correction.score_etat
+    test.niveau_anxiete_etat = test.get_niveau_anxiete(correction.score_etat)
+    test.score_trait = correction.score_trait
+    test.niveau_anxiete_trait = test.get_niveau_anxiete(correction.score_trait)
+    test.save(update_fields=['score_etat', 'niveau_anxiete_etat', 'score_trait', 'niveau_anxiete_trait'])
+    enregistrer_point(test, 'stai')
+    return []
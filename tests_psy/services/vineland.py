@@ -0,0 +1,559 @@
+"""
+Moteur de normes Vineland.
+
+Les tables de configuration Vineland (partagées entre toutes les organisations)
+sont chargées une seule fois par processus dans des structures indexées :
+le calcul des scores ne fait ensuite plus aucune requête SQL.
+Le moteur est invalidé par les signaux de tests_psy.signals dès qu'une table
+de configuration est modifiée (admin ou script d'import).
+
+Les tables de comparaisons par paires forment une matrice dense séparée
+(âge, niveau de significativité, entité, entité) : les tableaux de
+comparaisons sont calculés sans requête.
+"""
+from array import array
+from collections import defaultdict, namedtuple
+
+from tests_psy.services.cache import ProcessCache, lire_versions
+from tests_psy.services.intervals import IntervalIndex
+
+
+SousDomaineNorme = namedtuple('SousDomaineNorme', ['id', 'name', 'domain_id', 'domain_name'])
+DomaineNorme = namedtuple('DomaineNorme', ['note_standard', 'rang_percentile'])
+IntervalleDomaine = namedtuple('IntervalleDomaine', ['intervalle', 'note_composite'])
+
+# Colonnes de NoteDomaineVMapping selon le nom du domaine
+DOMAIN_COLUMNS = (
+    ('Communication', 'communication'),
+    ('Vie quotidienne', 'vie_quotidienne'),
+    ('Socialisation', 'socialisation'),
+    ('Motricité', 'motricite'),
+)
+
+
+def age_key(years, months, days=0):
+    """Clé d'âge ordonnée (années, mois, jours) utilisée par l'index échelle-V."""
+    return (years * 12 + months) * 31 + days
+
+
+def get_domain_column(domain_name):
+    """Retourne le préfixe de colonne NoteDomaineVMapping du domaine (ou None)."""
+    for label, column in DOMAIN_COLUMNS:
+        if label in domain_name:
+            return column
+    return None
+
+
+class VinelandNorms:
+    """Tables de normes Vineland indexées en mémoire (lecture seule)."""
+
+    def __init__(self):
+        self.sous_domaines = {}                 # nom -> SousDomaineNorme
+        self.domaines = {}                      # nom -> id
+        self.structure = []                     # [(nom domaine, [(sous_domaine_id, nom)])] dans l'ordre d'affichage
+        self.echelle_v = {}                     # sous_domaine_id -> IntervalIndex(âge -> IntervalIndex(note brute))
+        self.notes_domaines = {}                # (tranche, colonne) -> IntervalIndex(somme notes-V)
+        self.notes_domaines_defaut = {}         # tranche -> DomaineNorme (domaine sans colonne)
+        self.intervalles_sous_domaines = {}     # (age, niveau, sous_domaine_id) -> intervalle
+        self.intervalles_domaines = {}          # (age, niveau, nom domaine) -> IntervalleDomaine
+        self.niveaux_echelle_v = IntervalIndex(())
+        self.niveaux_note_standard = IntervalIndex(())
+        self.ages_equivalents = {}              # sous_domaine_id -> IntervalIndex(note brute)
+
+    @classmethod
+    def load(cls):
+        """Charge toutes les tables de configuration (une requête par table)."""
+        from tests_psy.models import (
+            Domain, SousDomain, EchelleVMapping, NoteDomaineVMapping,
+            IntervaleConfianceSousDomaine, IntervaleConfianceDomaine,
+            NiveauAdaptatif, AgeEquivalentSousDomaine
+        )
+
+        norms = cls()
+
+        norms.domaines = dict(Domain.objects.values_list('name', 'id'))
+        sous_domaines_par_domaine = {domain_id: [] for domain_id in norms.domaines.values()}
+        for sd_id, name, domain_id, domain_name in SousDomain.objects.values_list(
+            'id', 'name', 'domain_id', 'domain__name'
+        ):
+            norms.sous_domaines[name] = SousDomaineNorme(sd_id, name, domain_id, domain_name)
+            sous_domaines_par_domaine[domain_id].append((sd_id, name))
+        norms.structure = [
+            (domain_name, sous_domaines_par_domaine[domain_id])
+            for domain_name, domain_id in norms.domaines.items()
+        ]
+
+        # Tranches d'âge par sous-domaine, dans l'ordre du Meta.ordering :
+        # la première correspondance l'emporte. Les bornes couvrent le mois entier.
+        tranches = defaultdict(dict)
+        for row in EchelleVMapping.objects.order_by(
+            'sous_domaine_id', 'age_debut_annee', 'age_debut_mois', 'note_brute_min'
+        ).values_list(
+            'sous_domaine_id', 'age_debut_annee', 'age_debut_mois',
+            'age_fin_annee', 'age_fin_mois', 'note_brute_min', 'note_brute_max', 'note_echelle_v'
+        ):
+            sd_id, debut_a, debut_m, fin_a, fin_m, note_min, note_max, note_v = row
+            tranche = (age_key(debut_a, debut_m, 0), age_key(fin_a, fin_m, 30))
+            tranches[sd_id].setdefault(tranche, []).append((note_min, note_max, note_v))
+        for sd_id, notes_par_tranche in tranches.items():
+            norms.echelle_v[sd_id] = IntervalIndex(
+                (debut, fin, IntervalIndex(notes))
+                for (debut, fin), notes in notes_par_tranche.items()
+            )
+
+        columns = [column for _, column in DOMAIN_COLUMNS]
+        notes_domaines = defaultdict(list)
+        for mapping in NoteDomaineVMapping.objects.order_by('tranche_age', '-note_standard'):
+            norme = DomaineNorme(mapping.note_standard, mapping.rang_percentile)
+            norms.notes_domaines_defaut.setdefault(mapping.tranche_age, norme)
+            for column in columns:
+                notes_domaines[(mapping.tranche_age, column)].append(
+                    (getattr(mapping, f'{column}_min'), getattr(mapping, f'{column}_max'), norme)
+                )
+        norms.notes_domaines = {key: IntervalIndex(rows) for key, rows in notes_domaines.items()}
+
+        for age, niveau, sd_id, intervalle in IntervaleConfianceSousDomaine.objects.values_list(
+            'age', 'niveau_confiance', 'sous_domaine_id', 'intervalle'
+        ):
+            norms.intervalles_sous_domaines[(age, niveau, sd_id)] = intervalle
+
+        for age, niveau, domain_name, intervalle, note_composite in IntervaleConfianceDomaine.objects.values_list(
+            'age', 'niveau_confiance', 'domain__name', 'intervalle', 'note_composite'
+        ):
+            norms.intervalles_domaines[(age, niveau, domain_name)] = IntervalleDomaine(intervalle, note_composite)
+
+        niveaux = [
+            (niveau.get_niveau_display(), niveau.echelle_v_min, niveau.echelle_v_max,
+             niveau.note_standard_min, niveau.note_standard_max)
+            for niveau in NiveauAdaptatif.objects.order_by('echelle_v_min')
+        ]
+        norms.niveaux_echelle_v = IntervalIndex((v_min, v_max, libelle) for libelle, v_min, v_max, _, _ in niveaux)
+        norms.niveaux_note_standard = IntervalIndex((ns_min, ns_max, libelle) for libelle, _, _, ns_min, ns_max in niveaux)
+
+        ages_equivalents = defaultdict(list)
+        for age_eq in AgeEquivalentSousDomaine.objects.order_by('sous_domaine_id', '-age_annees', '-age_mois'):
+            note_max = age_eq.note_brute_max if age_eq.note_brute_max is not None else age_eq.note_brute_min
+            ages_equivalents[age_eq.sous_domaine_id].append(
+                (age_eq.note_brute_min, note_max, age_eq.get_age_equivalent_display())
+            )
+        norms.ages_equivalents = {sd_id: IntervalIndex(rows) for sd_id, rows in ages_equivalents.items()}
+
+        return norms
+
+    # ---------- Recherches ----------
+
+    def sous_domaine(self, name):
+        """Retourne le sous-domaine (SousDomaineNorme) ou None."""
+        return self.sous_domaines.get(name)
+
+    def note_echelle_v(self, sous_domaine_id, note_brute, age_info):
+        """Note échelle-V pour une note brute et l'âge du patient (ou None)."""
+        return self._note_echelle_v(sous_domaine_id, note_brute, age_key(age_info['years'], age_info['months'], age_info['days']))
+
+    def _note_echelle_v(self, sous_domaine_id, note_brute, age):
+        tranches = self.echelle_v.get(sous_domaine_id)
+        if tranches is None:
+            return None
+        notes = tranches.find(age)
+        return notes.find(note_brute) if notes is not None else None
+
+    def notes_echelle_v(self, scores, age_info):
+        """
+        Calcule en un appel les notes échelle-V de tous les sous-domaines d'un test.
+
+        scores : structure retournée par calculate_all_scores
+                 ({domaine: {sous-domaine: {'note_brute': ...}}})
+        Retourne {nom du sous-domaine: note échelle-V ou None}.
+        """
+        age = age_key(age_info['years'], age_info['months'], age_info['days'])
+        notes_v = {}
+        for domain_scores in scores.values():
+            for name, score in domain_scores.items():
+                sous_domaine = self.sous_domaines.get(name)
+                notes_v[name] = (
+                    self._note_echelle_v(sous_domaine.id, score['note_brute'], age)
+                    if sous_domaine else None
+                )
+        return notes_v
+
+    def note_domaine(self, domain_name, somme_notes_v, tranche_age):
+        """Note standard et rang percentile du domaine (DomaineNorme ou None)."""
+        column = get_domain_column(domain_name)
+        if column is None:
+            return self.notes_domaines_defaut.get(tranche_age)
+        index = self.notes_domaines.get((tranche_age, column))
+        return index.find(somme_notes_v) if index is not None else None
+
+    def intervalle_sous_domaine(self, tranche_age_intervalle, niveau_confiance, sous_domaine_id):
+        return self.intervalles_sous_domaines.get((tranche_age_intervalle, niveau_confiance, sous_domaine_id))
+
+    def intervalle_domaine(self, tranche_age_intervalle, niveau_confiance, domain_name):
+        return self.intervalles_domaines.get((tranche_age_intervalle, niveau_confiance, domain_name))
+
+    def niveau_adaptatif_echelle_v(self, note_echelle_v):
+        """Libellé du niveau adaptatif pour une note échelle-V."""
+        return self.niveaux_echelle_v.find(note_echelle_v)
+
+    def niveau_adaptatif_note_standard(self, note_standard):
+        """Libellé du niveau adaptatif pour une note standard de domaine."""
+        return self.niveaux_note_standard.find(note_standard)
+
+    def age_equivalent(self, sous_domaine_id, note_brute):
+        """Libellé de l'âge équivalent pour une note brute (ou None)."""
+        index = self.ages_equivalents.get(sous_domaine_id)
+        return index.find(note_brute) if index is not None else None
+
+
+class NoteBruteSousDomaine:
+    """
+    Calcul incrémental de la note brute d'un sous-domaine.
+    Les réponses doivent être ajoutées par numéro d'item croissant.
+    """
+    __slots__ = ('item_plancher', 'plancher_trouve', 'consecutifs', 'nsp_count', 'na_count', 'sum_1_2', 'items')
+
+    def __init__(self):
+        self.item_plancher = 0
+        self.plancher_trouve = False
+        self.consecutifs = 0
+        self.nsp_count = 0
+        self.na_count = 0
+        self.sum_1_2 = 0
+        self.items = []
+
+    def add(self, numero, valeur):
+        self.items.append({'numero': numero, 'valeur': valeur})
+
+        if valeur in ('NSP', '', None, '?'):
+            self.nsp_count += 1
+        elif valeur == 'NA':
+            self.na_count += 1
+
+        # Somme des items (1 et 2) après l'item plancher
+        if valeur in ('1', '2') and numero > self.item_plancher:
+            self.sum_1_2 += int(valeur)
+
+        # Item plancher : premier des 4 premières réponses consécutives de 2
+        if not self.plancher_trouve:
+            self.consecutifs = self.consecutifs + 1 if valeur == '2' else 0
+            if self.consecutifs == 4:
+                self.plancher_trouve = True
+                self.item_plancher = numero - 3
+                # Ne garder que les items déjà vus situés après le plancher
+                self.sum_1_2 = 0
+                for item in reversed(self.items):
+                    if item['numero'] <= self.item_plancher:
+                        break
+                    if item['valeur'] in ('1', '2'):
+                        self.sum_1_2 += int(item['valeur'])
+
+    def as_dict(self):
+        # Note brute = (item_plancher × 2) + somme(1,2 après plancher) + NSP
+        return {
+            'note_brute': (self.item_plancher * 2) + self.sum_1_2 + self.nsp_count,
+            'item_plancher': self.item_plancher,
+            'nsp_count': self.nsp_count,
+            'na_count': self.na_count,
+            'sum_1_2': self.sum_1_2,
+            'a_refaire': self.nsp_count > 2,
+            'items': self.items,
+        }
+
+
+_vineland_norms = ProcessCache('vineland_norms', VinelandNorms.load)
+
+
+def get_vineland_norms():
+    """Retourne le moteur de normes Vineland du processus (chargé au premier appel)."""
+    return _vineland_norms.get()
+
+
+def invalidate_vineland_norms():
+    """Force le rechargement des normes Vineland (après modification ou import)."""
+    _vineland_norms.invalidate()
+
+
+# ========== MATRICE DES COMPARAISONS PAR PAIRES ==========
+
+# Seuils de fréquence, du plus rare au plus fréquent (premier atteint retenu)
+FREQUENCES = ('5%', '10%', '16%')
+
+ABSENT = -1
+
+
+def extract_number(value):
+    """Extrait la partie numérique d'une valeur de fréquence ('12+', '8-10', '7')."""
+    if not value:
+        return 9999
+    if value.endswith('+'):
+        return int(value[:-1])
+    elif '-' in value:
+        return int(value.split('-')[0])
+    else:
+        try:
+            return int(value)
+        except ValueError:
+            return 9999
+
+
+class PairMatrix:
+    """
+    Seuils de comparaison d'un type d'entité (domaines ou sous-domaines) en
+    tableaux denses :
+
+    - differences[âge, niveau de significativité, i, j] : différence requise ;
+    - frequences[âge, i, j, k] : différence minimale pour la fréquence FREQUENCES[k].
+
+    Les deux ordres d'une paire sont remplis : la ligne (i, j) de la table
+    l'emporte sur la ligne (j, i), comme les anciennes recherches dans les deux
+    sens. ABSENT marque une paire (ou un seuil) sans donnée.
+    """
+
+    def __init__(self, comparaisons, frequences):
+        """
+        comparaisons : [(âge, niveau, id1, id2, difference_requise)]
+        frequences : [(âge, id1, id2, frequence_5, frequence_10, frequence_16)]
+        """
+        ages = {row[0] for row in comparaisons} | {row[0] for row in frequences}
+        self.ages = {age: index for index, age in enumerate(sorted(ages))}
+        self.niveaux = {
+            niveau: index for index, niveau in enumerate(sorted({row[1] for row in comparaisons}))
+        }
+        entites = {row[2] for row in comparaisons} | {row[3] for row in comparaisons}
+        entites |= {row[1] for row in frequences} | {row[2] for row in frequences}
+        self.entites = {entite: index for index, entite in enumerate(sorted(entites))}
+
+        n = len(self.entites)
+        self._n = n
+        self.differences = array('i', [ABSENT]) * (len(self.ages) * len(self.niveaux) * n * n)
+        self.frequences = array('i', [ABSENT]) * (len(self.ages) * n * n * len(FREQUENCES))
+
+        # Ordre de la table d'abord, ordre inverse ensuite pour les paires restées vides
+        remplies = set()
+        remplies_frequences = set()
+        for inverse in (False, True):
+            for age, niveau, id1, id2, difference_requise in comparaisons:
+                if inverse:
+                    id1, id2 = id2, id1
+                position = self._position(age, niveau, id1, id2)
+                if position not in remplies:
+                    remplies.add(position)
+                    self.differences[position] = difference_requise
+
+            for age, id1, id2, *seuils in frequences:
+                if inverse:
+                    id1, id2 = id2, id1
+                position = self._position_frequence(age, id1, id2)
+                if position not in remplies_frequences:
+                    remplies_frequences.add(position)
+                    for k, seuil in enumerate(seuils):
+                        # Un seuil vide est ignoré
+                        self.frequences[position + k] = extract_number(seuil) if seuil else ABSENT
+
+    def _position(self, age, niveau, id1, id2):
+        n = self._n
+        return ((self.ages[age] * len(self.niveaux) + self.niveaux[niveau]) * n + self.entites[id1]) * n + self.entites[id2]
+
+    def _position_frequence(self, age, id1, id2):
+        n = self._n
+        return ((self.ages[age] * n + self.entites[id1]) * n + self.entites[id2]) * len(FREQUENCES)
+
+    def difference_requise(self, age, niveau, id1, id2):
+        """Différence requise pour la significativité (ou None)."""
+        try:
+            valeur = self.differences[self._position(age, niveau, id1, id2)]
+        except KeyError:
+            return None
+        return None if valeur == ABSENT else valeur
+
+    def frequence(self, age, id1, id2, difference):
+        """Fréquence de la différence dans l'échantillon de référence ('5%', '10%', '16%' ou None)."""
+        try:
+            position = self._position_frequence(age, id1, id2)
+        except KeyError:
+            return None
+        for k, libelle in enumerate(FREQUENCES):
+            seuil = self.frequences[position + k]
+            if seuil != ABSENT and difference >= seuil:
+                return libelle
+        return None
+
+
+class ComparisonMatrix:
+    """Matrices des comparaisons entre domaines et entre sous-domaines."""
+
+    def __init__(self, domaines, sous_domaines):
+        self.domaines = domaines
+        self.sous_domaines = sous_domaines
+
+    @classmethod
+    def load(cls):
+        """Charge les quatre tables de comparaison (une requête par table)."""
+        from tests_psy.models import (
+            ComparaisonDomaineVineland, ComparaisonSousDomaineVineland,
+            FrequenceDifferenceDomaineVineland, FrequenceDifferenceSousDomaineVineland
+        )
+
+        return cls(
+            PairMatrix(
+                list(ComparaisonDomaineVineland.objects.order_by('pk').values_list(
+                    'age', 'niveau_significativite', 'domaine1_id', 'domaine2_id', 'difference_requise'
+                )),
+                list(FrequenceDifferenceDomaineVineland.objects.order_by('pk').values_list(
+                    'age', 'domaine1_id', 'domaine2_id', 'frequence_5', 'frequence_10', 'frequence_16'
+                )),
+            ),
+            PairMatrix(
+                list(ComparaisonSousDomaineVineland.objects.order_by('pk').values_list(
+                    'age', 'niveau_significativite', 'sous_domaine1_id', 'sous_domaine2_id', 'difference_requise'
+                )),
+                list(FrequenceDifferenceSousDomaineVineland.objects.order_by('pk').values_list(
+                    'age', 'sous_domaine1_id', 'sous_domaine2_id', 'frequence_5', 'frequence_10', 'frequence_16'
+                )),
+            ),
+        )
+
+
+_comparison_matrix = ProcessCache('vineland_comparaisons', ComparisonMatrix.load)
+
+
+def get_comparison_matrix():
+    """Retourne la matrice des comparaisons Vineland du processus (chargée au premier appel)."""
+    return _comparison_matrix.get()
+
+
+def invalidate_comparison_matrix():
+    """Force le rechargement des comparaisons (tables de comparaison ou de fréquence modifiées)."""
+    _comparison_matrix.invalidate()
+
+
+def versions_scores():
+    """
+    Versions des normes et des comparaisons avec lesquelles ce processus
+    calcule les scores, après relecture des versions en base (les données
+    périmées sont rechargées). Enregistrée avec chaque snapshot de scores.
+    """
+    lire_versions(force=True)
+    return f'{_vineland_norms.version()}.{_comparison_matrix.version()}'
+
+
+# Nombre de questions affichées par page du questionnaire
+QUESTIONS_PAR_PAGE = 20
+
+
+class QuestionnaireLayout:
+    """
+    Mise en page du questionnaire Vineland, calculée une fois par processus :
+    questions ordonnées avec leur identifiant de formulaire (unique_id) et leur
+    plage d'âge (plage_age), index des questions et pagination.
+    """
+
+    def __init__(self, questions, plages, per_page=QUESTIONS_PAR_PAGE):
+        from django.core.paginator import Paginator
+
+        # Plages d'âge indexées par sous-domaine ; la première plage qui
+        # contient l'item l'emporte, comme l'ancienne boucle des vues
+        plages_par_sous_domaine = defaultdict(list)
+        for (sous_domaine_id, item_debut, item_fin), plage in plages.items():
+            plages_par_sous_domaine[sous_domaine_id].append((item_debut, item_fin, plage))
+        plages_par_sous_domaine = {
+            sous_domaine_id: IntervalIndex(intervals)
+            for sous_domaine_id, intervals in plages_par_sous_domaine.items()
+        }
+
+        for question in questions:
+            question.unique_id = f"{question.sous_domaine_id}_{question.numero_item}"
+            index = plages_par_sous_domaine.get(question.sous_domaine_id)
+            question.plage_age = index.find(question.numero_item) if index else None
+
+        self.questions = questions
+        self.index = {
+            (question.sous_domaine_id, question.numero_item): question.id
+            for question in questions
+        }
+        self.paginator = Paginator(questions, per_page)
+        # Bornes [début, fin[ de chaque page dans self.questions
+        self.pages = [
+            (start, min(start + per_page, len(questions)))
+            for start in range(0, len(questions), per_page)
+        ]
+
+    @classmethod
+    def load(cls):
+        from tests_psy.models import QuestionVineland, PlageItemVineland
+
+        questions = list(
+            QuestionVineland.objects.select_related(
+                'sous_domaine',
+                'sous_domaine__domain'
+            ).order_by('created_at')
+        )
+        plages = {
+            (plage.sous_domaine_id, plage.item_debut, plage.item_fin): plage
+            for plage in PlageItemVineland.objects.all()
+        }
+        return cls(questions, plages)
+
+    def get_page(self, number):
+        """Page du questionnaire (seules ses questions sont parcourues)."""
+        return self.paginator.get_page(number)
+
+
+_questionnaire_layout = ProcessCache('vineland_questionnaire', QuestionnaireLayout.load)
+
+
+def get_questionnaire_layout():
+    """Retourne la mise en page du questionnaire Vineland du processus."""
+    return _questionnaire_layout.get()
+
+
+def invalidate_questionnaire_layout():
+    """Force le recalcul de la mise en page (questions, plages ou sous-domaines modifiés)."""
+    _questionnaire_layout.invalidate()
+
+
+def get_question_index():
+    """Index {(sous_domaine_id, numero_item): question_id} des questions Vineland."""
+    return get_questionnaire_layout().index
+
+
+def get_unanswered_questions(test_vineland):
+    """
+    Questions sans réponse pour ce test, en une seule requête (anti-jointure).
+    Retourne une liste de (nom du sous-domaine, numéro d'item) dans l'ordre du questionnaire.
+    """
+    from django.db.models import Exists, OuterRef
+    from tests_psy.models import QuestionVineland, ReponseVineland
+
+    reponses = ReponseVineland.all_objects.filter(test_vineland=test_vineland, question=OuterRef('pk'))
+    return list(
+        QuestionVineland.objects.filter(~Exists(reponses))
+        .order_by('created_at')
+        .values_list('sous_domaine__name', 'numero_item')
+    )
+
+
+def refresh_progress(test_vineland_id=None):
+    """Recalcule le compteur de réponses du test, ou de tous les tests (une seule requête UPDATE)."""
+    from django.db.models import Count, OuterRef, Subquery, Value
+    from django.db.models.functions import Coalesce
+    from tests_psy.models import TestVineland, ReponseVineland
+
+    nb_reponses = ReponseVineland.all_objects.filter(
+        test_vineland=OuterRef('pk')
+    ).values('test_vineland').annotate(total=Count('id')).values('total')
+    tests = TestVineland.all_objects.all()
+    if test_vineland_id is not None:
+        tests = tests.filter(id=test_vineland_id)
+    tests.update(
+        nb_reponses=Coalesce(Subquery(nb_reponses), Value(0))
+    )
+
+
+def invalidate_score_snapshots(test_vineland_id=None):
+    """Supprime les snapshots de scores d'un test (ou de tous les tests si aucun id)."""
+    from tests_psy.models import VinelandScoreSnapshot
+
+    snapshots = VinelandScoreSnapshot.all_objects.all()
+    if test_vineland_id is not None:
+        snapshots = snapshots.filter(test_vineland_id=test_vineland_id)
+    snapshots.delete()
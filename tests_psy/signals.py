@@ -0,0 +1,192 @@
+"""
+Signaux de tests_psy : invalidation des caches en mémoire (normes et
+comparaisons Vineland, grille et normes D2R, items STAI et Beck) et des
+snapshots de scores lorsque les données dont ils dépendent sont modifiées
+(réponses, admin, scripts d'import).
+
+Les imports en masse (bulk_create / bulk_update, sans signaux) passent par
+import_en_masse : les gestionnaires sont appelés une fois par groupe de
+modèles modifiés, après validation de la transaction.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+from tests_psy.models import (
+    Domain, SousDomain, EchelleVMapping, NoteDomaineVMapping,
+    IntervaleConfianceSousDomaine, IntervaleConfianceDomaine,
+    NiveauAdaptatif, AgeEquivalentSousDomaine,
+    ComparaisonDomaineVineland, ComparaisonSousDomaineVineland,
+    FrequenceDifferenceDomaineVineland, FrequenceDifferenceSousDomaineVineland,
+    TestVineland, ReponseVineland, QuestionVineland, PlageItemVineland,
+    SymboleReference, NormeExactitude, NormeRythmeTraitement, NormeCapaciteConcentration,
+    ItemSTAI, ItemBeck, PhraseBeck, TestBeck, TestSTAI, TestD2R
+)
+from tests_psy.services.vineland import (
+    invalidate_vineland_norms, invalidate_comparison_matrix, invalidate_score_snapshots,
+    invalidate_questionnaire_layout, refresh_progress
+)
+from tests_psy.services.d2r import invalidate_grille_d2r, invalidate_normes_d2r
+from tests_psy.services.stai import invalidate_items_stai
+from tests_psy.services.beck import invalidate_items_beck
+from tests_psy.services.evolution import supprimer_point
+from tests_psy.services.rapports import invalider_rapports
+
+
+VINELAND_NORM_MODELS = (
+    Domain, SousDomain, EchelleVMapping, NoteDomaineVMapping,
+    IntervaleConfianceSousDomaine, IntervaleConfianceDomaine,
+    NiveauAdaptatif, AgeEquivalentSousDomaine,
+)
+
+# Modèles utilisés par la mise en page du questionnaire
+VINELAND_QUESTIONNAIRE_MODELS = (
+    Domain, SousDomain, QuestionVineland, PlageItemVineland,
+)
+
+D2R_NORM_MODELS = (
+    NormeExactitude, NormeRythmeTraitement, NormeCapaciteConcentration,
+)
+
+VINELAND_COMPARISON_MODELS = (
+    ComparaisonDomaineVineland, ComparaisonSousDomaineVineland,
+    FrequenceDifferenceDomaineVineland, FrequenceDifferenceSousDomaineVineland,
+)
+
+# Tests dont les rapports rendus sont supprimés avec eux
+RAPPORT_INSTRUMENTS = {
+    TestD2R: 'd2r',
+    TestVineland: 'vineland',
+    TestBeck: 'beck',
+    TestSTAI: 'stai',
+}
+
+
+# (gestionnaire après import en masse, modèles) enregistrés par connect_save_delete
+HANDLERS = []
+
+_import = threading.local()
+
+
+def connect_save_delete(handler, models, uid, en_masse=None):
+    """
+    en_masse(sender) : appelé une fois après un import en masse, sans instance
+    (par défaut handler, qui ne doit alors pas dépendre de l'instance).
+    """
+    HANDLERS.append((en_masse or handler, models))
+
+    def receiver(sender, **kwargs):
+        modifies = getattr(_import, 'modeles', None)
+        if modifies is not None:
+            # Import en masse en cours : invalidation différée
+            modifies.add(sender)
+            return
+        handler(sender, **kwargs)
+
+    for model in models:
+        post_save.connect(receiver, sender=model, weak=False, dispatch_uid=f'{uid}_save_{model.__name__}')
+        post_delete.connect(receiver, sender=model, weak=False, dispatch_uid=f'{uid}_delete_{model.__name__}')
+
+
+def invalider_modeles(modeles):
+    """Appelle une fois chaque gestionnaire concerné par les modèles modifiés."""
+    for handler, models in HANDLERS:
+        modifies = [model for model in models if model in modeles]
+        if modifies:
+            handler(modifies[0])
+
+
+@contextmanager
+def import_en_masse():
+    """
+    Suspend les invalidations ligne par ligne pendant un import. L'appelant
+    ajoute au set produit les modèles écrits par bulk_create / bulk_update ;
+    les suppressions y sont ajoutées par les signaux. En sortie normale, les
+    gestionnaires sont appelés après la transaction (vider le set pour une
+    simulation annulée).
+    """
+    modeles = set()
+    _import.modeles = modeles
+    try:
+        yield modeles
+    finally:
+        _import.modeles = None
+    if modeles:
+        transaction.on_commit(lambda: invalider_modeles(modeles))
+
+
+def vineland_norms_changed(sender, **kwargs):
+    invalidate_vineland_norms()
+    invalidate_score_snapshots()
+    invalider_rapports('vineland')
+
+
+def vineland_comparisons_changed(sender, **kwargs):
+    invalidate_comparison_matrix()
+    invalidate_score_snapshots()
+    invalider_rapports('vineland')
+
+
+def questionnaire_vineland_changed(sender, **kwargs):
+    invalidate_questionnaire_layout()
+
+
+def symboles_d2r_changed(sender, **kwargs):
+    invalidate_grille_d2r()
+
+
+def normes_d2r_changed(sender, **kwargs):
+    invalidate_normes_d2r()
+    invalider_rapports('d2r')
+
+
+def items_stai_changed(sender, **kwargs):
+    invalidate_items_stai()
+    invalider_rapports('stai')
+
+
+def items_beck_changed(sender, **kwargs):
+    invalidate_items_beck()
+    invalider_rapports('beck')
+
+
+def test_evolution_deleted(sender, instance, **kwargs):
+    supprimer_point(instance, 'beck' if sender is TestBeck else 'stai')
+
+
+def test_deleted(sender, instance, **kwargs):
+    invalider_rapports(RAPPORT_INSTRUMENTS[sender], instance.pk)
+
+
+def reponses_vineland_importees(sender, **kwargs):
+    # Réponses supprimées en cascade (questions retirées) : tests concernés inconnus
+    invalidate_score_snapshots()
+    refresh_progress()
+
+
+def reponse_vineland_changed(sender, instance, **kwargs):
+    # Suppression en cascade du test : ses snapshots partent avec lui
+    if isinstance(kwargs.get('origin'), TestVineland):
+        return
+    invalidate_score_snapshots(instance.test_vineland_id)
+    # Le nombre de réponses ne change qu'à la création ou à la suppression
+    if kwargs.get('created', True):
+        refresh_progress(instance.test_vineland_id)
+
+
+connect_save_delete(vineland_norms_changed, VINELAND_NORM_MODELS, 'vineland_norms')
+connect_save_delete(vineland_comparisons_changed, VINELAND_COMPARISON_MODELS, 'vineland_comparisons')
+connect_save_delete(questionnaire_vineland_changed, VINELAND_QUESTIONNAIRE_MODELS, 'questionnaire_vineland')
+connect_save_delete(
+    reponse_vineland_changed, (ReponseVineland,), 'reponse_vineland', en_masse=reponses_vineland_importees
+)
+connect_save_delete(symboles_d2r_changed, (SymboleReference,), 'symboles_d2r')
+connect_save_delete(normes_d2r_changed, D2R_NORM_MODELS, 'normes_d2r')
+connect_save_delete(items_stai_changed, (ItemSTAI,), 'items_stai')
+connect_save_delete(items_beck_changed, (ItemBeck, PhraseBeck), 'items_beck')
+for model in (TestBeck, TestSTAI):
+    post_delete.connect(test_evolution_deleted, sender=model, dispatch_uid=f'evolution_delete_{model.__name__}')
+for model in RAPPORT_INSTRUMENTS:
+    post_delete.connect(test_deleted, sender=model, dispatch_uid=f'rapports_delete_{model.__name__}')
@@ -1,3 +1,896 @@
-from django.test import TestCase
+import json
+import os
+import random
+import tempfile
+import zipfile
+from concurrent.futures import Future
+from datetime import date, datetime, timezone as dt_timezone
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.test import TestCase, override_settings
+
+from accounts.models import Organization, User
+from cabinet.models import Patient
+from tests_psy.models import (
+    TestD2R, TestVineland, ReponseVineland, Domain, SousDomain, QuestionVineland, NormeExactitude,
+    VinelandScoreSnapshot, VersionReference, RapportPDF, EchelleVMapping, NoteDomaineVMapping,
+    IntervaleConfianceSousDomaine, IntervaleConfianceDomaine, NiveauAdaptatif, AgeEquivalentSousDomaine,
+    SymboleReference, ComparaisonSousDomaineVineland, FrequenceDifferenceSousDomaineVineland,
+    ItemSTAI, TestSTAI, ReponseItemSTAI, ItemBeck, PhraseBeck, TestBeck, ReponseItemBeck,
+)
+from tests_psy.services.beck import corriger_beck, get_reponses_existantes, save_beck_reponses
+from tests_psy.services.cache import ProcessCache
+from tests_psy.services.d2r import (
+    DEBUT_LIGNE, SELECTION, DESELECTION, FIN_LIGNE, Evenement, analyse_passation, apply_d2r_score,
+    decode_evenements, encode_evenements, get_grille_d2r, parse_evenements, rescore_d2r_tests,
+)
+from tests_psy.services.export import flux_zip, preparer_rapports
+from tests_psy.services.rapports import _EncodeurEmpreinte, calculer_empreinte, chemin_fichier, demander_rapport
+from tests_psy.services.stai import corriger_stai, save_stai_reponses
+from tests_psy.services.vineland import (
+    NoteBruteSousDomaine, PairMatrix, extract_number, get_comparison_matrix, get_vineland_norms,
+)
+from tests_psy.views.vineland import (
+    get_score_snapshot, get_patient_age, get_age_tranches, calculate_all_scores, calculate_domain_scores,
+)
+
+
+class EmpreinteRapportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name="Cabinet", slug="cabinet")
+        cls.psychologue = User.objects.create_user(
+            username='psy', password='x', organization=cls.organization
+        )
+        cls.patient = Patient.all_objects.create(
+            organization=cls.organization, nom="Durand", prenom="Léa", date_naissance=date(2012, 3, 4)
+        )
+
+    def creer_test_d2r(self, evenements):
+        return TestD2R.all_objects.create(
+            organization=self.organization, patient=self.patient, psychologue=self.psychologue,
+            code='D2R-1', date=date(2025, 1, 10), age=12, sexe='F', correction_vue='NO',
+            lateralite='D', evenements=evenements,
+        )
+
+    def test_empreinte_stable_avec_evenements(self):
+        test = self.creer_test_d2r(b'\x00\x01evenements')
+        self.assertEqual(calculer_empreinte('d2r', test), calculer_empreinte('d2r', test))
+
+    def test_empreinte_depend_des_evenements(self):
+        test = self.creer_test_d2r(b'\x00\x01')
+        avant = calculer_empreinte('d2r', test)
+        TestD2R.all_objects.filter(pk=test.pk).update(evenements=b'\x00\x02')
+        self.assertNotEqual(avant, calculer_empreinte('d2r', test))
+
+    def test_memoryview_hache_par_contenu(self):
+        # PostgreSQL (psycopg2) retourne les BinaryField en memoryview
+        self.assertEqual(
+            json.dumps([memoryview(b'ab')], cls=_EncodeurEmpreinte),
+            json.dumps([b'ab'], cls=_EncodeurEmpreinte),
+        )
+        self.assertEqual(json.dumps([memoryview(b'ab')], cls=_EncodeurEmpreinte), '["6162"]')
+
+
+class ImporterReferentielTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name="Cabinet", slug="cabinet")
+        cls.patient = Patient.all_objects.create(
+            organization=cls.organization, nom="Martin", prenom="Paul", date_naissance=date(2015, 6, 1)
+        )
+
+    def fichier(self, donnees):
+        descripteur, chemin = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(descripteur, 'w', encoding='utf-8') as f:
+            json.dump(donnees, f)
+        self.addCleanup(os.remove, chemin)
+        return chemin
+
+    def importer(self, *args):
+        sortie = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('importer_referentiel', *args, stdout=sortie, stderr=StringIO())
+        return sortie.getvalue()
+
+    def vineland(self, numeros):
+        return {
+            'domains': [{'name': 'Communication', 'ordre': 1}],
+            'sous_domains': [{'name': 'Réceptive', 'domain_name': 'Communication', 'ordre': 1}],
+            'questions': [
+                {'numero_item': numero, 'texte': f'Question {numero}', 'sous_domaine_name': 'Réceptive'}
+                for numero in numeros
+            ],
+        }
+
+    def test_miroir_supprime_les_reponses_en_cascade(self):
+        self.importer('vineland', self.fichier(self.vineland([1, 2])))
+        test = TestVineland.all_objects.create(organization=self.organization, patient=self.patient)
+        for question in QuestionVineland.objects.all():
+            ReponseVineland.all_objects.create(
+                organization=self.organization, test_vineland=test, question=question, reponse='2'
+            )
+        VinelandScoreSnapshot.all_objects.create(
+            organization=self.organization, test_vineland=test, niveau_confiance=90,
+            niveau_significativite='.05', date_naissance=self.patient.date_naissance,
+            date_reference=date(2025, 1, 1), scores={}, echelle_v_scores={}, complete_scores={}, comparaisons={},
+        )
+        test.refresh_from_db()
+        self.assertEqual(test.nb_reponses, 2)
+
+        sortie = self.importer('vineland', self.fichier(self.vineland([1])), '--miroir')
+
+        self.assertIn('questions : 0 créé(s), 0 modifié(s), 1 supprimé(s), 1 inchangé(s)', sortie)
+        self.assertEqual(list(QuestionVineland.objects.values_list('numero_item', flat=True)), [1])
+        self.assertEqual(ReponseVineland.all_objects.count(), 1)
+        test.refresh_from_db()
+        self.assertEqual(test.nb_reponses, 1)
+        self.assertFalse(VinelandScoreSnapshot.all_objects.exists())
+
+    def test_sans_miroir_les_lignes_absentes_sont_conservees(self):
+        self.importer('vineland', self.fichier(self.vineland([1, 2])))
+        sortie = self.importer('vineland', self.fichier(self.vineland([1])))
+        self.assertIn('questions : 0 créé(s), 0 modifié(s), 0 supprimé(s), 1 inchangé(s)', sortie)
+        self.assertEqual(QuestionVineland.objects.count(), 2)
+
+    def test_reimport_sans_changement(self):
+        donnees = {'normes_exactitude': [
+            {'note_standard': 100 + i, 'percentile': '50.5', 'age_min': 9, 'age_max': 12,
+             'valeur_min': i * 10, 'valeur_max': i * 10 + 9}
+            for i in range(3)
+        ]}
+        chemin = self.fichier(donnees)
+        self.importer('d2r', chemin)
+        sortie = self.importer('d2r', chemin)
+        self.assertIn('normes_exactitude : 0 créé(s), 0 modifié(s), 0 supprimé(s), 3 inchangé(s)', sortie)
+
+        # Table miroir : la ligne retirée du fichier est supprimée
+        donnees['normes_exactitude'].pop()
+        self.importer('d2r', self.fichier(donnees))
+        self.assertEqual(NormeExactitude.objects.count(), 2)
+
+    def test_erreur_annule_tout_l_import(self):
+        donnees = self.vineland([1, 2])
+        donnees['questions'][1]['sous_domaine_name'] = 'Inconnu'
+        with self.assertRaises(CommandError):
+            self.importer('vineland', self.fichier(donnees))
+        self.assertFalse(Domain.objects.exists())
+        self.assertFalse(SousDomain.objects.exists())
+
+
+class ProcessCacheTests(TestCase):
+
+    def test_invalidation_vue_par_les_autres_processus(self):
+        chargements = []
+
+        def charger():
+            chargements.append(1)
+            return len(chargements)
+
+        # Deux instances du même cache : deux processus
+        processus_a = ProcessCache('essai', charger)
+        processus_b = ProcessCache('essai', charger)
+        with mock.patch('tests_psy.services.cache.VERIFICATION_VERSIONS', 0):
+            self.assertEqual(processus_b.get(), 1)
+            self.assertEqual(processus_b.get(), 1)
+
+            processus_a.invalidate()
+
+            self.assertEqual(processus_b.get(), 2)
+            self.assertEqual(processus_a.get(), 3)
+            self.assertEqual(processus_a.version(), processus_b.version())
+
+
+class SnapshotScoresTests(TestCase):
+
+    def test_snapshot_recalcule_apres_changement_de_normes_ailleurs(self):
+        organization = Organization.objects.create(name="Cabinet", slug="cabinet")
+        patient = Patient.all_objects.create(
+            organization=organization, nom="Petit", prenom="Jean", date_naissance=date(2016, 2, 1)
+        )
+        test = TestVineland.all_objects.create(organization=organization, patient=patient)
+
+        premier = get_score_snapshot(test)
+        self.assertEqual(get_score_snapshot(test).versions_references, premier.versions_references)
+
+        # Normes importées par un autre processus : ce processus n'a rien invalidé
+        VersionReference.objects.update_or_create(nom='vineland_norms', defaults={'version': 41})
+
+        second = get_score_snapshot(test)
+        self.assertEqual(second.pk, premier.pk)
+        self.assertNotEqual(second.versions_references, premier.versions_references)
+        self.assertTrue(second.versions_references.startswith('41.'))
+
+
+class _PoolFactice:
+    """Pool dont les rendus ne se terminent jamais."""
+
+    def submit(self, fonction, *args):
+        return Future()
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+class ExportRapportsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name="Cabinet", slug="cabinet")
+        cls.patient = Patient.all_objects.create(
+            organization=cls.organization, nom="Durand", prenom="Léa", date_naissance=date(2012, 3, 4)
+        )
+        cls.tests = [
+            TestD2R.all_objects.create(
+                organization=cls.organization, patient=cls.patient, code=f'D2R-{i}',
+                date=date(2025, 1, 10), age=12, sexe='F', correction_vue='NO', lateralite='D',
+            )
+            for i in range(2)
+        ]
+
+    def setUp(self):
+        racine = tempfile.TemporaryDirectory()
+        self.addCleanup(racine.cleanup)
+        reglages = override_settings(RAPPORTS_PDF_ROOT=racine.name)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+    def rapport_pret(self, test, contenu=b'<html>rapport</html>'):
+        rapport = demander_rapport('d2r', test)
+        os.makedirs(os.path.dirname(chemin_fichier(rapport)), exist_ok=True)
+        with open(chemin_fichier(rapport), 'wb') as f:
+            f.write(contenu)
+        RapportPDF.all_objects.filter(pk=rapport.pk).update(statut='pret')
+        rapport.statut = 'pret'
+        return rapport
+
+    def test_interruption_remet_les_rendus_en_attente(self):
+        a_rendre, en_cache = self.tests
+        self.rapport_pret(en_cache)
+
+        with mock.patch('tests_psy.services.export.pool_de_rendu', return_value=_PoolFactice()):
+            rapports = preparer_rapports([('d2r', a_rendre), ('d2r', en_cache)], workers=1, attente_max=0)
+            instrument, test, rapport = next(rapports)
+            self.assertEqual(test, en_cache)
+            # Client déconnecté
+            rapports.close()
+
+        reserve = RapportPDF.all_objects.get(test_id=a_rendre.pk)
+        self.assertEqual(reserve.statut, 'attente')
+        self.assertEqual(reserve.tentatives, 0)
+
+    def test_archive_avec_erreurs(self):
+        pret = self.rapport_pret(self.tests[0], b'x' * 200000)
+        echec = demander_rapport('d2r', self.tests[1])
+        echec.statut, echec.erreur = 'erreur', 'Rendu impossible'
+
+        morceaux = list(flux_zip([('d2r', self.tests[0], pret), ('d2r', self.tests[1], echec)]))
+
+        self.assertGreater(len(morceaux), 2)
+        with zipfile.ZipFile(BytesIO(b''.join(morceaux))) as archive:
+            noms = archive.namelist()
+            self.assertEqual(len(noms), 2)
+            self.assertTrue(noms[0].startswith('Durand_Léa/D2R_Durand_Léa_'))
+            self.assertEqual(archive.read(noms[0]), b'x' * 200000)
+            self.assertEqual(noms[1], 'erreurs.txt')
+            self.assertIn('Rendu impossible', archive.read('erreurs.txt').decode())
+
+
+# ---------- Ancien calcul Vineland (une requête par sous-domaine), pour comparaison ----------
+
+def ancien_note_brute(reponses):
+    item_plancher = 0
+    consecutifs = 0
+    for numero, valeur in reponses:
+        consecutifs = consecutifs + 1 if valeur == '2' else 0
+        if consecutifs == 4:
+            item_plancher = numero - 3
+            break
+    nsp_count = sum(1 for _, valeur in reponses if valeur in ['NSP', '', None, '?'])
+    sum_1_2 = sum(int(valeur) for numero, valeur in reponses if numero > item_plancher and valeur in ['1', '2'])
+    return {
+        'note_brute': (item_plancher * 2) + sum_1_2 + nsp_count,
+        'item_plancher': item_plancher,
+        'nsp_count': nsp_count,
+        'na_count': sum(1 for _, valeur in reponses if valeur == 'NA'),
+        'sum_1_2': sum_1_2,
+        'a_refaire': nsp_count > 2,
+        'items': [{'numero': numero, 'valeur': valeur} for numero, valeur in reponses],
+    }
+
+
+def ancien_calculate_all_scores(test_vineland):
+    reponses = ReponseVineland.all_objects.filter(test_vineland=test_vineland).order_by(
+        'question__sous_domaine__domain', 'question__sous_domaine', 'question__numero_item'
+    ).select_related('question')
+    scores = {}
+    for domain in Domain.objects.prefetch_related('sous_domaines'):
+        scores[domain.name] = {
+            sous_domaine.name: ancien_note_brute([
+                (r.question.numero_item, r.reponse) for r in reponses if r.question.sous_domaine_id == sous_domaine.id
+            ])
+            for sous_domaine in domain.sous_domaines.all()
+        }
+    return scores
+
+
+def ancien_find_echelle_v_mapping(sous_domaine, note_brute, age_info):
+    age = (age_info['years'], age_info['months'])
+    for mapping in EchelleVMapping.objects.filter(
+        sous_domaine=sous_domaine, note_brute_min__lte=note_brute, note_brute_max__gte=note_brute
+    ):
+        # Les jours n'intervenaient jamais : la comparaison au mois les incluait déjà
+        if (mapping.age_debut_annee, mapping.age_debut_mois) <= age <= (mapping.age_fin_annee, mapping.age_fin_mois):
+            return mapping
+    return None
+
+
+def ancien_calculate_domain_scores(scores, age_info, tranche_age, tranche_age_intervalle, niveau_confiance=90):
+    complete_scores = []
+    for domain_name, domain_scores_data in scores.items():
+        domain_data = {
+            'name': domain_name, 'name_slug': domain_name.replace(' ', '_'),
+            'niveau_confiance': niveau_confiance, 'sous_domaines': [], 'domain_score': None,
+        }
+        domain_note_v_sum = 0
+        for sous_domain, score in domain_scores_data.items():
+            sous_domain_obj = SousDomain.objects.get(name=sous_domain)
+            echelle_v = ancien_find_echelle_v_mapping(sous_domain_obj, score['note_brute'], age_info)
+            if not echelle_v:
+                continue
+            domain_note_v_sum += echelle_v.note_echelle_v
+            data = {'name': sous_domain, 'note_brute': score['note_brute'], 'note_echelle_v': echelle_v.note_echelle_v}
+            intervalle = IntervaleConfianceSousDomaine.objects.filter(
+                age=tranche_age_intervalle, niveau_confiance=niveau_confiance, sous_domaine=sous_domain_obj
+            ).first()
+            data['intervalle'] = intervalle.intervalle if intervalle else None
+            niveau = NiveauAdaptatif.objects.filter(
+                echelle_v_min__lte=echelle_v.note_echelle_v, echelle_v_max__gte=echelle_v.note_echelle_v
+            ).first()
+            if niveau:
+                data['niveau_adaptatif'] = niveau.get_niveau_display()
+            age_equivalent = AgeEquivalentSousDomaine.objects.filter(
+                sous_domaine=sous_domain_obj, note_brute_min__lte=score['note_brute']
+            ).filter(
+                Q(note_brute_max__isnull=True, note_brute_min=score['note_brute'])
+                | Q(note_brute_max__isnull=False, note_brute_max__gte=score['note_brute'])
+            ).first()
+            if age_equivalent:
+                data['age_equivalent'] = age_equivalent.get_age_equivalent_display()
+            domain_data['sous_domaines'].append(data)
+
+        colonne = 'communication' if 'Communication' in domain_name else 'vie_quotidienne'
+        mapping = NoteDomaineVMapping.objects.filter(**{
+            'tranche_age': tranche_age,
+            f'{colonne}_min__lte': domain_note_v_sum,
+            f'{colonne}_max__gte': domain_note_v_sum,
+        }).first()
+        if mapping:
+            domain_data['domain_score'] = {
+                'somme_notes_v': domain_note_v_sum,
+                'note_standard': mapping.note_standard,
+                'rang_percentile': mapping.rang_percentile,
+            }
+            intervalle_domaine = IntervaleConfianceDomaine.objects.filter(
+                age=tranche_age_intervalle, niveau_confiance=niveau_confiance, domain__name=domain_name
+            ).first()
+            if intervalle_domaine:
+                domain_data['domain_score']['intervalle'] = intervalle_domaine.intervalle
+                domain_data['domain_score']['note_composite'] = intervalle_domaine.note_composite
+            niveau = NiveauAdaptatif.objects.filter(
+                note_standard_min__lte=mapping.note_standard, note_standard_max__gte=mapping.note_standard
+            ).first()
+            if niveau:
+                domain_data['domain_score']['niveau_adaptatif'] = niveau.get_niveau_display()
+        complete_scores.append(domain_data)
+    return complete_scores
+
+
+class ScoresVinelandTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name="Cabinet", slug="cabinet")
+        cls.patient = Patient.all_objects.create(
+            organization=cls.organization, nom="Bernard", prenom="Zoé", date_naissance=date(2019, 1, 1)
+        )
+        communication = Domain.objects.create(name='Communication', ordre=1)
+        vie_quotidienne = Domain.objects.create(name='Vie quotidienne', ordre=2)
+        cls.sous_domaines = [
+            SousDomain.objects.create(domain=communication, name='Réceptive', ordre=1),
+            SousDomain.objects.create(domain=communication, name='Expressive', ordre=2),
+            SousDomain.objects.create(domain=vie_quotidienne, name='Personnelle', ordre=1),
+        ]
+        for k, sous_domaine in enumerate(cls.sous_domaines):
+            for numero in range(1, 9):
+                QuestionVineland.objects.create(sous_domaine=sous_domaine, numero_item=numero, texte=f'Item {numero}')
+            for debut, fin, note_min, note_max, note_v in [
+                ((5, 0, None), (5, 11, None), 0, 5, 8),
+                ((5, 0, None), (5, 11, None), 6, 10, 10),
+                # Chevauche la ligne précédente sur la note 10
+                ((5, 0, None), (5, 11, None), 10, 14, 12),
+                ((5, 0, None), (5, 11, None), 15, 40, 15),
+                ((6, 0, 0), (6, 5, 30), 0, 40, 9),
+                ((6, 6, 0), (7, 11, 30), 0, 20, 11),
+                ((6, 6, 0), (7, 11, 30), 21, 40, 13),
+            ]:
+                EchelleVMapping.objects.create(
+                    sous_domaine=sous_domaine,
+                    age_debut_annee=debut[0], age_debut_mois=debut[1], age_debut_jour=debut[2],
+                    age_fin_annee=fin[0], age_fin_mois=fin[1], age_fin_jour=fin[2],
+                    note_brute_min=note_min, note_brute_max=note_max, note_echelle_v=note_v + k,
+                )
+            IntervaleConfianceSousDomaine.objects.create(age='5', niveau_confiance=90, sous_domaine=sous_domaine, intervalle=2 + k)
+            AgeEquivalentSousDomaine.objects.create(sous_domaine=sous_domaine, note_brute_min=0, note_brute_max=5, age_annees=3)
+            AgeEquivalentSousDomaine.objects.create(sous_domaine=sous_domaine, note_brute_min=6, age_annees=4, age_mois=6)
+            AgeEquivalentSousDomaine.objects.create(sous_domaine=sous_domaine, note_brute_min=7, note_brute_max=40, age_special='>18')
+
+        # Notes de domaine : 28-30 couvert par 110 et 120 (la note la plus haute l'emporte)
+        for tranche, note_standard, communication_bornes, vie_quotidienne_bornes in [
+            ('3-6', 100, (0, 20), (0, 10)),
+            ('3-6', 110, (21, 30), (11, 20)),
+            ('3-6', 120, (28, 50), (21, 50)),
+            ('7-18', 105, (0, 50), (0, 50)),
+        ]:
+            NoteDomaineVMapping.objects.create(
+                tranche_age=tranche, note_standard=note_standard, rang_percentile=str(note_standard // 2),
+                communication_min=communication_bornes[0], communication_max=communication_bornes[1],
+                vie_quotidienne_min=vie_quotidienne_bornes[0], vie_quotidienne_max=vie_quotidienne_bornes[1],
+            )
+        IntervaleConfianceDomaine.objects.create(age='5', niveau_confiance=90, domain=communication, intervalle=5, note_composite=7)
+        for niveau, echelle_v, note_standard in [
+            ('faible', (1, 9), (20, 99)), ('adapte', (10, 14), (100, 114)), ('eleve', (15, 24), (115, 160)),
+        ]:
+            NiveauAdaptatif.objects.create(
+                niveau=niveau, echelle_v_min=echelle_v[0], echelle_v_max=echelle_v[1],
+                note_standard_min=note_standard[0], note_standard_max=note_standard[1],
+            )
+
+    def age(self, years, months, days):
+        return {'years': years, 'months': months, 'days': days}
+
+    def test_item_plancher_nsp_et_na(self):
+        note = NoteBruteSousDomaine()
+        reponses = [(1, '1'), (2, '2'), (3, '2'), (4, '2'), (5, '2'), (6, '0'), (7, 'NSP'), (8, 'NA'), (9, '?'), (10, '1')]
+        for numero, valeur in reponses:
+            note.add(numero, valeur)
+
+        resultat = note.as_dict()
+        # Plancher à l'item 2 : 2 × 2 + (2 + 2 + 2 + 1) + 2 NSP
+        self.assertEqual(resultat['item_plancher'], 2)
+        self.assertEqual(resultat['sum_1_2'], 7)
+        self.assertEqual((resultat['nsp_count'], resultat['na_count']), (2, 1))
+        self.assertEqual(resultat['note_brute'], 13)
+        self.assertFalse(resultat['a_refaire'])
+        self.assertEqual(resultat, ancien_note_brute(reponses))
+
+    def test_sans_plancher_et_a_refaire(self):
+        reponses = [(1, '2'), (2, '2'), (3, '2'), (4, '1'), (5, '2'), (6, ''), (7, None), (8, '?')]
+        note = NoteBruteSousDomaine()
+        for numero, valeur in reponses:
+            note.add(numero, valeur)
+
+        resultat = note.as_dict()
+        self.assertEqual(resultat['item_plancher'], 0)
+        self.assertEqual(resultat['note_brute'], 9 + 3)
+        self.assertTrue(resultat['a_refaire'])
+        self.assertEqual(resultat, ancien_note_brute(reponses))
+
+    def test_bornes_des_tranches_d_age(self):
+        norms = get_vineland_norms()
+        sous_domaine = self.sous_domaines[0]
+        attendus = [
+            (self.age(4, 11, 30), None),
+            (self.age(5, 0, 0), 8),
+            (self.age(5, 11, 30), 8),
+            (self.age(6, 0, 0), 9),
+            (self.age(6, 5, 30), 9),
+            (self.age(6, 6, 0), 11),
+            (self.age(7, 11, 30), 11),
+            (self.age(8, 0, 0), None),
+        ]
+        for age_info, note_v in attendus:
+            with self.subTest(age=age_info):
+                self.assertEqual(norms.note_echelle_v(sous_domaine.id, 3, age_info), note_v)
+                ancien = ancien_find_echelle_v_mapping(sous_domaine, 3, age_info)
+                self.assertEqual(ancien.note_echelle_v if ancien else None, note_v)
+
+    def test_intervalles_de_notes_chevauchants(self):
+        norms = get_vineland_norms()
+        sous_domaine = self.sous_domaines[0]
+        age_info = self.age(5, 6, 15)
+        for note_brute, note_v in [(5, 8), (6, 10), (10, 10), (11, 12), (14, 12), (15, 15), (41, None)]:
+            with self.subTest(note_brute=note_brute):
+                self.assertEqual(norms.note_echelle_v(sous_domaine.id, note_brute, age_info), note_v)
+                ancien = ancien_find_echelle_v_mapping(sous_domaine, note_brute, age_info)
+                self.assertEqual(ancien.note_echelle_v if ancien else None, note_v)
+
+        # Notes de domaine qui se chevauchent : première ligne de l'ordre du modèle
+        self.assertEqual(norms.note_domaine('Communication', 29, '3-6').note_standard, 120)
+        self.assertEqual(norms.note_domaine('Communication', 27, '3-6').note_standard, 110)
+
+    def test_scores_identiques_a_l_ancien_calcul(self):
+        hasard = random.Random(4)
+        valeurs = ['0', '1', '2', '2', '2', 'NSP', 'NA', '?', '', None]
+        questions = list(QuestionVineland.objects.all())
+        for jour in [date(2024, 6, 15), date(2024, 12, 31), date(2025, 6, 30), date(2025, 7, 1), date(2026, 3, 3)]:
+            date_passation = datetime(jour.year, jour.month, jour.day, 12, tzinfo=dt_timezone.utc)
+            for _ in range(4):
+                test = TestVineland.all_objects.create(
+                    organization=self.organization, patient=self.patient, date_passation=date_passation
+                )
+                ReponseVineland.all_objects.bulk_create([
+                    ReponseVineland(
+                        organization=self.organization, test_vineland=test, question=question,
+                        reponse=hasard.choice(valeurs),
+                    )
+                    for question in questions if hasard.random() < 0.9
+                ])
+                age_info = get_patient_age(test)
+                tranche_age, tranche_age_intervalle = get_age_tranches(age_info['years'])
+
+                with self.subTest(date_passation=date_passation, test=test.pk):
+                    scores = calculate_all_scores(test)
+                    self.assertEqual(scores, ancien_calculate_all_scores(test))
+                    self.assertEqual(
+                        calculate_domain_scores(scores, age_info, tranche_age, tranche_age_intervalle, test),
+                        ancien_calculate_domain_scores(scores, age_info, tranche_age, tranche_age_intervalle),
+                    )
+
+
+class CorrectionD2RTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name="Cabinet", slug="cabinet")
+        cls.patient = Patient.all_objects.create(
+            organization=cls.organization, nom="Moreau", prenom="Jules", date_naissance=date(2010, 5, 2)
+        )
+
+        def symboles(page, ligne, descriptions):
+            return [
+                SymboleReference.objects.create(
+                    page=page, ligne=ligne, lettre=lettre, traits_haut=haut, traits_bas=bas
+                )
+                for lettre, haut, bas in descriptions
+            ]
+
+        # Ligne 2 : cibles aux rangs 0, 2, 4 et 5
+        cls.ligne_2 = symboles(1, 2, [('d', 1, 1), ('p', 1, 1), ('d', 2, 0), ('d', 1, 0), ('d', 0, 2), ('d', 1, 1)])
+        cls.ligne_3 = symboles(1, 3, [('d', 1, 1), ('d', 1, 1), ('p', 2, 0)])
+        # Ligne d'exemple et autre page : jamais notées
+        cls.ligne_1 = symboles(1, 1, [('d', 1, 1)])
+        cls.page_2 = symboles(2, 2, [('d', 1, 1)])
+
+    def selection(self):
+        # Ligne 2 : une cible, un « p », une cible ; la dernière cible n'est pas atteinte
+        return [self.ligne_2[0].id, self.ligne_2[1].id, self.ligne_2[4].id, self.ligne_1[0].id, self.page_2[0].id]
+
+    def creer_test(self, selection):
+        return TestD2R.all_objects.create(
+            organization=self.organization, patient=self.patient, code='D2R', date=date(2025, 2, 1), age=14,
+            sexe='M', correction_vue='NO', lateralite='D', symboles_selectionnes=selection,
+        )
+
+    def test_correction_par_ligne(self):
+        resultat = get_grille_d2r().score(self.selection())
+
+        self.assertEqual(resultat.lignes, [
+            {'ligne': 2, 'traites': 5, 'cct': 2, 'ec': 1, 'eo': 1},
+            {'ligne': 3, 'traites': 0, 'cct': 0, 'ec': 0, 'eo': 0},
+        ])
+        self.assertEqual((resultat.correctes, resultat.incorrectes, resultat.omises), (2, 1, 1))
+
+        test = self.creer_test(self.selection())
+        apply_d2r_score(test, resultat)
+        self.assertEqual(test.note_exactitude, 100)
+        self.assertEqual(test.capacite_concentration, 0)
+
+    def test_recorrection_apres_modification_de_la_grille(self):
+        test = self.creer_test(self.selection())
+        vide = self.creer_test([])
+        self.assertEqual(rescore_d2r_tests(), 1)
+
+        # Le « p » sélectionné devient une cible : l'erreur de commission disparaît
+        symbole = self.ligne_2[1]
+        symbole.lettre = 'd'
+        symbole.save()
+
+        self.assertEqual(rescore_d2r_tests(TestD2R.all_objects.filter(pk__in=[test.pk, vide.pk])), 1)
+        test.refresh_from_db()
+        self.assertEqual((test.reponses_correctes, test.reponses_incorrectes, test.reponses_omises), (3, 0, 1))
+        self.assertEqual(test.detail_lignes[0], {'ligne': 2, 'traites': 5, 'cct': 3, 'ec': 0, 'eo': 1})
+        self.assertEqual(test.capacite_concentration, 2)
+        vide.refresh_from_db()
+        self.assertEqual(vide.reponses_correctes, 0)
+
+
+class EvenementsD2RTests(TestCase):
+
+    def test_encodage_aller_retour(self):
+        evenements = [
+            Evenement(0, DEBUT_LIGNE, 2, 0),
+            Evenement(127, SELECTION, 2, 5),
+            Evenement(128, DESELECTION, 2, 5),
+            Evenement(20000, SELECTION, 40, 300),
+            Evenement(2500000, FIN_LIGNE, 40, 0),
+        ]
+        donnees = encode_evenements(evenements)
+
+        self.assertEqual(donnees[0], 1)
+        self.assertEqual(decode_evenements(donnees), evenements)
+        # PostgreSQL retourne un memoryview
+        self.assertEqual(decode_evenements(memoryview(donnees)), evenements)
+        self.assertEqual(decode_evenements(b''), [])
+        self.assertEqual(decode_evenements(b'\x09\x00\x00\x00'), [])
+
+    def test_lecture_des_evenements_envoyes(self):
+        brut = json.dumps([[1, 2, 3, 50], [0, 2, 0, 10], ['x', 2, 0, 0], [7, 2, 0, 0], [1, -1, 0, 0], [3, 2]])
+        self.assertEqual(parse_evenements(brut), [Evenement(10, DEBUT_LIGNE, 2, 0), Evenement(50, SELECTION, 2, 3)])
+        self.assertEqual(parse_evenements('pas du json'), [])
+
+    def test_indice_de_fatigue(self):
+        traites = [20, 20, 18, 18, 15, 15]
+        evenements = []
+        for i, ligne in enumerate(range(2, 8)):
+            debut = i * 20000
+            if i == 0:
+                # Pause de 2 s au milieu de la ligne : exclue de la durée active
+                evenements += [Evenement(debut, DEBUT_LIGNE, ligne, 0), Evenement(debut + 4000, FIN_LIGNE, ligne, 0),
+                               Evenement(debut + 6000, DEBUT_LIGNE, ligne, 0)]
+                fin = debut + 12000
+            else:
+                evenements.append(Evenement(debut, DEBUT_LIGNE, ligne, 0))
+                fin = debut + 10000
+            evenements += [Evenement(debut + 5000 + k, SELECTION, ligne, k) for k in range(3)]
+            evenements.append(Evenement(fin, FIN_LIGNE, ligne, 0))
+        detail_lignes = [
+            {'ligne': ligne, 'traites': nombre, 'cct': nombre - 2, 'ec': 1, 'eo': 1}
+            for ligne, nombre in zip(range(2, 8), traites)
+        ]
+
+        evenements.sort(key=lambda evenement: evenement.t)
+        analyse = analyse_passation(decode_evenements(encode_evenements(evenements)), detail_lignes)
+
+        self.assertEqual([ligne['duree'] for ligne in analyse['lignes']], [10.0] * 6)
+        self.assertEqual([ligne['vitesse'] for ligne in analyse['lignes']], [2.0, 2.0, 1.8, 1.8, 1.5, 1.5])
+        self.assertEqual([ligne['clics'] for ligne in analyse['lignes']], [3] * 6)
+        self.assertEqual(analyse['lignes'][0]['taux_erreur'], 10.0)
+        # Premier tiers à 2 symboles/s, dernier à 1,5 : -25 %
+        self.assertEqual(analyse['indice_fatigue'], -25.0)
+        self.assertEqual(analyse['fluctuation'], 5)
+        self.assertLess(analyse['pente_vitesse'], 0)
+        self.assertIsNone(analyse_passation([], detail_lignes))
+
+
+def ancien_get(model, **filtres):
+    try:
+        return model.objects.get(**filtres)
+    except model.DoesNotExist:
+        return None
+
+
+def ancien_comparaison(age, niveau, sous_domaine1, sous_domaine2):
+    # Recherche dans un sens puis dans l'autre, comme find_sous_domaine_comparison
+    return ancien_get(
+        ComparaisonSousDomaineVineland, age=age, niveau_significativite=niveau,
+        sous_domaine1=sous_domaine1, sous_domaine2=sous_domaine2,
+    ) or ancien_get(
+        ComparaisonSousDomaineVineland, age=age, niveau_significativite=niveau,
+        sous_domaine1=sous_domaine2, sous_domaine2=sous_domaine1,
+    )
+
+
+def ancien_frequence(age, sous_domaine1, sous_domaine2, difference):
+    freq = ancien_get(
+        FrequenceDifferenceSousDomaineVineland, age=age, sous_domaine1=sous_domaine1, sous_domaine2=sous_domaine2
+    ) or ancien_get(
+        FrequenceDifferenceSousDomaineVineland, age=age, sous_domaine1=sous_domaine2, sous_domaine2=sous_domaine1
+    )
+    if not freq:
+        return None
+    if freq.frequence_5 and difference >= extract_number(freq.frequence_5):
+        return "5%"
+    elif freq.frequence_10 and difference >= extract_number(freq.frequence_10):
+        return "10%"
+    elif freq.frequence_16 and difference >= extract_number(freq.frequence_16):
+        return "16%"
+    return None
+
+
+class MatriceComparaisonsTests(TestCase):
+
+    def test_paires_inversees(self):
+        matrice = PairMatrix(
+            [('3-6', '.05', 1, 2, 10), ('3-6', '.05', 2, 1, 12), ('3-6', '.05', 1, 3, 7)],
+            [],
+        )
+        # Les deux sens sont dans la table : chacun garde sa valeur
+        self.assertEqual(matrice.difference_requise('3-6', '.05', 1, 2), 10)
+        self.assertEqual(matrice.difference_requise('3-6', '.05', 2, 1), 12)
+        # Un seul sens : l'autre le reprend
+        self.assertEqual(matrice.difference_requise('3-6', '.05', 3, 1), 7)
+        self.assertIsNone(matrice.difference_requise('3-6', '.05', 2, 3))
+
+    def test_tranche_ou_niveau_absent(self):
+        matrice = PairMatrix([('3-6', '.05', 1, 2, 10)], [('3-6', 1, 2, '12+', '8-10', '5')])
+        self.assertIsNone(matrice.difference_requise('7-18', '.05', 1, 2))
+        self.assertIsNone(matrice.difference_requise('3-6', '.01', 1, 2))
+        self.assertIsNone(matrice.difference_requise('3-6', '.05', 1, 99))
+        self.assertIsNone(matrice.frequence('7-18', 1, 2, 20))
+        self.assertIsNone(matrice.frequence('3-6', 1, 99, 20))
+
+    def test_seuils_de_frequence(self):
+        matrice = PairMatrix([], [('3-6', 1, 2, '12+', '8-10', '5'), ('3-6', 1, 3, '', '9', '4')])
+        for difference, frequence in [(4, None), (5, '16%'), (7, '16%'), (8, '10%'), (11, '10%'), (12, '5%'), (30, '5%')]:
+            with self.subTest(difference=difference):
+                self.assertEqual(matrice.frequence('3-6', 1, 2, difference), frequence)
+                self.assertEqual(matrice.frequence('3-6', 2, 1, difference), frequence)
+        # Seuil 5 % vide : ignoré
+        self.assertEqual(matrice.frequence('3-6', 1, 3, 40), '10%')
+
+    def test_identique_aux_anciennes_recherches(self):
+        domaine = Domain.objects.create(name='Communication')
+        sous_domaines = [SousDomain.objects.create(domain=domaine, name=f'SD {i}') for i in range(4)]
+        a, b, c, d = sous_domaines
+        for age, niveau, sd1, sd2, difference in [
+            ('3-6', '.05', a, b, 3), ('3-6', '.05', b, a, 4), ('3-6', '.05', a, c, 5),
+            ('3-6', '.01', c, a, 6), ('7-18', '.05', d, b, 2), ('7-18', '.01', b, c, 8),
+        ]:
+            ComparaisonSousDomaineVineland.objects.create(
+                age=age, niveau_significativite=niveau, sous_domaine1=sd1, sous_domaine2=sd2, difference_requise=difference
+            )
+        for age, sd1, sd2, seuils in [
+            ('3-6', a, b, ('6+', '4-5', '3')), ('3-6', b, a, ('9', '7', '5')),
+            ('3-6', c, a, ('', '5', '2')), ('7-18', b, d, ('4', 'x', '1')),
+        ]:
+            FrequenceDifferenceSousDomaineVineland.objects.create(
+                age=age, sous_domaine1=sd1, sous_domaine2=sd2,
+                frequence_5=seuils[0], frequence_10=seuils[1], frequence_16=seuils[2],
+            )
+
+        matrice = get_comparison_matrix().sous_domaines
+        for age in ('3-6', '7-18', '19-49'):
+            for sd1 in sous_domaines:
+                for sd2 in sous_domaines:
+                    for niveau in ('.05', '.01'):
+                        ancienne = ancien_comparaison(age, niveau, sd1, sd2)
+                        self.assertEqual(
+                            matrice.difference_requise(age, niveau, sd1.id, sd2.id),
+                            ancienne.difference_requise if ancienne else None,
+                        )
+                    for difference in range(12):
+                        self.assertEqual(
+                            matrice.frequence(age, sd1.id, sd2.id, difference),
+                            ancien_frequence(age, sd1, sd2, difference),
+                        )
+
+
+class CorrectionSTAITests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name="Cabinet", slug="cabinet")
+        cls.patient = Patient.all_objects.create(
+            organization=cls.organization, nom="Roux", prenom="Anna", date_naissance=date(1990, 9, 9)
+        )
+        cls.items = {
+            numero: ItemSTAI.objects.create(numero=numero, texte=f'Item {numero}', section=section, est_inverse=inverse)
+            for numero, section, inverse in [(1, 'ETAT', False), (2, 'ETAT', True), (21, 'TRAIT', False), (22, 'TRAIT', True)]
+        }
+
+    def creer_test(self):
+        return TestSTAI.all_objects.create(organization=self.organization, patient=self.patient)
+
+    def test_items_inverses(self):
+        correction = corriger_stai({1: 3, 2: 1, 21: 4, 22: 2})
+        self.assertEqual([score for _, _, score in correction.reponses], [3, 4, 4, 3])
+        self.assertEqual((correction.score_etat, correction.score_trait), (7, 7))
+        self.assertEqual(correction.items_manquants, [])
+
+    def test_scores_identiques_a_l_ancien_calcul(self):
+        test = self.creer_test()
+        with transaction.atomic():
+            self.assertEqual(save_stai_reponses(test, {1: 4, 2: 4, 21: 1, 22: 3}), [])
+
+        test.refresh_from_db()
+        self.assertEqual((test.score_etat, test.score_trait), (5, 3))
+
+        # Ancien calcul : score de chaque réponse enregistrée, puis sommes par section
+        for reponse in ReponseItemSTAI.all_objects.filter(test=test).select_related('item'):
+            score_calcule = reponse.score_calcule
+            self.assertEqual(reponse.calculer_score(), score_calcule)
+        ancien = TestSTAI.all_objects.get(pk=test.pk)
+        ancien.calculer_scores()
+        self.assertEqual(
+            (ancien.score_etat, ancien.niveau_anxiete_etat, ancien.score_trait, ancien.niveau_anxiete_trait),
+            (test.score_etat, test.niveau_anxiete_etat, test.score_trait, test.niveau_anxiete_trait),
+        )
+
+    def test_passation_incomplete(self):
+        test = self.creer_test()
+        with transaction.atomic():
+            save_stai_reponses(test, {1: 2, 2: 2, 21: 2, 22: 2})
+            manquants = save_stai_reponses(test, {1: 3, 21: 4})
+
+        # Réponses conservées (remplacent les précédentes), scores non écrits
+        self.assertEqual(manquants, [2, 22])
+        self.assertEqual(
+            sorted(ReponseItemSTAI.all_objects.filter(test=test).values_list('item__numero', 'score_calcule')),
+            [(1, 3), (21, 4)],
+        )
+        test.refresh_from_db()
+        self.assertEqual((test.score_etat, test.score_trait), (5, 5))
+
+
+class CorrectionBeckTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name="Cabinet", slug="cabinet")
+        cls.patient = Patient.all_objects.create(
+            organization=cls.organization, nom="Petit", prenom="Marc", date_naissance=date(1985, 4, 4)
+        )
+        # {numero: [phrases de score 0 à 3]}
+        cls.phrases = {}
+        for numero in (1, 2, 9):
+            item = ItemBeck.objects.create(numero=numero, categorie=f'Item {numero}')
+            cls.phrases[numero] = [
+                PhraseBeck.objects.create(item=item, score_valeur=score, texte=f'Phrase {score}', ordre=score)
+                for score in range(4)
+            ]
+
+    def ids(self, numero, *scores):
+        return [str(self.phrases[numero][score].id) for score in scores]
+
+    def test_phrases_d_un_autre_item_ignorees(self):
+        correction = corriger_beck({
+            1: self.ids(1, 1, 2) + self.ids(2, 3) + ['x', None],
+            2: self.ids(9, 3),
+        })
+
+        item_1 = self.phrases[1][0].item_id
+        self.assertEqual(correction.reponses, [(item_1, [int(i) for i in self.ids(1, 1, 2)], 2)])
+        self.assertEqual(correction.score_total, 2)
+        self.assertFalse(correction.alerte_suicide)
+
+    def test_seuil_alerte_suicide(self):
+        for score, alerte in [(0, False), (1, False), (2, True), (3, True)]:
+            with self.subTest(score=score):
+                self.assertEqual(corriger_beck({9: self.ids(9, score)}).alerte_suicide, alerte)
+        self.assertFalse(corriger_beck({}).alerte_suicide)
+
+    def test_enregistrement_des_phrases_cochees(self):
+        test = TestBeck.all_objects.create(organization=self.organization, patient=self.patient)
+        with transaction.atomic():
+            save_beck_reponses(test, {1: self.ids(1, 0), 2: self.ids(2, 3)})
+            save_beck_reponses(test, {1: self.ids(1, 1, 3), 9: self.ids(9, 2), 2: []})
+
+        # Re-soumission : les anciennes réponses sont remplacées
+        PhrasesCochees = ReponseItemBeck.phrases_cochees.through
+        self.assertEqual(
+            sorted(PhrasesCochees.objects.filter(reponseitembeck__test=test).values_list(
+                'reponseitembeck__item__numero', 'phrasebeck__score_valeur'
+            )),
+            [(1, 1), (1, 3), (9, 2)],
+        )
+        self.assertEqual(
+            get_reponses_existantes(test),
+            {1: [int(i) for i in self.ids(1, 1, 3)], 9: [int(i) for i in self.ids(9, 2)]},
+        )
+
+        test.refresh_from_db()
+        self.assertEqual((test.score_total, test.alerte_suicide), (5, True))
+        # Ancien calcul à partir des réponses enregistrées
+        ancien = TestBeck.all_objects.get(pk=test.pk)
+        ancien.calculer_score_total()
+        self.assertEqual(
+            (ancien.score_total, ancien.niveau_depression, ancien.alerte_suicide),
+            (test.score_total, test.niveau_depression, test.alerte_suicide),
+        )
@@ -1,5 +1,5 @@
 from django.urls import path
-from tests_psy.views import d2r, vineland , beck , stai
+from tests_psy.views import d2r, vineland , beck , stai, rapports
 
 app_name = 'tests_psy'
 
@@ -38,6 +38,7 @@ urlpatterns = [
     path('beck/<int:test_id>/passation/', beck.beck_passation, name='beck_passation'),
     path('beck/<int:test_id>/resultats/', beck.beck_resultats, name='beck_resultats'),
     path('beck/<int:test_id>/pdf/', beck.beck_pdf, name='beck_pdf'),
+    path('beck/evolution/<int:patient_id>/', beck.beck_evolution, name='beck_evolution'),
 
     # ========== STAI ==========
     path('stai/', stai.stai_liste, name='stai_liste'),
@@ -46,6 +47,10 @@ urlpatterns = [
     path('stai/<int:test_id>/passation/', stai.stai_passation, name='stai_passation'),
     path('stai/<int:test_id>/resultats/', stai.stai_resultats, name='stai_resultats'),
     path('stai/<int:test_id>/pdf/', stai.stai_pdf, name='stai_pdf'),
+    path('stai/evolution/<int:patient_id>/', stai.stai_evolution, name='stai_evolution'),
 
+    # ========== RAPPORTS ==========
+    path('rapports/<int:rapport_id>/statut/', rapports.rapport_statut, name='rapport_statut'),
+    path('rapports/export/', rapports.export_rapports, name='export_rapports'),
 
 ]
\ No newline at end of file
@@ -1,13 +1,25 @@
-from django.http import HttpResponse
-from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db import transaction
+from asgiref.sync import sync_to_async
+from reportlab.lib.units import cm
+from reportlab.platypus import Paragraph
 
-from tests_psy.models import TestBeck, ItemBeck, PhraseBeck, ReponseItemBeck
+from tests_psy.models import TestBeck, ItemBeck
 from tests_psy.forms import TestBeckForm
 from cabinet.models import Patient
 from accounts.decorators import require_test_access
+from accounts.quotas import reserver_quota, QuotaAtteint
+from core.pagination import KeysetPaginator
+from tests_psy.views.rapports import servir_rapport
+from tests_psy.services.beck import get_items_beck, save_beck_reponses, get_reponses_existantes
+from tests_psy.services.evolution import get_serie, count_points
+from tests_psy.services.pdf import (
+    Rapport, Section, construire_pdf, entete, pied, tableau_patient,
+    tableau, paragraphe, get_styles, style_encadre, style_niveau, style_plage,
+)
 
 
 @login_required
@@ -23,8 +35,14 @@ def beck_liste(request):
     tests_restants = license.get_tests_remaining('beck')
     peut_creer = license.can_add_test('beck')
     
+    # Pagination par clé (date de passation) ; total lu sur le compteur d'utilisation
+    page_obj = KeysetPaginator(tests, ('-date_passation',), 20, count=license.get_usage('beck')).get_page(
+        request.GET.get('cursor')
+    )
+    
     context = {
-        'tests': tests,
+        'tests': page_obj,
+        'page_obj': page_obj,
         'title': 'Tests Beck (Inventaire de dépression)',
         'tests_restants': tests_restants,
         'peut_creer': peut_creer,
@@ -60,7 +78,15 @@ def beck_nouveau(request, patient_id=None):
             test = form.save(commit=False)
             test.organization = request.user.organization
             test.psychologue = request.user
-            test.save()
+            try:
+                with reserver_quota(request.user, 'beck'):
+                    test.save()
+            except QuotaAtteint as e:
+                messages.error(
+                    request,
+                    f"Limite de tests Beck atteinte ! Votre licence autorise {e.limit} tests Beck maximum."
+                )
+                return redirect('tests_psy:beck_liste')
             
             messages.success(request, "Test Beck créé avec succès !")
             return redirect('tests_psy:beck_passation', test_id=test.id)
@@ -95,10 +121,7 @@ def beck_passation(request, test_id):
     items = ItemBeck.objects.prefetch_related('phrases').order_by('numero')
     
     # Récupérer les réponses existantes (si modification)
-    reponses_existantes = {}
-    for reponse in test.reponses.all():
-        phrases_ids = list(reponse.phrases_cochees.values_list('id', flat=True))
-        reponses_existantes[reponse.item.numero] = phrases_ids
+    reponses_existantes = get_reponses_existantes(test)
     
     context = {
         'test': test,
@@ -120,35 +143,16 @@ def beck_submit(request, test_id):
     
     test = get_object_or_404(TestBeck, id=test_id, organization=request.user.organization)
     
+    # Phrases cochées pour chaque item
+    selections = {
+        item.numero: request.POST.getlist(f'item_{item.numero}')
+        for item in get_items_beck()
+    }
+    
     # Utiliser une transaction pour garantir la cohérence
     with transaction.atomic():
-        # Supprimer les anciennes réponses (si re-soumission)
-        test.reponses.all().delete()
-        
-        # Traiter les réponses pour chaque item
-        items = ItemBeck.objects.all().order_by('numero')
-        
-        for item in items:
-            # Récupérer les phrases cochées pour cet item
-            phrases_cochees_ids = request.POST.getlist(f'item_{item.numero}')
-            
-            if phrases_cochees_ids:
-                # Créer la réponse pour cet item
-                reponse = ReponseItemBeck.objects.create(
-                    test=test,
-                    item=item,
-                    organization=request.user.organization
-                )
-                
-                # Ajouter les phrases cochées
-                phrases = PhraseBeck.objects.filter(id__in=phrases_cochees_ids)
-                reponse.phrases_cochees.set(phrases)
-                
-                # Calculer le score (max des scores des phrases cochées)
-                reponse.calculer_score()
-        
-        # Calculer le score total du test
-        test.calculer_score_total()
+        # Réponses et phrases cochées (insertions groupées), score calculé en mémoire
+        save_beck_reponses(test, selections)
     
     messages.success(request, "Test Beck complété avec succès !")
     
@@ -181,17 +185,8 @@ def beck_resultats(request, test_id):
             'phrases': reponse.phrases_cochees.all()
         }
     
-    # Récupérer les tests Beck précédents du patient pour le graphique d'évolution
-    tests_precedents = TestBeck.objects.filter(
-        patient=test.patient,
-        organization=request.user.organization
-    ).order_by('date_passation')
-    
-    # Données pour le graphique
-    evolution_data = {
-        'dates': [t.date_passation.strftime('%d/%m/%Y') for t in tests_precedents],
-        'scores': [t.score_total for t in tests_precedents]
-    }
+    # Nombre de tests du patient (la série du graphique est chargée via beck_evolution)
+    nb_tests_precedents = count_points(test.patient, 'beck')
     
     # Interprétation du score
     interpretation = test.interpretation_score
@@ -230,10 +225,9 @@ def beck_resultats(request, test_id):
         'test': test,
         'patient': test.patient,
         'reponses_par_item': reponses_par_item,
-        'evolution_data': evolution_data,
         'interpretation': interpretation,
         'recommandations': recommandations.get(test.niveau_depression, []),
-        'nb_tests_precedents': tests_precedents.count(),
+        'nb_tests_precedents': nb_tests_precedents,
         'title': f'Résultats Beck - {test.patient.nom_complet}'
     }
     
@@ -241,239 +235,64 @@ def beck_resultats(request, test_id):
 
 @login_required
 @require_test_access('beck')
-def beck_pdf(request, test_id):
-    """Générer un rapport PDF du test Beck"""
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib import colors
-    from reportlab.lib.units import cm
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.enums import TA_CENTER, TA_LEFT
-    from io import BytesIO
+async def beck_evolution(request, patient_id):
+    """Série d'évolution du score Beck du patient (JSON, chargée par le graphique)"""
+    user = await request.auser()
+    patient = await aget_object_or_404(Patient, id=patient_id, organization_id=user.organization_id)
     
+    serie = await sync_to_async(get_serie)(patient, 'beck')
+    return JsonResponse(serie)
+
+
+@login_required
+@require_test_access('beck')
+def beck_pdf(request, test_id):
+    """Rapport PDF du test Beck (rendu par la file des rapports, servi depuis le cache)"""
     test = get_object_or_404(TestBeck, id=test_id, organization=request.user.organization)
-    
-    # Récupérer toutes les réponses
-    reponses = test.reponses.select_related('item').prefetch_related('phrases_cochees').order_by('item__numero')
-    
-    # Recommandations selon le niveau
-    recommandations = {
-        'minimale': [
-            "Absence ou présence minimale de symptômes dépressifs",
-            "Continuer à surveiller l'évolution",
-        ],
-        'legere': [
-            "Symptômes dépressifs légers détectés",
-            "Envisager un suivi psychothérapeutique",
-            "Réévaluer dans 2-4 semaines"
-        ],
-        'moderee': [
-            "Dépression modérée nécessitant une intervention",
-            "Psychothérapie recommandée",
-            "Évaluer la nécessité d'un traitement pharmacologique"
-        ],
-        'severe': [
-            "Dépression sévère - Prise en charge immédiate",
-            "Consultation psychiatrique urgente recommandée",
-            "Évaluer le risque suicidaire en détail"
-        ]
-    }
-    
-    # Créer le buffer pour le PDF
-    buffer = BytesIO()
-    
-    # Créer le document PDF
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        rightMargin=2*cm,
-        leftMargin=2*cm,
-        topMargin=2*cm,
-        bottomMargin=2*cm
-    )
-    
-    # Container pour les éléments
-    elements = []
-    
-    # Styles
-    styles = getSampleStyleSheet()
-    
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=20,
-        textColor=colors.HexColor('#4F46E5'),
-        spaceAfter=10,
-        alignment=TA_CENTER,
-        fontName='Helvetica-Bold'
-    )
-    
-    subtitle_style = ParagraphStyle(
-        'Subtitle',
-        parent=styles['Normal'],
-        fontSize=10,
-        textColor=colors.grey,
-        spaceAfter=20,
-        alignment=TA_CENTER
-    )
-    
-    section_style = ParagraphStyle(
-        'Section',
-        parent=styles['Heading2'],
-        fontSize=14,
-        textColor=colors.HexColor('#4F46E5'),
-        spaceAfter=10,
-        spaceBefore=15,
-        fontName='Helvetica-Bold'
-    )
-    
-    normal_style = ParagraphStyle(
-        'CustomNormal',
-        parent=styles['Normal'],
-        fontSize=10,
-        spaceAfter=5
-    )
-    
-    # Titre
-    elements.append(Paragraph("INVENTAIRE DE DÉPRESSION DE BECK (BDI-II)", title_style))
-    elements.append(Paragraph(f"Date du test : {test.date_passation.strftime('%d/%m/%Y à %H:%M')}", subtitle_style))
-    elements.append(Spacer(1, 0.5*cm))
-    
-    # Informations Patient
-    elements.append(Paragraph("Informations Patient", section_style))
-    
-    patient_data = [
-        ['Nom', test.patient.nom_complet],
-        ['Date de naissance', f"{test.patient.date_naissance.strftime('%d/%m/%Y')} ({test.patient.age} ans)"],
-        ['Psychologue', test.psychologue.get_full_name()]
-    ]
-    
-    patient_table = Table(patient_data, colWidths=[5*cm, 10*cm])
-    patient_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F3F4F6')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-        ('TOPPADDING', (0, 0), (-1, -1), 10),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
-    elements.append(patient_table)
-    elements.append(Spacer(1, 1*cm))
-    
-    # Score total
-    score_style = ParagraphStyle(
-        'Score',
-        parent=styles['Normal'],
-        fontSize=14,
-        textColor=colors.HexColor('#666666'),
-        alignment=TA_CENTER,
-        spaceAfter=3
-    )
-    
-    big_score_style = ParagraphStyle(
-        'BigScore',
-        parent=styles['Normal'],
-        fontSize=48,
-        textColor=colors.HexColor('#4F46E5'),
-        alignment=TA_CENTER,
-        fontName='Helvetica-Bold',
-        spaceAfter=1
-    )
-    
-    score_data = [
-        [Paragraph("SCORE TOTAL", score_style)],
-        [Paragraph(f"{test.score_total}", big_score_style)],
-        [Paragraph("", score_style)]
-    ]
-    
-    score_table = Table(score_data, colWidths=[15*cm])
-    score_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#EEF2FF')),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('TOPPADDING', (0, 0), (-1, -1), 15),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 15),
-        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#C7D2FE')),
-    ]))
-    elements.append(score_table)
-    elements.append(Spacer(1, 0.8*cm))
-    
-    # Niveau de dépression
-    niveau_colors = {
-        'minimale': ('#D1FAE5', '#065F46', '0-9 points'),
-        'legere': ('#FEF3C7', '#92400E', '10-18 points'),
-        'moderee': ('#FFEDD5', '#9A3412', '19-29 points'),
-        'severe': ('#FEE2E2', '#991B1B', '30-63 points'),
-    }
-    
-    bg_color, text_color, range_text = niveau_colors.get(
-        test.niveau_depression, 
+    return servir_rapport(request, 'beck', test)
+
+
+# ========== RAPPORT PDF ==========
+
+# Couleurs de fond et de texte, plage de scores
+NIVEAUX_PDF = {
+    'minimale': ('#D1FAE5', '#065F46', '0-9 points'),
+    'legere': ('#FEF3C7', '#92400E', '10-18 points'),
+    'moderee': ('#FFEDD5', '#9A3412', '19-29 points'),
+    'severe': ('#FEE2E2', '#991B1B', '30-63 points'),
+}
+
+
+def pdf_score_total(test, contexte):
+    """Encadré du score total"""
+    return [tableau([
+        [paragraphe("SCORE TOTAL", 'score')],
+        [Paragraph(f"{test.score_total}", get_styles()['grand_score'])],
+        [paragraphe("", 'score')]
+    ], [15*cm], style_encadre('#EEF2FF', '#C7D2FE', 15))]
+
+
+def pdf_niveau(test, contexte):
+    """Encadré du niveau de dépression, dans la couleur du niveau"""
+    bg_color, text_color, range_text = NIVEAUX_PDF.get(
+        test.niveau_depression,
         ('#F3F4F6', '#000000', '')
     )
-    
-    niveau_style = ParagraphStyle(
-        'Niveau',
-        parent=styles['Normal'],
-        fontSize=18,
-        textColor=colors.HexColor(text_color),
-        alignment=TA_CENTER,
-        fontName='Helvetica-Bold',
-        spaceAfter=5
-    )
-    
-    range_style = ParagraphStyle(
-        'Range',
-        parent=styles['Normal'],
-        fontSize=11,
-        textColor=colors.HexColor(text_color),
-        alignment=TA_CENTER,
-    )
-    
-    niveau_data = [
-        [Paragraph(test.get_niveau_depression_display().upper(), niveau_style)],
-        [Paragraph(range_text, range_style)]
-    ]
-    
-    niveau_table = Table(niveau_data, colWidths=[15*cm])
-    niveau_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor(bg_color)),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('TOPPADDING', (0, 0), (-1, -1), 15),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 15),
-        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor(text_color)),
-    ]))
-    elements.append(niveau_table)
-    elements.append(Spacer(1, 1*cm))
-    
-    # Footer
-    elements.append(Spacer(1, 2*cm))
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=8,
-        textColor=colors.grey,
-        alignment=TA_CENTER
-    )
-    
-    footer_text = f"Document généré le {test.date_passation.strftime('%d/%m/%Y')} • Inventaire de Dépression de Beck (BDI-II)"
-    elements.append(Paragraph(footer_text, footer_style))
-    
-    # Construire le PDF
-    doc.build(elements)
-    
-    # Récupérer le PDF du buffer
-    pdf = buffer.getvalue()
-    buffer.close()
-    
-    # Créer la réponse HTTP avec le PDF
-    response = HttpResponse(pdf, content_type='application/pdf')
-    filename = f"Beck_BDI_{test.patient.nom}_{test.patient.prenom}_{test.date_passation.strftime('%Y%m%d')}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    return response
+    return [tableau([
+        [Paragraph(test.get_niveau_depression_display().upper(), style_niveau(text_color))],
+        [Paragraph(range_text, style_plage(text_color))]
+    ], [15*cm], style_encadre(bg_color, text_color, 15))]
+
+
+RAPPORT_BECK = Rapport(marge=2*cm, sections=(
+    Section(None, entete("INVENTAIRE DE DÉPRESSION DE BECK (BDI-II)", 20)),
+    Section("Informations Patient", tableau_patient, espace_apres=1),
+    Section(None, pdf_score_total, espace_apres=0.8),
+    Section(None, pdf_niveau, espace_apres=1),
+    Section(None, pied("Inventaire de Dépression de Beck (BDI-II)", espace=2)),
+))
+
 
+def generer_beck_pdf(test):
+    """Construit le rapport PDF du test Beck (octets du document)"""
+    return construire_pdf(RAPPORT_BECK, test)
@@ -2,12 +2,19 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import HttpResponse
-from collections import defaultdict
+from django.template.loader import render_to_string
 
-from tests_psy.models import TestD2R, SymboleReference, NormeExactitude, NormeRythmeTraitement, NormeCapaciteConcentration
+from tests_psy.models import TestD2R
 from tests_psy.forms import TestD2RForm, TestD2RResponseForm
 from cabinet.models import Patient
 from accounts.decorators import require_test_access
+from accounts.quotas import reserver_quota, QuotaAtteint
+from core.pagination import KeysetPaginator
+from tests_psy.views.rapports import servir_rapport
+from tests_psy.services.d2r import (
+    get_grille_d2r, apply_d2r_score, parse_evenements, encode_evenements,
+    decode_evenements, analyse_passation, calculate_d2r_results, annotate_d2r_results
+)
 
 
 @login_required
@@ -46,7 +53,15 @@ def d2r_nouveau(request, patient_id=None):
             test.reponses_incorrectes = 0
             test.reponses_omises = 0
             test.temps_total = 0
-            test.save()
+            try:
+                with reserver_quota(request.user, 'd2r'):
+                    test.save()
+            except QuotaAtteint as e:
+                messages.error(
+                    request,
+                    f"Limite de tests D2R atteinte ! Votre licence autorise {e.limit} tests D2R maximum."
+                )
+                return redirect('tests_psy:d2r_liste')
             
             messages.success(request, "Test D2R créé avec succès !")
             return redirect('tests_psy:d2r_instructions', test_id=test.id)
@@ -156,19 +171,15 @@ def d2r_passation(request, test_id):
     """Interface de passation du test D2R"""
     test = get_object_or_404(TestD2R, id=test_id, organization=request.user.organization)
     
-    # Plus de filtre par organization - les symboles sont partagés
-    symbols = SymboleReference.objects.filter(page=1).order_by('ligne', 'position')
-    
-    symbols_by_line = defaultdict(list)
-    for symbol in symbols:
-        symbols_by_line[symbol.ligne].append(symbol)
+    # Grille partagée, chargée une fois par processus
+    symbols_by_line = get_grille_d2r().symboles_par_ligne
     
     form = TestD2RResponseForm()
     
     context = {
         'test': test,
         'patient': test.patient,
-        'symbols_by_line': dict(symbols_by_line),
+        'symbols_by_line': symbols_by_line,
         'form': form,
         'timer_seconds': 20,
     }
@@ -189,52 +200,20 @@ def d2r_submit(request, test_id):
     selected_symbols_str = request.POST.get('selected_symbols', '')
     selected_symbols = set(int(id_) for id_ in selected_symbols_str.split(',') if id_)
 
-    total_correctes = 0
-    total_incorrectes = 0 
-    total_omises = 0
-
-    # Pour chaque ligne (de 2 à 13)
-    for line_number in range(2, 14):
-        # Plus de filtre par organization - les symboles sont partagés
-        line_symbols = SymboleReference.objects.filter(
-            page=1,
-            ligne=line_number
-        ).order_by('position')
-        
-        line_selected = [s for s in line_symbols if s.id in selected_symbols]
-        
-        if not line_selected:
-            continue
-            
-        last_selected_position = max(s.position for s in line_selected)
-        
-        for symbol in line_symbols:
-            if symbol.position > last_selected_position:
-                break
-                
-            total_traits = symbol.traits_haut + symbol.traits_bas
-            is_target = symbol.lettre == 'd' and total_traits == 2
-            
-            if symbol.id in selected_symbols:
-                if is_target:
-                    total_correctes += 1
-                else:
-                    total_incorrectes += 1
-            else:
-                if is_target:
-                    total_omises += 1
+    # Correction par ligne sur la grille en mémoire
+    resultat = get_grille_d2r().score(selected_symbols)
     
     # Récupérer le temps total
     temps_total = int(request.POST.get('temps_total', 0))
     
+    # Chronométrie par ligne (événements horodatés de la passation)
+    evenements = parse_evenements(request.POST.get('evenements'))
+    
     # Mettre à jour le test
-    test.reponses_correctes = total_correctes
-    test.reponses_incorrectes = total_incorrectes
-    test.reponses_omises = total_omises
+    test.symboles_selectionnes = sorted(selected_symbols)
+    apply_d2r_score(test, resultat)
     test.temps_total = temps_total
-    test.note_cct = total_correctes
-    test.note_exactitude = ((total_incorrectes + total_omises) / total_correctes) * 100 if total_correctes > 0 else 0
-    test.capacite_concentration = total_correctes - total_incorrectes - total_omises
+    test.evenements = encode_evenements(evenements) if evenements else None
     test.save()
     
     messages.success(request, "Test D2R complété avec succès !")
@@ -247,57 +226,20 @@ def d2r_resultats(request, test_id):
     """Afficher les résultats du test D2R"""
     test = get_object_or_404(TestD2R, id=test_id, organization=request.user.organization)
     
-    # Calculs
-    cct = test.reponses_correctes
-    ec = test.reponses_incorrectes
-    eo = test.reponses_omises or 0
-    cc = cct - ec - eo
-    e_percentage = ((eo + ec) / cct) * 100 if cct > 0 else 0
-    e_pourcentage_sans_virgule = int(e_percentage)
-    
-    total_reponses = cct + ec
-    precision = (cct / total_reponses * 100) if total_reponses > 0 else 0
-    temps_moyen_ligne = test.temps_total / 14 if test.temps_total > 0 else 0
+    # Scores dérivés et normes (tables en mémoire)
+    resultats = calculate_d2r_results(test)
     
-    # Récupération des normes
-    norme_exactitude = NormeExactitude.objects.filter(
-        age_min__lte=test.age,
-        age_max__gte=test.age,
-        valeur_min__lte=e_pourcentage_sans_virgule,
-        valeur_max__gte=e_pourcentage_sans_virgule
-    ).first()
-
-    norme_rythme = NormeRythmeTraitement.objects.filter(
-        age_min__lte=test.age,
-        age_max__gte=test.age,
-        valeur_min__lte=cct,
-        valeur_max__gte=cct
-    ).first()
-
-    norme_concentration = NormeCapaciteConcentration.objects.filter(
-        age_min__lte=test.age,
-        age_max__gte=test.age,
-        valeur_min__lte=cc,
-        valeur_max__gte=cc
-    ).first()
+    # Analyse chronométrique si la passation a été enregistrée ligne par ligne
+    analyse = analyse_passation(decode_evenements(test.evenements), test.detail_lignes)
+    if analyse:
+        resultats['temps_moyen_ligne'] = analyse['duree_moyenne']
     
     context = {
         'test': test,
         'patient': test.patient,
-        'total_reponses': total_reponses,
-        'precision': round(precision, 2),
-        'temps_moyen_ligne': round(temps_moyen_ligne, 1),
-        'cct': cct,
-        'ec': ec,
-        'eo': eo,
-        'cc': cc,
-        'e_percentage': round(e_percentage, 2),
-        'note_standard_e': norme_exactitude.note_standard if norme_exactitude else None,
-        'percentile_e': norme_exactitude.percentile if norme_exactitude else None,
-        'note_standard_cct': norme_rythme.note_standard if norme_rythme else None,
-        'percentile_cct': norme_rythme.percentile if norme_rythme else None,
-        'note_standard_cc': norme_concentration.note_standard if norme_concentration else None,
-        'percentile_cc': norme_concentration.percentile if norme_concentration else None,
+        **resultats,
+        'detail_lignes': analyse['lignes'] if analyse else test.detail_lignes,
+        'analyse': analyse,
     }
     
     return render(request, 'tests_psy/d2r/resultats.html', context)
@@ -311,8 +253,17 @@ def d2r_liste(request):
         organization=request.user.organization
     ).select_related('patient', 'psychologue').order_by('-date_passation')
     
+    # Pagination par clé (date de passation) : coût constant quelle que soit la page
+    page_obj = KeysetPaginator(tests, ('-date_passation',), 20, count=None).get_page(
+        request.GET.get('cursor')
+    )
+    
+    # Notes standards et percentiles de la page en une passe
+    annotate_d2r_results(page_obj.object_list)
+    
     context = {
-        'tests': tests,
+        'tests': page_obj,
+        'page_obj': page_obj,
         'title': 'Tests D2R'
     }
     
@@ -322,61 +273,21 @@ def d2r_liste(request):
 @login_required
 @require_test_access('d2r')
 def d2r_pdf(request, test_id):
-    """Générer un rapport PDF du test D2R"""
+    """Rapport imprimable du test D2R (rendu par la file des rapports, servi depuis le cache)"""
     test = get_object_or_404(TestD2R, id=test_id, organization=request.user.organization)
-    
-    # Calculs (même logique que d2r_resultats)
-    cct = test.reponses_correctes
-    ec = test.reponses_incorrectes
-    eo = test.reponses_omises or 0
-    cc = cct - ec - eo
-    e_percentage = ((eo + ec) / cct) * 100 if cct > 0 else 0
-    e_pourcentage_sans_virgule = int(e_percentage)
-    
-    total_reponses = cct + ec
-    precision = (cct / total_reponses * 100) if total_reponses > 0 else 0
-    temps_moyen_ligne = test.temps_total / 14 if test.temps_total > 0 else 0
-    
-    # Récupération des normes
-    norme_exactitude = NormeExactitude.objects.filter(
-        age_min__lte=test.age,
-        age_max__gte=test.age,
-        valeur_min__lte=e_pourcentage_sans_virgule,
-        valeur_max__gte=e_pourcentage_sans_virgule
-    ).first()
+    return servir_rapport(request, 'd2r', test)
 
-    norme_rythme = NormeRythmeTraitement.objects.filter(
-        age_min__lte=test.age,
-        age_max__gte=test.age,
-        valeur_min__lte=cct,
-        valeur_max__gte=cct
-    ).first()
 
-    norme_concentration = NormeCapaciteConcentration.objects.filter(
-        age_min__lte=test.age,
-        age_max__gte=test.age,
-        valeur_min__lte=cc,
-        valeur_max__gte=cc
-    ).first()
+def generer_d2r_rapport(test):
+    """Construit le rapport imprimable (HTML) du test D2R"""
+    # Même calcul que d2r_resultats
+    resultats = calculate_d2r_results(test)
     
     context = {
         'test': test,
         'patient': test.patient,
-        'total_reponses': total_reponses,
-        'precision': round(precision, 2),
-        'temps_moyen_ligne': round(temps_moyen_ligne, 1),
-        'cct': cct,
-        'ec': ec,
-        'eo': eo,
-        'cc': cc,
-        'e_percentage': round(e_percentage, 2),
-        'note_standard_e': norme_exactitude.note_standard if norme_exactitude else 'N/A',
-        'percentile_e': norme_exactitude.percentile if norme_exactitude else 'N/A',
-        'note_standard_cct': norme_rythme.note_standard if norme_rythme else 'N/A',
-        'percentile_cct': norme_rythme.percentile if norme_rythme else 'N/A',
-        'note_standard_cc': norme_concentration.note_standard if norme_concentration else 'N/A',
-        'percentile_cc': norme_concentration.percentile if norme_concentration else 'N/A',
+        **{key: 'N/A' if value is None else value for key, value in resultats.items()},
     }
     
-    # Rendre le template PDF
-    return render(request, 'tests_psy/d2r/rapport_pdf.html', context)
\ No newline at end of file
+    # Le template est autonome (sans contexte de requête)
+    return render_to_string('tests_psy/d2r/rapport_pdf.html', context).encode()
\ No newline at end of file
@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render, redirect, get_object_or_404
+from django.utils import timezone
+
+from accounts.tenancy import get_request_tenant_context
+from tests_psy.forms import ExportRapportsForm
+from tests_psy.models import RapportPDF
+from tests_psy.services.export import selectionner_tests, preparer_rapports, flux_zip
+from tests_psy.services.rapports import (
+    INSTRUMENTS, demander_rapport, reserver_travail, executer_rapport, chemin_fichier
+)
+
+
+def servir_rapport(request, instrument, test, parametres=None):
+    """
+    Sert le rapport du test depuis le cache, ou le met en file d'attente.
+
+    Rendu asynchrone : page d'attente qui interroge rapport_statut puis
+    recharge l'URL du rapport. Rendu synchrone (RAPPORTS_PDF_ASYNC = False) :
+    le travail est exécuté dans la requête puis servi.
+    """
+    rapport = demander_rapport(instrument, test, parametres)
+
+    if rapport.statut == 'attente' and not settings.RAPPORTS_PDF_ASYNC:
+        if reserver_travail(rapport.id):
+            rapport.statut = executer_rapport(rapport.id)
+
+    if rapport.statut == 'pret':
+        config = INSTRUMENTS[instrument]
+        # Le PDF est téléchargé ; le rapport D2R (HTML imprimable) s'ouvre dans le navigateur
+        return FileResponse(
+            open(chemin_fichier(rapport), 'rb'),
+            as_attachment=config.extension == 'pdf',
+            filename=config.nom_fichier(test),
+            content_type=config.content_type,
+        )
+
+    return render(request, 'tests_psy/rapport_attente.html', {
+        'rapport': rapport,
+        'test': test,
+        'patient': test.patient,
+    })
+
+
+@login_required
+def rapport_statut(request, rapport_id):
+    """Statut d'un rapport en file d'attente (JSON, interrogé par la page d'attente)"""
+    if request.user.is_superadmin():
+        rapport = get_object_or_404(RapportPDF.all_objects, id=rapport_id)
+    else:
+        rapport = get_object_or_404(RapportPDF, id=rapport_id, organization=request.user.organization)
+
+    return JsonResponse({
+        'statut': rapport.statut,
+        'erreur': rapport.erreur if rapport.statut == 'erreur' else '',
+    })
+
+
+@login_required
+def export_rapports(request):
+    """
+    Export groupé des rapports (un patient ou toute l'organisation, sur une
+    période) en archive ZIP diffusée au fil du rendu.
+    """
+    context = get_request_tenant_context(request)
+    if context is None or context.license is None:
+        messages.error(request, "Votre organisation n'a pas de licence active.")
+        return redirect('cabinet:dashboard')
+
+    organization = context.organization
+    instruments = [instrument for instrument in INSTRUMENTS if context.license.has_test_access(instrument)]
+
+    if 'instruments' not in request.GET:
+        # Premier affichage (lien depuis le dossier patient : ?patient=<id>)
+        form = ExportRapportsForm(
+            organization=organization, instruments=instruments,
+            initial={'patient': request.GET.get('patient')},
+        )
+        return render(request, 'tests_psy/export_rapports.html', {'form': form})
+
+    form = ExportRapportsForm(request.GET, organization=organization, instruments=instruments)
+    if not form.is_valid():
+        return render(request, 'tests_psy/export_rapports.html', {'form': form})
+
+    patient = form.cleaned_data['patient']
+    selection = selectionner_tests(
+        organization,
+        form.cleaned_data['instruments'],
+        patient=patient,
+        debut=form.cleaned_data['debut'],
+        fin=form.cleaned_data['fin'],
+    )
+    if not selection:
+        messages.warning(request, "Aucun test ne correspond à cette sélection.")
+        return render(request, 'tests_psy/export_rapports.html', {'form': form})
+
+    nom = f'{patient.nom}_{patient.prenom}' if patient else organization.slug
+    response = StreamingHttpResponse(flux_zip(preparer_rapports(selection)), content_type='application/zip')
+    response['Content-Disposition'] = (
+        f'attachment; filename="rapports_{nom}_{timezone.localdate().strftime("%Y%m%d")}.zip"'
+    )
+    return response
@@ -1,6 +1,6 @@
-from django.http import HttpResponse
+from django.http import JsonResponse
 
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 
 from django.contrib.auth.decorators import login_required
 
@@ -8,9 +8,15 @@ from django.contrib import messages
 
 from django.db import transaction
 
+from asgiref.sync import sync_to_async
+
+from reportlab.lib.units import cm
+
+from reportlab.platypus import Paragraph
+
  
 
-from tests_psy.models import TestSTAI, ItemSTAI, ReponseItemSTAI
+from tests_psy.models import TestSTAI, ItemSTAI
 
 from tests_psy.forms import TestSTAIForm
 
@@ -18,6 +24,24 @@ from cabinet.models import Patient
 
 from accounts.decorators import require_test_access
 
+from accounts.quotas import reserver_quota, QuotaAtteint
+
+from core.pagination import KeysetPaginator
+
+from tests_psy.views.rapports import servir_rapport
+
+from tests_psy.services.stai import get_items_stai, save_stai_reponses
+
+from tests_psy.services.pdf import (
+
+    Rapport, Section, construire_pdf, entete, pied, tableau_patient,
+
+    tableau, paragraphe, get_styles, style_encadre,
+
+)
+
+from tests_psy.services.evolution import get_serie, count_points
+
  
 
  
@@ -48,9 +72,21 @@ def stai_liste(request):
 
  
 
+    # Pagination par clé (date de passation) ; total lu sur le compteur d'utilisation
+
+    page_obj = KeysetPaginator(tests, ('-date_passation',), 20, count=license.get_usage('stai')).get_page(
+
+        request.GET.get('cursor')
+
+    )
+
+ 
+
     context = {
 
-        'tests': tests,
+        'tests': page_obj,
+
+        'page_obj': page_obj,
 
         'title': 'Tests STAI (Inventaire d\'anxiété état-trait)',
 
@@ -122,7 +158,23 @@ def stai_nouveau(request, patient_id=None):
 
             test.psychologue = request.user
 
-            test.save()
+            try:
+
+                with reserver_quota(request.user, 'stai'):
+
+                    test.save()
+
+            except QuotaAtteint as e:
+
+                messages.error(
+
+                    request,
+
+                    f"Limite de tests STAI atteinte ! Votre licence autorise {e.limit} tests STAI maximum."
+
+                )
+
+                return redirect('tests_psy:stai_liste')
 
  
 
@@ -244,61 +296,27 @@ def stai_submit(request, test_id):
 
  
 
-    # Utiliser une transaction pour garantir la cohérence
+    # Valeurs choisies pour les 40 items
 
-    with transaction.atomic():
-
-        # Supprimer les anciennes réponses (si re-soumission)
-
-        test.reponses.all().delete()
-
- 
-
-        # Traiter les réponses pour les 40 items
+    valeurs = {
 
-        items = ItemSTAI.objects.all().order_by('numero')
+        item.numero: int(request.POST[f'item_{item.numero}'])
 
-        items_manquants = []
-
- 
+        for item in get_items_stai()
 
-        for item in items:
+        if request.POST.get(f'item_{item.numero}')
 
-            # Récupérer la valeur choisie pour cet item
-
-            valeur_choisie = request.POST.get(f'item_{item.numero}')
-
- 
-
-            if valeur_choisie:
-
-                valeur_choisie = int(valeur_choisie)
-
- 
-
-                # Créer la réponse pour cet item
-
-                reponse = ReponseItemSTAI.objects.create(
-
-                    test=test,
-
-                    item=item,
-
-                    valeur_choisie=valeur_choisie,
-
-                    organization=request.user.organization
-
-                )
+    }
 
  
 
-                # Calculer le score (avec inversion si nécessaire)
+    # Utiliser une transaction pour garantir la cohérence
 
-                reponse.calculer_score()
+    with transaction.atomic():
 
-            else:
+        # Réponses (une insertion groupée) et scores calculés en mémoire
 
-                items_manquants.append(item.numero)
+        items_manquants = save_stai_reponses(test, valeurs)
 
  
 
@@ -318,12 +336,6 @@ def stai_submit(request, test_id):
 
  
 
-        # Calculer les scores totaux
-
-        test.calculer_scores()
-
- 
-
     messages.success(request, "Test STAI complété avec succès !")
 
  
@@ -360,37 +372,9 @@ def stai_resultats(request, test_id):
 
  
 
-    # Récupérer les tests STAI précédents du patient pour le graphique d'évolution
-
-    tests_precedents = TestSTAI.objects.filter(
-
-        patient=test.patient,
-
-        organization=request.user.organization
-
-    ).order_by('date_passation')
-
- 
-
-    # Données pour les graphiques
-
-    evolution_data_etat = {
-
-        'dates': [t.date_passation.strftime('%d/%m/%Y') for t in tests_precedents],
-
-        'scores': [t.score_etat for t in tests_precedents]
-
-    }
-
- 
-
-    evolution_data_trait = {
-
-        'dates': [t.date_passation.strftime('%d/%m/%Y') for t in tests_precedents],
-
-        'scores': [t.score_trait for t in tests_precedents]
+    # Nombre de tests du patient (la série du graphique est chargée via stai_evolution)
 
-    }
+    nb_tests_precedents = count_points(test.patient, 'stai')
 
  
 
@@ -470,15 +454,11 @@ def stai_resultats(request, test_id):
 
         'reponses_trait': reponses_trait,
 
-        'evolution_data_etat': evolution_data_etat,
-
-        'evolution_data_trait': evolution_data_trait,
-
         'recommandations_etat': recommandations.get(test.niveau_anxiete_etat, []),
 
         'recommandations_trait': recommandations.get(test.niveau_anxiete_trait, []),
 
-        'nb_tests_precedents': tests_precedents.count(),
+        'nb_tests_precedents': nb_tests_precedents,
 
         'title': f'Résultats STAI - {test.patient.nom_complet}'
 
@@ -496,368 +476,116 @@ def stai_resultats(request, test_id):
 
 @require_test_access('stai')
 
-def stai_pdf(request, test_id):
+async def stai_evolution(request, patient_id):
 
-    """Générer un rapport PDF du test STAI"""
+    """Série d'évolution ÉTAT/TRAIT du patient (JSON, chargée par le graphique)"""
 
-    from reportlab.lib.pagesizes import A4
+    user = await request.auser()
 
-    from reportlab.lib import colors
-
-    from reportlab.lib.units import cm
-
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-
-    from reportlab.lib.enums import TA_CENTER, TA_LEFT
-
-    from io import BytesIO
+    patient = await aget_object_or_404(Patient, id=patient_id, organization_id=user.organization_id)
 
  
 
-    test = get_object_or_404(TestSTAI, id=test_id, organization=request.user.organization)
+    serie = await sync_to_async(get_serie)(patient, 'stai')
 
- 
-
-    # Créer le buffer pour le PDF
-
-    buffer = BytesIO()
+    return JsonResponse(serie)
 
  
 
-    # Créer le document PDF
-
-    doc = SimpleDocTemplate(
-
-        buffer,
-
-        pagesize=A4,
-
-        rightMargin=2*cm,
-
-        leftMargin=2*cm,
-
-        topMargin=2*cm,
-
-        bottomMargin=2*cm
-
-    )
-
  
 
-    # Container pour les éléments
-
-    elements = []
-
- 
-
-    # Styles
-
-    styles = getSampleStyleSheet()
-
- 
-
-    title_style = ParagraphStyle(
-
-        'CustomTitle',
-
-        parent=styles['Heading1'],
-
-        fontSize=18,
-
-        textColor=colors.HexColor('#4F46E5'),
-
-        spaceAfter=10,
-
-        alignment=TA_CENTER,
-
-        fontName='Helvetica-Bold'
-
-    )
-
- 
-
-    subtitle_style = ParagraphStyle(
-
-        'Subtitle',
-
-        parent=styles['Normal'],
+@login_required
 
-        fontSize=10,
+@require_test_access('stai')
 
-        textColor=colors.grey,
+def stai_pdf(request, test_id):
 
-        spaceAfter=20,
+    """Rapport PDF du test STAI (rendu par la file des rapports, servi depuis le cache)"""
 
-        alignment=TA_CENTER
+    test = get_object_or_404(TestSTAI, id=test_id, organization=request.user.organization)
 
-    )
+    return servir_rapport(request, 'stai', test)
 
  
 
-    section_style = ParagraphStyle(
-
-        'Section',
-
-        parent=styles['Heading2'],
-
-        fontSize=14,
-
-        textColor=colors.HexColor('#4F46E5'),
-
-        spaceAfter=10,
-
-        spaceBefore=15,
-
-        fontName='Helvetica-Bold'
-
-    )
-
  
 
-    # Titre
-
-    elements.append(Paragraph("INVENTAIRE D'ANXIÉTÉ ÉTAT-TRAIT (STAI)", title_style))
-
-    elements.append(Paragraph(f"Date du test : {test.date_passation.strftime('%d/%m/%Y à %H:%M')}", subtitle_style))
-
-    elements.append(Spacer(1, 0.5*cm))
+# ========== RAPPORT PDF ==========
 
  
 
-    # Informations Patient
+# Couleurs de fond et de texte selon le niveau d'anxiété
 
-    elements.append(Paragraph("Informations Patient", section_style))
+NIVEAUX_PDF = {
 
- 
+    'minimale': ('#D1FAE5', '#065F46'),
 
-    patient_data = [
+    'faible': ('#FEF3C7', '#92400E'),
 
-        ['Nom', test.patient.nom_complet],
+    'moderee': ('#FFEDD5', '#9A3412'),
 
-        ['Date de naissance', f"{test.patient.date_naissance.strftime('%d/%m/%Y')} ({test.patient.age} ans)"],
+    'elevee': ('#FED7D7', '#9B2C2C'),
 
-        ['Psychologue', test.psychologue.get_full_name()]
+    'tres_elevee': ('#FEE2E2', '#991B1B'),
 
-    ]
+}
 
  
 
-    patient_table = Table(patient_data, colWidths=[5*cm, 10*cm])
-
-    patient_table.setStyle(TableStyle([
-
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F3F4F6')),
-
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-
-        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-
-        ('TOPPADDING', (0, 0), (-1, -1), 10),
-
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-
-    ]))
-
-    elements.append(patient_table)
-
-    elements.append(Spacer(1, 0.8*cm))
-
  
 
-    # Scores
-
-    elements.append(Paragraph("Résultats", section_style))
-
- 
+def pdf_encadre_score(titre, score, niveau, niveau_display):
 
-    # Couleurs selon le niveau
+    """Encadré d'un score (état ou trait) dans la couleur de son niveau"""
 
-    niveau_colors = {
+    bg_color, text_color = NIVEAUX_PDF.get(niveau, ('#F3F4F6', '#000000'))
 
-        'minimale': ('#D1FAE5', '#065F46'),
+    return tableau([
 
-        'faible': ('#FEF3C7', '#92400E'),
+        [paragraphe(f"<b>{titre}</b>")],
 
-        'moderee': ('#FFEDD5', '#9A3412'),
+        [Paragraph(f"<font size=24><b>{score}</b></font> / 80", get_styles()['normal'])],
 
-        'elevee': ('#FED7D7', '#9B2C2C'),
+        [Paragraph(f"<b>{niveau_display}</b>", get_styles()['normal'])]
 
-        'tres_elevee': ('#FEE2E2', '#991B1B'),
-
-    }
+    ], [7*cm], style_encadre(bg_color, text_color, 10, text_color))
 
  
 
-    # Score ÉTAT
-
-    bg_color_etat, text_color_etat = niveau_colors.get(
-
-        test.niveau_anxiete_etat,
-
-        ('#F3F4F6', '#000000')
-
-    )
-
  
 
-    score_data_etat = [
+def pdf_scores(test, contexte):
 
-        [Paragraph(f"<b>ANXIÉTÉ ÉTAT (Y1)</b>", styles['Normal'])],
+    """Scores état et trait côte à côte"""
 
-        [Paragraph(f"<font size=24><b>{test.score_etat}</b></font> / 80", styles['Normal'])],
+    etat = pdf_encadre_score("ANXIÉTÉ ÉTAT (Y1)", test.score_etat, test.niveau_anxiete_etat, test.niveau_etat_display)
 
-        [Paragraph(f"<b>{test.niveau_etat_display}</b>", styles['Normal'])]
+    trait = pdf_encadre_score("ANXIÉTÉ TRAIT (Y2)", test.score_trait, test.niveau_anxiete_trait, test.niveau_trait_display)
 
-    ]
+    return [tableau([[etat, trait]], [7.5*cm, 7.5*cm], 'centre')]
 
  
 
-    score_table_etat = Table(score_data_etat, colWidths=[7*cm])
-
-    score_table_etat.setStyle(TableStyle([
-
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor(bg_color_etat)),
-
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor(text_color_etat)),
-
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-
-        ('TOPPADDING', (0, 0), (-1, -1), 10),
-
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-
-        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor(text_color_etat)),
-
-    ]))
-
- 
-
-    # Score TRAIT
-
-    bg_color_trait, text_color_trait = niveau_colors.get(
-
-        test.niveau_anxiete_trait,
-
-        ('#F3F4F6', '#000000')
-
-    )
-
- 
-
-    score_data_trait = [
-
-        [Paragraph(f"<b>ANXIÉTÉ TRAIT (Y2)</b>", styles['Normal'])],
-
-        [Paragraph(f"<font size=24><b>{test.score_trait}</b></font> / 80", styles['Normal'])],
-
-        [Paragraph(f"<b>{test.niveau_trait_display}</b>", styles['Normal'])]
-
-    ]
-
- 
-
-    score_table_trait = Table(score_data_trait, colWidths=[7*cm])
-
-    score_table_trait.setStyle(TableStyle([
-
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor(bg_color_trait)),
-
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor(text_color_trait)),
-
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-
-        ('TOPPADDING', (0, 0), (-1, -1), 10),
-
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-
-        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor(text_color_trait)),
-
-    ]))
-
- 
-
-    # Mettre les deux scores côte à côte
-
-    scores_table = Table([[score_table_etat, score_table_trait]], colWidths=[7.5*cm, 7.5*cm])
-
-    scores_table.setStyle(TableStyle([
-
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-
-    ]))
-
  
 
-    elements.append(scores_table)
+RAPPORT_STAI = Rapport(marge=2*cm, sections=(
 
-    elements.append(Spacer(1, 1*cm))
+    Section(None, entete("INVENTAIRE D'ANXIÉTÉ ÉTAT-TRAIT (STAI)", 18)),
 
- 
+    Section("Informations Patient", tableau_patient, espace_apres=0.8),
 
-    # Footer
+    Section("Résultats", pdf_scores, espace_apres=1),
 
-    footer_style = ParagraphStyle(
+    Section(None, pied("Inventaire d'Anxiété État-Trait de Spielberger (STAI)")),
 
-        'Footer',
-
-        parent=styles['Normal'],
-
-        fontSize=8,
-
-        textColor=colors.grey,
-
-        alignment=TA_CENTER
-
-    )
+))
 
  
 
-    footer_text = f"Document généré le {test.date_passation.strftime('%d/%m/%Y')} • Inventaire d'Anxiété État-Trait de Spielberger (STAI)"
-
-    elements.append(Paragraph(footer_text, footer_style))
-
- 
-
-    # Construire le PDF
-
-    doc.build(elements)
-
- 
-
-    # Récupérer le PDF du buffer
-
-    pdf = buffer.getvalue()
-
-    buffer.close()
-
  
 
-    # Créer la réponse HTTP avec le PDF
-
-    response = HttpResponse(pdf, content_type='application/pdf')
+def generer_stai_pdf(test):
 
-    filename = f"STAI_{test.patient.nom}_{test.patient.prenom}_{test.date_passation.strftime('%Y%m%d')}.pdf"
-
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-
- 
+    """Construit le rapport PDF du test STAI (octets du document)"""
 
-    return response
\ No newline at end of file
+    return construire_pdf(RAPPORT_STAI, test)
\ No newline at end of file